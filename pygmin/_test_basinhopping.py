@@ -1,7 +1,7 @@
 import unittest
 from numpy import abs
 
-from pygmin.basinhopping import BasinHopping
+from pygmin.basinhopping import BasinHopping, EnergyBoundAbort, StagedQuench
 from pygmin.systems import LJCluster
 
 class TestBasinhopping(unittest.TestCase):
@@ -26,6 +26,75 @@ class TestBasinhopping(unittest.TestCase):
         bh.run(3)
         self.assertEnergy(bh.result.energy)
         self.assertEnergy(bh.markovE)
+
+    def test_abort_quench(self):
+        # abort every quench after the first iteration
+        abort = EnergyBoundAbort(nsteps_min=1, margin=-1e10, rms_max=1e10)
+        bh = self.system.get_basinhopping(outstream=None, abort_quench=abort)
+        markovE = bh.markovE
+        self.assertEnergy(markovE)
+        bh.run(3)
+        self.assertEqual(bh.naborted, 3)
+        self.assertEqual(bh.naccepted, 0)
+        self.assertEqual(bh.markovE, markovE)
+        self.assertTrue(abort.markovE is None)
+
+    def test_abort_quench_default(self):
+        abort = EnergyBoundAbort()
+        bh = self.system.get_basinhopping(outstream=None, abort_quench=abort)
+        bh.run(3)
+        self.assertEnergy(bh.result.energy)
+        self.assertEnergy(bh.markovE)
+
+    def test_abort_quench_custom(self):
+        abort = EnergyBoundAbort()
+        minimizer = self.system.get_minimizer()
+        received = []
+        def quench(coords, abort_criterion=None):
+            received.append(abort_criterion)
+            return minimizer(coords, abort_criterion=abort_criterion)
+        pot = self.system.get_potential()
+        coords = self.system.get_random_configuration()
+        takestep = self.system.get_takestep()
+        bh = BasinHopping(coords, pot, takestep, quench=quench, abort_quench=abort, 
+                          outstream=None)
+        bh.run(2)
+        self.assertEqual(received, [abort] * 3)
+        
+        # a quench which cannot take the abort criterion is an error
+        quench = lambda coords : minimizer(coords)
+        self.assertRaises(TypeError, BasinHopping, coords, pot, takestep, 
+                          quench=quench, abort_quench=abort, outstream=None)
+
+    def test_staged_quench(self):
+        quench = StagedQuench(self.system.get_minimizer(tol=1e-1), 
+                              self.system.get_minimizer(tol=1e-7), window=0.)
+        coords = self.system.get_random_configuration()
+        res = quench(coords)
+        self.assertEqual(res.stage, "tight")
+        self.assertLess(res.rms, 1e-7)
+        
+        # far above the Markov energy, so it stays loose until it is kept
+        quench.markovE = -100.
+        res = quench(coords)
+        self.assertEqual(res.stage, "loose")
+        res = quench.tighten(res)
+        self.assertEqual(res.stage, "tight")
+        self.assertLess(res.rms, 1e-7)
+        self.assertEqual(quench.ntightened, 2)
+
+    def test_staged_quench_basinhopping(self):
+        self.system.params.staged_quench.enabled = True
+        self.system.params.staged_quench.window = 0.
+        db = self.system.create_database()
+        bh = self.system.get_basinhopping(database=db, outstream=None)
+        self.assertTrue(isinstance(bh.quench, StagedQuench))
+        bh.run(5)
+        self.assertEnergy(bh.result.energy)
+        self.assertEnergy(bh.markovE)
+        # every stored minimum was tightened
+        for m in db.minima():
+            self.assertEnergy(m.energy)
         
         
 if __name__ == "__main__":
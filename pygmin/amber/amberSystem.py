@@ -182,6 +182,28 @@ class AMBERSystem(BaseSystem):
             massMatrix_tmp[atomNum][atomNum] = 1/m        
                     
         return massMatrix_tmp 
+    
+    def get_preconditioner(self, **kwargs):
+        """return a preconditioner for the minimizers built from the bonds and angles
+        
+        The Amber potential has no analytic sparse Hessian, so the
+        preconditioner is built from the force field constants instead.
+        
+        This is untested: it has not yet been run against an AMBER system,
+        so get_minimizer does not use it.  Pass it explicitly, e.g.
+        system.get_minimizer(preconditioner=system.get_preconditioner())
+        
+        See Also
+        --------
+        pygmin.optimize.BondedPreconditioner
+        """
+        from pygmin.optimize import BondedPreconditioner
+        system = getattr(self.potential, "system", None)
+        if system is None:
+            # the GMIN potential has no OpenMM System
+            system = self.potential.prmtop.createSystem(nonbondedMethod=openmm_potential.openmmff.NoCutoff)
+        springs = openmm_potential.bonded_springs(system)
+        return BondedPreconditioner(self.natoms, springs, **kwargs)
    
     def get_permlist(self):
         import pdb2permlist
@@ -10,21 +10,93 @@ Requires:
 
 # TODO: if BasePotential is imported after simtk imports, it gives a seg fault!! 
 from pygmin.potentials import BasePotential
+from Queue import Queue
+
+import numpy as np
 
 from simtk.openmm.app import AmberPrmtopFile, AmberInpcrdFile, Simulation
 from simtk.openmm import * 
-from simtk.unit import   kilocalories_per_mole, kilojoules_per_mole, nanometer, angstrom, picosecond 
+from simtk import unit
+from simtk.unit import   kilocalories_per_mole, kilojoules_per_mole, nanometer, angstrom, picosecond, radian 
 import simtk.openmm.app.forcefield as openmmff
 
-__all__ = ["OpenMMAmberPotential"]
+__all__ = ["OpenMMAmberPotential", "bonded_springs"]
+
+def bonded_springs(system):
+    """return the springs (i, j, k) of the bonds and angles of an OpenMM System
+    
+    k is in kcal/mol/angstrom**2.  An angle i-j-l with force constant
+    k_theta becomes a spring between i and l with the stiffness of the angle
+    along the 1-3 distance, k_theta * (r13 / (b1 * b2 * sin(theta0)))**2,
+    where b1 and b2 are the bond lengths.  The springs are used to build
+    pygmin.optimize.BondedPreconditioner.
+    
+    Notes
+    -----
+    This is untested: it has not yet been run against an AMBER system.
+    """
+    springs = []
+    bondlength = dict()
+    angles = []
+    for n in xrange(system.getNumForces()):
+        force = system.getForce(n)
+        if isinstance(force, HarmonicBondForce):
+            for m in xrange(force.getNumBonds()):
+                i, j, r0, k = force.getBondParameters(m)
+                r0 = r0.value_in_unit(angstrom)
+                springs.append((i, j, k.value_in_unit(kilocalories_per_mole / angstrom**2)))
+                bondlength[(i, j)] = bondlength[(j, i)] = r0
+        elif isinstance(force, HarmonicAngleForce):
+            for m in xrange(force.getNumAngles()):
+                i, j, l, theta0, k = force.getAngleParameters(m)
+                angles.append((i, j, l, theta0.value_in_unit(radian),
+                               k.value_in_unit(kilocalories_per_mole / radian**2)))
+    
+    for i, j, l, theta0, k in angles:
+        b1 = bondlength.get((i, j), 1.)
+        b2 = bondlength.get((j, l), 1.)
+        r13 = np.sqrt(b1**2 + b2**2 - 2. * b1 * b2 * np.cos(theta0))
+        dtheta = r13 / (b1 * b2 * max(np.sin(theta0), 0.1))
+        springs.append((i, l, k * dtheta**2))
+    return springs
+
+class _PooledContext(object):
+    """an OpenMM Context together with its own preallocated position buffer
+    
+    The buffer is wrapped in a Quantity once, in nanometers, so setting the
+    positions neither allocates a new wrapper nor converts units.
+    """
+    def __init__(self, context, natoms):
+        self.context = context
+        self.positions = np.zeros([natoms, 3])
+        self.qpositions = unit.Quantity(self.positions, nanometer)
+    
+    def setPositions(self, coords):
+        # angstrom -> nanometer
+        np.multiply(np.reshape(coords, [-1, 3]), 0.1, self.positions)
+        self.context.setPositions(self.qpositions)
 
 class OpenMMAmberPotential(BasePotential):
     """ 
     OpenMM  
     
     V(r) = Amber 
+    
+    Parameters
+    ----------
+    prmtopFname, inpcrdFname : string
+        the amber topology and coordinate files
+    ncontexts : int, optional
+        the number of independent OpenMM contexts.  Each evaluation checks out
+        one context, so up to ncontexts threads can evaluate the potential at
+        the same time.  getEnergyGradientMany, which is used by NEB,
+        evaluates the configurations on all of them.
+    nthreads : int, optional
+        if given, the contexts use the CPU platform with this many threads
+        each (this needs an OpenMM version with the CPU platform).
+        Otherwise OpenMM picks the platform.
     """
-    def __init__(self, prmtopFname, inpcrdFname  ): # prmtopFname, inpcrdFname ):
+    def __init__(self, prmtopFname, inpcrdFname, ncontexts=1, nthreads=None): # prmtopFname, inpcrdFname ):
 
         self.prmtop = AmberPrmtopFile( prmtopFname )
         self.inpcrd = AmberInpcrdFile( inpcrdFname ) 
@@ -34,7 +106,20 @@ class OpenMMAmberPotential(BasePotential):
         # todo: set up ff and simulation object  
         self.system = self.prmtop.createSystem(nonbondedMethod=openmmff.NoCutoff ) # no cutoff
         self.integrator = VerletIntegrator(0.001*picosecond)
-        self.simulation = Simulation(self.prmtop.topology, self.system , self.integrator)
+        
+        if nthreads is None:
+            self.simulation = Simulation(self.prmtop.topology, self.system , self.integrator)
+            platform = self.simulation.context.getPlatform()
+            properties = dict()
+        else:
+            platform = Platform.getPlatformByName("CPU")
+            # the property was renamed in OpenMM 7
+            if "Threads" in platform.getPropertyNames():
+                properties = {"Threads" : str(nthreads)}
+            else:
+                properties = {"CpuThreads" : str(nthreads)}
+            self.simulation = Simulation(self.prmtop.topology, self.system , self.integrator,
+                                         platform, properties)
         
         #  Another way of setting up potential using just pdb file ( no prmtop ) 
         #pdb = PDBFile('coords.pdb')
@@ -44,6 +129,14 @@ class OpenMMAmberPotential(BasePotential):
         #simulation = Simulation(pdb.topology, system, integrator)
         #simulation.context.setPositions(pdb.positions)
         
+        # the pool of contexts.  the first one belongs to self.simulation
+        self.ncontexts = ncontexts
+        self._contexts = Queue()
+        self._contexts.put(_PooledContext(self.simulation.context, self.natoms))
+        for i in xrange(ncontexts - 1):
+            context = Context(self.system, VerletIntegrator(0.001*picosecond), platform, properties)
+            self._contexts.put(_PooledContext(context, self.natoms))
+        
         # remove units 
         self.localCoords = self.inpcrd.positions/angstrom
         self.kJtokCal    =  kilocalories_per_mole/kilojoules_per_mole 
@@ -57,38 +150,44 @@ class OpenMMAmberPotential(BasePotential):
             self.localCoords[i] = Vec3(coords[3*i], coords[3*i+1] , coords[3*i+2] )              
 
 # '''  ------------------------------------------------------------------- '''
+    def _getState(self, coords, getForces):
+        """set the positions on a free context and fetch energy (and forces) in one call"""
+        pc = self._contexts.get()
+        try:
+            pc.setPositions(coords)
+            return pc.context.getState(getEnergy=True, getForces=getForces)
+        finally:
+            self._contexts.put(pc)
+
     def getEnergy(self, coords):
         """ returns energy in kcal/mol """
-        
-        # using unit.Quantity is 5 times faster than calling copyToLocalCoords!  
-        coordinates = unit.Quantity( coords.reshape(self.natoms,3) , angstrom)        
-        self.simulation.context.setPositions( coordinates )        
-                
-        # attach units to coordinates before computing energy 
-        self.simulation.context.setPositions(coordinates)
-        potE = self.simulation.context.getState(getEnergy=True).getPotentialEnergy()
-
-        # remove units from potE and then convert to kcal/mol to be consistent with GMIN   
-        return potE / kilojoules_per_mole / self.kJtokCal
+        state = self._getState(coords, False)
+        return state.getPotentialEnergy().value_in_unit(kilocalories_per_mole)
 
 #'''  ------------------------------------------------------------------- '''
     def getEnergyGradient(self, coords):
         """ returns energy and gradient in kcal/mol and kcal/mol/angstrom""" 
+        state = self._getState(coords, True)
+        E = state.getPotentialEnergy().value_in_unit(kilocalories_per_mole)
+        # the converted force array is a new array, so it can be negated in place
+        grad = state.getForces(asNumpy=True).value_in_unit(kilocalories_per_mole / angstrom)
+        np.negative(grad, grad)
+        return E, grad.reshape(-1)
+
+    def getEnergyGradientMany(self, coords_stack):
+        """return the energies and gradients of a stack of configurations
         
-        coordinates = unit.Quantity( coords.reshape(self.natoms,3) , angstrom)        
-        self.simulation.context.setPositions( coordinates )        
-        
-        # get pot energy 
-        potE = self.simulation.context.getState(getEnergy=True).getPotentialEnergy()
-            
-        E = potE / kilojoules_per_mole /self.kJtokCal
-        # get forces  
-        forcee = self.simulation.context.getState(getForces=True).getForces(asNumpy=True)
-        # xply to -1 to convert gradient ; divide by 10 to convert to kJ/mol/angstroms 
-        grad = -forcee / ( kilojoules_per_mole / nanometer ) / 10 / self.kJtokCal # todo - 10 is hardcoded   
-                
-        # remove units before returning   
-        return E, grad.reshape(-1)  
+        The configurations are distributed over the pool of contexts
+        """
+        from pygmin.potentials._threaded import get_pool
+        coords_stack = np.asarray(coords_stack)
+        if self.ncontexts > 1:
+            results = get_pool(self.ncontexts).map(self.getEnergyGradient, coords_stack)
+        else:
+            results = map(self.getEnergyGradient, coords_stack)
+        energies = np.array([e for e, g in results])
+        grads = np.array([g for e, g in results])
+        return energies, grads
 '''  ------------------------------------------------------------------- '''
 
 if __name__ == "__main__":
@@ -1,7 +1,10 @@
 import numpy as np
 from pygmin.utils import rotations
 from pygmin.angleaxis import CoordsAdapter
-from pygmin.potentials.fortran.rmdrvt import rmdrvt as rotMatDeriv
+try:
+    from pygmin.potentials.fortran.rmdrvt import rmdrvt as rotMatDeriv
+except ImportError:
+    from pygmin.potentials.numpy_kernels.rmdrvt import rmdrvt as rotMatDeriv
 from pygmin.transition_states import interpolate_linear
 from math import pi
 from pygmin import takestep
@@ -221,7 +224,9 @@ class AATopology(object):
         
         
     '''
-    def __init__(self, sites=[]):
+    def __init__(self, sites=None):
+        if sites is None:
+            sites = []
         self.sites = sites
         
     def add_sites(self, sites):
@@ -1,5 +1,6 @@
 import numpy as np
 import aatopology
+from pygmin.utils.rotations import rot_mat_deriv_many
 from pygmin.potentials.potential import potential
 from pygmin.mindist import StandardClusterAlignment, optimize_permutations, ExactMatchAtomicCluster
 
@@ -140,9 +141,19 @@ class RigidFragment(aatopology.AASiteType):
         self._determine_rotational_symmetry(permlist)
                     
 class RBTopology(aatopology.AATopology):
+    """
+    topology of a system of rigid bodies made of atoms
+    
+    to_atomistic, transform_gradient and redistribute_gradient treat all
+    bodies at once.  The site geometries are packed into arrays of shape
+    (nbodies, nsites, 3), padded with zero-mass atoms for bodies with fewer
+    sites, and the rotation matrices and their derivatives of all bodies are
+    computed in one vectorized call.
+    """
     def __init__(self):
         aatopology.AATopology.__init__(self)
         self.natoms=0
+        self._packed = None
         
     def get_atomtypes(self):
         atom_types = [None for i in xrange(self.natoms)]
@@ -165,6 +176,38 @@ class RBTopology(aatopology.AATopology):
             if not hasattr(site, "atom_indices"):
                 site.atom_indices = range(self.natoms, self.natoms+nsite_atoms)
             self.natoms += nsite_atoms
+        self._packed = None
+    
+    def _get_packed(self):
+        """return the site geometries packed into padded arrays
+        
+        Returns
+        -------
+        positions : array, shape (nbodies, nsites, 3)
+            the atom positions in the body frame, zero for padding
+        indices : array, shape (nbodies, nsites)
+            the atom indices, 0 for padding
+        mask : array of bool, shape (nbodies, nsites)
+            False for padding
+        weights : array, shape (nbodies, nsites)
+            atom mass / body mass, zero for padding
+        """
+        if self._packed is not None and self._packed[0].shape[0] == len(self.sites):
+            return self._packed
+        nbodies = len(self.sites)
+        nsites = max([len(site.atom_positions) for site in self.sites] + [0])
+        positions = np.zeros([nbodies, nsites, 3])
+        indices = np.zeros([nbodies, nsites], np.intp)
+        mask = np.zeros([nbodies, nsites], bool)
+        weights = np.zeros([nbodies, nsites])
+        for b, site in enumerate(self.sites):
+            n = len(site.atom_positions)
+            positions[b,:n] = site.atom_positions
+            indices[b,:n] = site.atom_indices
+            mask[b,:n] = True
+            weights[b,:n] = np.array(site.atom_masses) / site.M
+        self._packed = positions, indices, mask, weights
+        return self._packed
             
     def get_atom_labels(self):
         labels=[]
@@ -175,29 +218,36 @@ class RBTopology(aatopology.AATopology):
     
     def to_atomistic(self, rbcoords):
         ca = self.coords_adapter(rbcoords)
+        positions, indices, mask, weights = self._get_packed()
+        R, dR = rot_mat_deriv_many(ca.rotRigid, False)
+        x = ca.posRigid[:,np.newaxis,:] + np.einsum("bij,bsj->bsi", R, positions)
         atomistic = np.zeros([self.natoms,3])
-        for site, com, p in zip(self.sites, ca.posRigid, ca.rotRigid):
-            atoms = site.to_atomistic(com, p)
-            for i,x in zip(site.atom_indices, atoms):
-                atomistic[i]=x
+        atomistic[indices[mask]] = x[mask]
         return atomistic
 
     def transform_gradient(self, rbcoords, grad):
         ca = self.coords_adapter(rbcoords)
         rbgrad = self.coords_adapter(np.zeros_like(rbcoords))
-        for site, p, g_com, g_p in zip(self.sites, ca.rotRigid,
-                                       rbgrad.posRigid,rbgrad.rotRigid):
-            g_com[:], g_p[:] = site.transform_grad(p, grad.reshape(-1,3)[site.atom_indices])
+        positions, indices, mask, weights = self._get_packed()
+        R, dR = rot_mat_deriv_many(ca.rotRigid, True)
+        g = np.reshape(grad, [-1,3])[indices]
+        g[~mask] = 0.
+        rbgrad.posRigid[:] = g.sum(1)
+        # g_p[k] = sum_s g_s . (dR_k x_s) = sum_ij dR_k[i,j] sum_s g_s[i] x_s[j]
+        gx = np.einsum("bsi,bsj->bij", g, positions)
+        rbgrad.rotRigid[:] = np.einsum("bkij,bij->bk", dR, gx)
         return rbgrad.coords
                 
     def redistribute_gradient(self, rbcoords, rbgrad):
         ca = self.coords_adapter(rbcoords)
         cg = self.coords_adapter(rbgrad)
+        positions, indices, mask, weights = self._get_packed()
+        R, dR = rot_mat_deriv_many(ca.rotRigid, True)
+        dRp = np.einsum("bkij,bk->bij", dR, cg.rotRigid)
+        gatom = np.einsum("bij,bsj->bsi", dRp, positions) + cg.posRigid[:,np.newaxis,:]
+        gatom *= weights[:,:,np.newaxis]
         grad = np.zeros([self.natoms,3])
-        for site, p, g_com, g_p in zip(self.sites, ca.rotRigid, cg.posRigid, cg.rotRigid):
-            gatom = site.redistribute_forces(p, g_com, g_p)
-            for i,x in zip(site.atom_indices, gatom):
-                grad[i]=x
+        grad[indices[mask]] = gatom[mask]
         return grad
     
 class RBPotentialWrapper(potential):
@@ -256,7 +306,7 @@ if __name__ == "__main__":
     gp = rbgrad[3:]
     gx = rbgrad[:3]
     
-    from pygmin.potentials.fortran.rmdrvt import rmdrvt as rotMatDeriv
+    from pygmin.angleaxis.aatopology import rotMatDeriv
     R, R1, R2, R3 = rotMatDeriv(p, True)        
     
     print "test1", np.linalg.norm(R1*gp[0])     
@@ -0,0 +1,49 @@
+import numpy as np
+from copy import deepcopy
+from pygmin.angleaxis.molecules import create_water
+from pygmin.angleaxis import RBTopology, RigidFragment
+import unittest
+
+class TestRBTopologyVectorized(unittest.TestCase):
+    """compare the vectorized RBTopology transforms with the per site versions"""
+    def setUp(self):
+        np.random.seed(0)
+        dimer = RigidFragment()
+        dimer.add_atom("A", np.array([0., 0., 1.]), 1.)
+        dimer.add_atom("B", np.array([0., 0., -1.]), 2.)
+        dimer.finalize_setup()
+        self.topology = RBTopology()
+        self.topology.add_sites([deepcopy(create_water()) for i in xrange(4)]
+                                + [deepcopy(dimer) for i in xrange(3)])
+        nrigid = len(self.topology.sites)
+        self.x = np.random.uniform(-2, 2, 6*nrigid)
+        # a rotation small enough for the first order expansion
+        self.x[3*nrigid:3*nrigid+3] = 1e-8
+    
+    def test_to_atomistic(self):
+        ca = self.topology.coords_adapter(self.x)
+        atomistic = self.topology.to_atomistic(self.x)
+        for site, com, p in zip(self.topology.sites, ca.posRigid, ca.rotRigid):
+            xsite = site.to_atomistic(com, p)
+            self.assertLess(np.max(np.abs(atomistic[site.atom_indices] - xsite)), 1e-12)
+
+    def test_transform_gradient(self):
+        g = np.random.uniform(-1, 1, 3*self.topology.natoms)
+        ca = self.topology.coords_adapter(self.x)
+        rbgrad = self.topology.coords_adapter(self.topology.transform_gradient(self.x, g))
+        for i, site in enumerate(self.topology.sites):
+            g_com, g_p = site.transform_grad(ca.rotRigid[i], g.reshape(-1,3)[site.atom_indices])
+            self.assertLess(np.max(np.abs(rbgrad.posRigid[i] - g_com)), 1e-12)
+            self.assertLess(np.max(np.abs(rbgrad.rotRigid[i] - g_p)), 1e-12)
+
+    def test_redistribute_gradient(self):
+        rbg = np.random.uniform(-1, 1, self.x.size)
+        ca = self.topology.coords_adapter(self.x)
+        cg = self.topology.coords_adapter(rbg)
+        grad = self.topology.redistribute_gradient(self.x, rbg)
+        for i, site in enumerate(self.topology.sites):
+            gsite = site.redistribute_forces(ca.rotRigid[i], cg.posRigid[i], cg.rotRigid[i])
+            self.assertLess(np.max(np.abs(grad[site.atom_indices] - gsite)), 1e-12)
+
+if __name__ == "__main__":
+    unittest.main()
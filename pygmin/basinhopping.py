@@ -1,7 +1,122 @@
 # -*- coding: iso-8859-1 -*-
 import sys
+import numpy as np
 from pygmin.mc import MonteCarlo
 from pygmin.optimize import mylbfgs
+from pygmin.potentials.instrumented_potential import InstrumentedPotential, potential_tag
+
+class EnergyBoundAbort(object):
+    """abort basin hopping quenches which will almost certainly be rejected
+    
+    The Metropolis test accepts a minimum of energy E with probability
+    exp(-(E - markovE) / T), which is less than pmin above the cutoff
+    Ecut = markovE + T * log(1 / pmin).  A quench is aborted if, after
+    nsteps_min iterations, its energy is still more than margin above Ecut
+    and its rms gradient is below rms_max.  The quench is then in its slowly
+    converging tail, where the energy hardly changes any more, so the
+    minimum would be rejected anyway.
+    
+    Pass it as abort_quench to BasinHopping, which keeps markovE and
+    temperature up to date and passes it to the minimizer as
+    abort_criterion.  Outside of a basin hopping step it never aborts.
+    
+    Parameters
+    ----------
+    nsteps_min : int
+        never abort before this many iterations
+    margin : float
+        how far above Ecut the energy must be
+    pmin : float
+        the acceptance probability which defines Ecut
+    rms_max : float
+        never abort while the rms gradient is larger than this
+    """
+    def __init__(self, nsteps_min=50, margin=1., pmin=1e-3, rms_max=1e-1):
+        self.nsteps_min = nsteps_min
+        self.margin = margin
+        self.pmin = pmin
+        self.rms_max = rms_max
+        self.markovE = None
+        self.temperature = None
+    
+    def __call__(self, energy=None, rms=None, nsteps=None, **kwargs):
+        if self.markovE is None:
+            return False
+        if nsteps < self.nsteps_min or rms > self.rms_max:
+            return False
+        ecut = self.markovE + self.temperature * np.log(1. / self.pmin)
+        return energy > ecut + self.margin
+
+
+class StagedQuench(object):
+    """converge every quench loosely, and tightly only the promising ones
+    
+    Only minima which are stored or become the Markov state need to be
+    converged tightly.  Each structure is first quenched with loose_quench.
+    The quench is continued with tight_quench straight away if the energy is
+    less than window above the Markov energy or the lowest minimum in
+    database.  BasinHopping tightens the other minima too if they are
+    accepted or stored.  The Result has stage set to "loose" or "tight".
+    
+    The confCheck and acceptTest of BasinHopping see the energy of the loose
+    minimum, before it is tightened.  The tight energy is only slightly
+    lower, so this rarely changes a decision.
+    
+    Parameters
+    ----------
+    loose_quench, tight_quench : callable
+        quench(coords) returns a Result, e.g. system.get_minimizer(tol=1e-2)
+        and system.get_minimizer()
+    window : float
+    database : Database, optional
+    
+    Attributes
+    ----------
+    markovE : float or None
+        set by BasinHopping before each quench.  If it is None every quench
+        is tightened.
+    nquenches, ntightened : int
+        the number of quenches, and how many of them were tightened
+    """
+    def __init__(self, loose_quench, tight_quench, window=1., database=None):
+        self.loose_quench = loose_quench
+        self.tight_quench = tight_quench
+        self.window = window
+        self.database = database
+        self.markovE = None
+        self.nquenches = 0
+        self.ntightened = 0
+    
+    def promising(self, energy):
+        """return True if a minimum of this energy should be converged tightly"""
+        if self.markovE is None or energy < self.markovE + self.window:
+            return True
+        if self.database is not None:
+            m = self.database.lowest_energy_minimum()
+            if m is not None and energy < m.energy + self.window:
+                return True
+        return False
+    
+    def tighten(self, res):
+        """continue a loosely converged quench with tight_quench"""
+        if res.stage == "tight":
+            return res
+        res2 = self.tight_quench(res.coords)
+        res2.nfev += res.nfev
+        res2.nsteps += res.nsteps
+        res2.stage = "tight"
+        self.ntightened += 1
+        return res2
+    
+    def __call__(self, coords, **kwargs):
+        # kwargs, e.g. abort_criterion, only make sense for the loose stage
+        res = self.loose_quench(coords, **kwargs)
+        res.stage = "loose"
+        self.nquenches += 1
+        if getattr(res, "aborted", False) or not self.promising(res.energy):
+            return res
+        return self.tighten(res)
+
 
 class BasinHopping(MonteCarlo):
     """
@@ -11,9 +126,16 @@ class BasinHopping(MonteCarlo):
     ----------
     All required and optional parameters from base class MonteCarlo :
     quench : callable, optional
-        Use this quencher as default
+        Use this quencher as default.  If it is a StagedQuench it is given
+        the Markov energy, and the loosely converged minima are tightened
+        if they are accepted or stored.
     insert_rejected : bool
         insert the rejected structure into the storage class
+    abort_quench : callable, optional
+        e.g. EnergyBoundAbort.  Every quench is called as
+        quench(coords, abort_criterion=abort_quench), so a custom quench
+        must accept that keyword, otherwise a TypeError is raised.  Aborted
+        quenches are rejected and not stored.  They are counted in naborted.
     
     See Also
     --------
@@ -29,7 +151,8 @@ class BasinHopping(MonteCarlo):
             quench = None, \
             confCheck = [], \
             outstream = sys.stdout,
-            insert_rejected = False
+            insert_rejected = False,
+            abort_quench = None
             ):
         #########################################################################
         #initialize MonteCarlo base class
@@ -42,15 +165,22 @@ class BasinHopping(MonteCarlo):
                             confCheck = confCheck, \
                             outstream=outstream,store_initial=False)
 
+        self.abort_quench = abort_quench
+        self.naborted = 0
+        if abort_quench is None:
+            self._quench_kwargs = dict()
+        else:
+            self._quench_kwargs = dict(abort_criterion=abort_quench)
         if quench is None:
-            quench = lambda coords : mylbfgs(coords, self.potential)
+            quench = lambda coords, **kwargs : mylbfgs(coords, self.potential, **kwargs)
         self.quench = quench
                 
         #########################################################################
         #do initial quench
         #########################################################################
         self.markovE_old = self.markovE
-        res = self.quench(self.coords)
+        with potential_tag("quench"):
+            res = self.quench(self.coords, **self._quench_kwargs)
         
         self.coords = res.coords
         self.markovE = res.energy
@@ -86,7 +216,10 @@ class BasinHopping(MonteCarlo):
         #########################################################################
         #quench
         #########################################################################
-        res = self.quench(self.coords_after_step)
+        self._setQuenchBounds(True)
+        with potential_tag("quench"):
+            res = self.quench(self.coords_after_step, **self._quench_kwargs)
+        self._setQuenchBounds(False)
 #        if isinstance(res, tuple): # for compatability with old and new quenchers
 #            res = res[4]
         self.trial_coords = res.coords
@@ -94,6 +227,15 @@ class BasinHopping(MonteCarlo):
         self.rms = res.rms
         self.funcalls = res.nfev
 
+        #########################################################################
+        # an aborted quench did not reach a minimum, reject it
+        #########################################################################
+        if getattr(res, "aborted", False):
+            self.naborted += 1
+            self.acceptstep = False
+            self.config_ok = False
+            return self.acceptstep, self.trial_coords, self.trial_energy
+
         #########################################################################
         # check if step is a valid configuration, otherwise reject
         #########################################################################
@@ -111,12 +253,57 @@ class BasinHopping(MonteCarlo):
         if self.acceptstep:
             self.acceptstep = self.acceptTest(self.markovE, self.trial_energy, self.coords, self.trial_coords)
 
+        #########################################################################
+        # a loosely converged minimum which is kept must be converged tightly
+        #########################################################################
+        if (getattr(res, "stage", None) == "loose" and self.config_ok 
+                and (self.acceptstep or self.insert_rejected)):
+            with potential_tag("quench"):
+                res = self.quench.tighten(res)
+            self.trial_coords = res.coords
+            self.trial_energy = res.energy
+            self.rms = res.rms
+            self.funcalls = res.nfev
+
         #########################################################################
         #return new coords and energy and whether or not they were accepted
         #########################################################################
         return self.acceptstep, self.trial_coords, self.trial_energy
 
 
+    def _setQuenchBounds(self, active):
+        """give abort_quench and a StagedQuench the current Markov energy
+        
+        If active is False the Markov energy is cleared, so that they do not
+        affect quenches outside of a basin hopping step.
+        """
+        markovE = self.markovE
+        if not active or getattr(self.acceptTest, "_accept_next", False):
+            # the next step is accepted whatever its energy, e.g. when reseeding
+            markovE = None
+        if self.abort_quench is not None:
+            self.abort_quench.markovE = markovE
+            self.abort_quench.temperature = getattr(self.acceptTest, "temperature", self.temperature)
+        if isinstance(self.quench, StagedQuench):
+            self.quench.markovE = markovE
+
+    def run(self, nsteps):
+        """do multiple iterations
+        
+        if the potential is an InstrumentedPotential a summary of the
+        potential calls is printed at the end, and if abort_quench is
+        used the number of aborted quenches, and if the quench is a
+        StagedQuench the number of tightened quenches
+        """
+        MonteCarlo.run(self, nsteps)
+        if self.abort_quench is not None and self.outstream is not None:
+            self.outstream.write("aborted quenches: %d of %d\n" % (self.naborted, self.stepnum))
+        if isinstance(self.quench, StagedQuench) and self.outstream is not None:
+            self.outstream.write("tightened quenches: %d of %d\n" 
+                                 % (self.quench.ntightened, self.quench.nquenches))
+        if isinstance(self.potential, InstrumentedPotential) and self.outstream is not None:
+            self.outstream.write(self.potential.summary() + "\n")
+
     def printStep(self):
         if self.stepnum % self.printfrq == 0:
             if self.outstream != None:
@@ -2,6 +2,7 @@ import networkx as nx
 import numpy as np
 import logging
 
+from pygmin.potentials.instrumented_potential import potential_tag
 
 __all__ = []
 
@@ -139,7 +140,8 @@ class _DistanceGraph(object):
         if dist is not None: return dist
         
         #if it's not already known we must calculate it
-        dist, coords1, coords2 = self.mindist(min1.coords, min2.coords)
+        with potential_tag("mindist"):
+            dist, coords1, coords2 = self.mindist(min1.coords, min2.coords)
         if self.verbosity > 1:
             logger.debug("calculated distance between %s %s %s", min1._id, min2._id, dist)
         self._setDist(min1, min2, dist)
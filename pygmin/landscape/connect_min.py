@@ -4,6 +4,7 @@ import logging
 
 from pygmin.landscape import TSGraph, LocalConnect
 from pygmin.landscape._distance_graph import _DistanceGraph
+from pygmin.potentials.instrumented_potential import InstrumentedPotential
 
 __all__ = ["DoubleEndedConnect"]
 
@@ -483,6 +484,7 @@ class DoubleEndedConnect(object):
             if self.graph.areConnected(self.minstart, self.minend):
                 self.dist_graph.updateDatabase(force=True)
                 logger.info("found connection!")
+                self._reportPotentialCalls()
                 return
             
             logger.info("")
@@ -505,6 +507,13 @@ class DoubleEndedConnect(object):
 
             
         logger.info("failed to find connection between %s %s", self.minstart._id, self.minend._id)
+        self._reportPotentialCalls()
+
+    def _reportPotentialCalls(self):
+        """log a summary of the potential calls if the potential is instrumented"""
+        if isinstance(self.pot, InstrumentedPotential):
+            for line in self.pot.summary().split("\n"):
+                logger.info(line)
 
     def success(self):
         return self.graph.areConnected(self.minstart, self.minend)
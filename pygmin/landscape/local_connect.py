@@ -3,6 +3,7 @@ import logging
 from pygmin.optimize import Result
 from pygmin.transition_states import findTransitionState, minima_from_ts
 from pygmin.transition_states import NEBDriver
+from pygmin.potentials.instrumented_potential import potential_tag
 
 __all__ = ["LocalConnect"]
 
@@ -18,7 +19,8 @@ def _refineTS(pot, coords, tsSearchParams=dict(), eigenvec0=None, pushoff_params
     """
     #run ts search algorithm
     kwargs = dict(tsSearchParams.items())
-    ret = findTransitionState(coords, pot, eigenvec0=eigenvec0, **kwargs)
+    with potential_tag("ts_search"):
+        ret = findTransitionState(coords, pot, eigenvec0=eigenvec0, **kwargs)
     
     #check to make sure it is a valid transition state 
     coords = ret.coords
@@ -33,8 +35,9 @@ def _refineTS(pot, coords, tsSearchParams=dict(), eigenvec0=None, pushoff_params
     
     #find the minima which this transition state connects
     logger.info("falling off either side of transition state to find new minima")
-    ret1, ret2 = minima_from_ts(pot, coords, n = ret.eigenvec, \
-        **pushoff_params)
+    with potential_tag("quench"):
+        ret1, ret2 = minima_from_ts(pot, coords, n = ret.eigenvec, \
+            **pushoff_params)
 #    print "testing", ret1.energy
     
     return True, ret, ret1, ret2
@@ -151,7 +154,8 @@ class LocalConnect(object):
         do NEB between minNEB1 and minNEB2.
         """
         #arrange the coordinates to minimize the distance between them        
-        dist, newcoords1, newcoords2 = self.mindist(minNEB1.coords, minNEB2.coords)
+        with potential_tag("mindist"):
+            dist, newcoords1, newcoords2 = self.mindist(minNEB1.coords, minNEB2.coords)
         logger.info( "")
         
         if repetition == 0: 
@@ -165,9 +169,10 @@ class LocalConnect(object):
         
         logger.info( "starting NEB run to try to connect minima %s %s %s", minNEB1._id, minNEB2._id, dist)
         
-        neb = self.create_neb(self.pot, newcoords1, newcoords2, 
-                         factor=factor, **self.NEBparams)
-        neb = neb.run()
+        with potential_tag("neb"):
+            neb = self.create_neb(self.pot, newcoords1, newcoords2, 
+                             factor=factor, **self.NEBparams)
+            neb = neb.run()
 
         #neb = nebdriver(newcoords1, newcoords2)
         #neb.optimize()
@@ -178,7 +183,8 @@ class LocalConnect(object):
 #            NEBquenchParams["nsteps"] = self.reoptimize_climbing
 #            neb.optimize(**NEBquenchParams)
             neb.quenchParams["nsteps"] = self.reoptimize_climbing
-            neb.optimize()
+            with potential_tag("neb"):
+                neb.optimize()
 
 
     
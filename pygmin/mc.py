@@ -55,6 +55,16 @@ class MonteCarlo(object):
         Default to standard out.
     store_initial : bool, optional
         if True store initial structure
+    use_energy_change : bool, optional
+        if True, and the takestep reports the atoms it moved in 
+        takeStep.moved_atoms, and the potential implements 
+        getEnergyChange, then only the change in energy due to the moved
+        atoms is computed.  For pair potentials this makes a single atom move
+        O(N) rather than O(N**2).
+    resync_energy : int, optional
+        if the energy change is used, the Markov energy is recomputed with a
+        full getEnergy every resync_energy steps, so that the round off error
+        of the energy changes does not build up.  None to never recompute it
     
     See Also
     --------
@@ -68,7 +78,7 @@ class MonteCarlo(object):
             temperature=1.0,
             confCheck=[],
             outstream = sys.stdout, store_initial=True,
-            iprint=1,
+            iprint=1, use_energy_change=True, resync_energy=100,
             ):
         #note: make a local copy of lists of events so that an inputted list is not modified.
         self.coords = np.copy(coords)
@@ -82,6 +92,9 @@ class MonteCarlo(object):
         self.outstream = outstream
         self.printfrq = iprint #controls how often printing is done
         self.confCheck = confCheck
+        self.use_energy_change = use_energy_change
+        self.resync_energy = resync_energy
+        self.nenergy_change = 0
     
         if acceptTest:
             self.acceptTest = acceptTest 
@@ -137,7 +150,16 @@ class MonteCarlo(object):
         #########################################################################
         #calculate new energy
         #########################################################################
-        self.trial_energy = self.potential.getEnergy(self.trial_coords)
+        moved_atoms = getattr(self.takeStep, "moved_atoms", None)
+        if (self.use_energy_change and moved_atoms is not None 
+                and hasattr(self.potential, "getEnergyChange")):
+            self.nenergy_change += 1
+            if self.resync_energy and self.nenergy_change % self.resync_energy == 0:
+                self.markovE = self.potential.getEnergy(self.coords)
+            self.trial_energy = self.markovE + self.potential.getEnergyChange(
+                                    self.coords, self.trial_coords, moved_atoms)
+        else:
+            self.trial_energy = self.potential.getEnergy(self.trial_coords)
         
         
         
@@ -203,6 +225,66 @@ class MonteCarlo(object):
 
 
 
+import unittest
+class TestMCEnergyChange(unittest.TestCase):
+    """check that the incremental energies agree with the full energy"""
+    def lattice(self, n, a=1.15):
+        """a slightly perturbed cubic lattice, so that no atoms overlap"""
+        g = np.arange(n) * a
+        coords = np.array([[x, y, z] for x in g for y in g for z in g]).flatten()
+        return coords + np.random.uniform(-.05, .05, coords.shape)
+
+    def check(self, pot, coords, takestep, nsteps=50):
+        mc = MonteCarlo(coords, pot, takestep, outstream=None, temperature=10.)
+        mc.run(nsteps)
+        self.assertGreater(mc.naccepted, 0)
+        self.assertAlmostEqual(mc.markovE, pot.getEnergy(mc.coords), 6)
+
+    def test_lj(self):
+        from pygmin.potentials import LJ
+        from pygmin.takestep import UniformDisplacement
+        coords = self.lattice(3)
+        self.check(LJ(), coords, UniformDisplacement(srange=slice(3,6), stepsize=0.1))
+
+    def test_resync(self):
+        from pygmin.potentials import LJ
+        from pygmin.takestep import UniformDisplacement
+        coords = self.lattice(3)
+        pot = LJ()
+        mc = MonteCarlo(coords, pot, UniformDisplacement(srange=slice(3,6), stepsize=0.1), 
+                        outstream=None, temperature=10., resync_energy=5)
+        mc.run(4)
+        mc.markovE += 1.
+        mc.run(1)
+        # the error was removed before the fifth step
+        self.assertAlmostEqual(mc.markovE, pot.getEnergy(mc.coords), 6)
+
+    def test_neighbor_list_build(self):
+        # large steps, so that the list built at the start does not stay valid
+        from pygmin.potentials.ljcut import LJCut
+        from pygmin.utils.neighbor_list import NeighborListSubsetBuild, NeighborListPotentialBuild
+        from pygmin.takestep import UniformDisplacement
+        coords = self.lattice(3)
+        natoms = len(coords) / 3
+        pot = NeighborListPotentialBuild(NeighborListSubsetBuild(natoms, 2.5, range(natoms), rskin=0.3),
+                                         LJCut(rcut=2.5))
+        pot.buildList(coords)
+        mc = MonteCarlo(coords, pot, UniformDisplacement(srange=slice(3,6), stepsize=0.5), 
+                        outstream=None, temperature=10., resync_energy=None)
+        mc.run(50)
+        self.assertGreater(mc.naccepted, 0)
+        self.assertGreater(pot.neighborList.buildcount, 1)
+        self.assertAlmostEqual(mc.markovE, LJCut(rcut=2.5).getEnergy(mc.coords), 6)
+
+    def test_blj_exchange(self):
+        from pygmin.potentials import LJpshift
+        from pygmin.takestep import ParticleExchange
+        natoms, ntypeA = 27, 21
+        coords = self.lattice(3)
+        pot = LJpshift(natoms, ntypeA, boxl=3.45)
+        self.check(pot, coords, ParticleExchange(range(ntypeA), range(ntypeA, natoms)))
+
+
 if __name__ == "__main__":
     from pygmin.systems import LJCluster
     natoms = 13
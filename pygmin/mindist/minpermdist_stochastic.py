@@ -150,8 +150,7 @@ class MinPermDistCluster(object):
                 return dist, coords1, x2
         
         # if we didn't find a perfect match here, try random rotations to optimize the match
-        for i in range(self.niter):
-            rot = rotations.aa2mx(rotations.random_aa())
+        for rot in rotations.aa2mx_many(rotations.random_aa_many(self.niter)):
             self.check_match(x1, x2, rot, False)
             if(self.transform.can_invert()):
                 self.check_match(x1, x2, rot, True)
@@ -55,6 +55,20 @@ lbfgs potentially fail with non-Hamiltonian systems.
    MYLBFGS
    mylbfgs
    lbfgs_scipy
+   BatchLBFGS
+   batch_lbfgs
+
+Preconditioners
+---------------
+LBFGS and MYLBFGS accept a preconditioner, which approximates the
+Hessian of stiff systems.
+
+.. autosummary::
+    :toctree: generated/
+    
+    SparseHessianPreconditioner
+    BondedPreconditioner
+    MetricTensorPreconditioner
 
 Fire
 ----
@@ -85,5 +99,7 @@ These are not used very often and may be buggy.
 from result import *
 from _lbfgs_py import *
 from _mylbfgs import *
+from _batch_lbfgs import *
+from _preconditioners import *
 from _fire import *
 from _quench import *
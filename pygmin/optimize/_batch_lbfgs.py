@@ -0,0 +1,301 @@
+import numpy as np
+import logging
+
+from pygmin.optimize import Result
+
+__all__ = ["BatchLBFGS"]
+
+_logger = logging.getLogger("pygmin.optimize")
+
+
+def _energy_gradient_many(pot, X):
+    """return the energies and gradients of the rows of X from a single call if possible"""
+    if hasattr(pot, "getEnergyGradientMany"):
+        return pot.getEnergyGradientMany(X)
+    energies = np.zeros(len(X))
+    grads = np.zeros(X.shape)
+    for i in xrange(len(X)):
+        energies[i], grads[i,:] = pot.getEnergyGradient(X[i,:])
+    return energies, grads
+
+
+class BatchLBFGS(object):
+    """
+    minimize many independent structures at once using the LBFGS routine
+
+    This is the same algorithm as LBFGS, but all structures take their
+    steps in lockstep.  The LBFGS update, the step size control and the
+    convergence test are done with numpy operations over the whole batch, and
+    the energies and gradients are computed with a single call to
+    pot.getEnergyGradientMany per step.  For small systems, where the
+    python overhead of each LBFGS iteration is larger than the cost of the
+    potential, this is much faster than minimizing the structures one at a
+    time.  Structures which have converged or failed are removed from the
+    batch.
+
+    Parameters
+    ----------
+    coords_stack : array, shape (nconf, ndof)
+        the starting configurations, one per row
+    pot :
+        the potential object.  If it has no getEnergyGradientMany the
+        configurations are evaluated one at a time.
+    nsteps : int
+        the maximum number of iterations
+    tol : float
+        a structure has converged when its rms grad is less than tol
+    iprint : int
+        how often to print status information
+    maxstep : float
+        the maximum step size
+    maxErise : float
+        the maximum the energy is alowed to rise during a step.
+    M : int
+        the number of previous iterations to use in determining the optimal step
+    rel_energy : bool
+        if True, then maxErise the the *relative* maximum the energy is allowed
+        to rise during a step
+    H0 : float
+        the initial guess for the inverse diagonal Hessian
+    logger : logger object
+        messages will be passed to this logger rather than the default
+
+    Notes
+    -----
+    Events and alternate stop criteria are not supported.  run() returns
+    a list with a Result for each structure, in the order of coords_stack.
+
+    See Also
+    --------
+    LBFGS : the single structure version
+    batch_lbfgs : a function wrapper
+    """
+    def __init__(self, coords_stack, pot, maxstep=0.1, maxErise=1e-4, M=4,
+                 rel_energy=False, H0=1., iprint=-1, nsteps=10000, tol=1e-6,
+                 logger=None):
+        self.X = np.array(coords_stack, dtype=float)
+        if self.X.ndim != 2:
+            raise ValueError("coords_stack must have shape (nconf, ndof)")
+        self.pot = pot
+        self.maxstep = maxstep
+        self.maxErise = maxErise
+        self.rel_energy = rel_energy
+        self.iprint = iprint
+        self.nsteps = nsteps
+        self.tol = tol
+        if logger is None:
+            self.logger = _logger
+        else:
+            self.logger = logger
+
+        K, N = self.X.shape
+        self.nconf = K
+        self.N = N
+        self.M = M
+
+        if H0 is None:
+            H0 = 1.
+        if H0 < 1e-10:
+            self.logger.warning("initial guess for inverse Hessian diagonal is negative or too small %s %s",
+                                H0, "resetting it to 1.")
+            H0 = 1.
+
+        # the state of the structures still being minimized.  Row j belongs to
+        # the structure self.active[j]
+        self.active = np.arange(K)
+        self.s = np.zeros([K,M,N])  #position updates
+        self.y = np.zeros([K,M,N])  #gradient updates
+        self.rho = np.zeros([K,M])
+        self.H0 = np.ones(K) * H0
+        self.k = np.zeros(K, dtype=int)
+        self.Xold = np.zeros([K,N])
+        self.Gold = np.zeros([K,N])
+        self.nfailed = np.zeros(K, dtype=int)
+        self.funcalls = np.zeros(K, dtype=int)
+        self.stepsize = np.zeros(K)
+
+        self.results = [None] * K
+
+    _state = ["active", "s", "y", "rho", "H0", "k", "Xold", "Gold", "nfailed",
+              "funcalls", "stepsize"]
+
+    def getStep(self, X, G):
+        """
+        Calculate the LBFGS step of each structure in the batch
+        """
+        M = self.M
+        n = len(X)
+        rows = np.arange(n)
+        k = self.k
+
+        # we have a new X and G, save the changes in s and y
+        u = rows[k > 0]
+        if len(u) > 0:
+            km1 = (k[u] - 1) % M
+            ds = X[u] - self.Xold[u]
+            dg = G[u] - self.Gold[u]
+            self.s[u,km1] = ds
+            self.y[u,km1] = dg
+
+            YS = (ds * dg).sum(1)
+            if np.any(YS == 0.):
+                self.logger.warning("resetting YS to 1 in batch lbfgs")
+                YS[YS == 0.] = 1.
+            self.rho[u,km1] = 1. / YS
+
+            # scale H0 according to H_k = YS/YY * H_0, as in LBFGS
+            YY = (dg * dg).sum(1)
+            if np.any(YY == 0.):
+                self.logger.warning("resetting YY to 1 in batch lbfgs")
+                YY[YY == 0.] = 1.
+            self.H0[u] = YS / YY
+
+        self.Xold[:] = X
+        self.Gold[:] = G
+
+        # the two loop recursion.  m counts back from the most recent
+        # update, which is stored at index (k - 1) % M
+        nvalid = np.minimum(k, M)
+        a = np.zeros([n,M])
+        q = G.copy()
+        for m in xrange(1, M + 1):
+            valid = m <= nvalid
+            if not valid.any():
+                break
+            i = (k - m) % M
+            a[:,m-1] = np.where(valid, self.rho[rows,i] * (self.s[rows,i] * q).sum(1), 0.)
+            q -= a[:,m-1,np.newaxis] * self.y[rows,i]
+
+        z = q * self.H0[:,np.newaxis]
+        for m in xrange(M, 0, -1):
+            valid = m <= nvalid
+            if not valid.any():
+                continue
+            i = (k - m) % M
+            beta = self.rho[rows,i] * (self.y[rows,i] * z).sum(1)
+            z += np.where(valid, a[:,m-1] - beta, 0.)[:,np.newaxis] * self.s[rows,i]
+
+        stp = -z
+
+        # make the first guess for the step length cautious
+        first = k == 0
+        if first.any():
+            gnorm = np.sqrt((G[first]**2).sum(1))
+            stp[first] *= np.minimum(gnorm, 1. / gnorm)[:,np.newaxis]
+
+        self.k += 1
+        return stp
+
+    def adjustStepSize(self, X, E, G, stp):
+        """
+        take the proposed steps, reducing the step size of each structure
+        until its energy does not rise more than maxErise
+
+        A structure for which the step is reduced more than 10 times is not
+        moved and its LBFGS memory is reset.  See LBFGS.adjustStepSize
+        """
+        n = len(X)
+        # make sure the steps are downhill
+        uphill = (G * stp).sum(1) > 0
+        stp[uphill] *= -1
+
+        stepsize = np.sqrt((stp**2).sum(1))
+        f = np.ones(n)
+        big = stepsize > self.maxstep
+        f[big] = self.maxstep / stepsize[big]
+
+        Xnew = X.copy()
+        Enew = E.copy()
+        Gnew = G.copy()
+        nincrease = np.zeros(n, dtype=int)
+        pending = np.arange(n)
+        while len(pending) > 0:
+            Xtrial = X[pending] + f[pending,np.newaxis] * stp[pending]
+            Etrial, Gtrial = _energy_gradient_many(self.pot, Xtrial)
+            self.funcalls[pending] += 1
+
+            if self.rel_energy:
+                dE = (Etrial - E[pending]) / np.abs(np.where(Etrial == 0, 1e-100, Etrial))
+            else:
+                dE = Etrial - E[pending]
+            Xnew[pending] = Xtrial
+            Enew[pending] = Etrial
+            Gnew[pending] = Gtrial
+
+            rejected = pending[~(dE <= self.maxErise)]
+            f[rejected] /= 10.
+            nincrease[rejected] += 1
+            pending = rejected[nincrease[rejected] <= 10]
+
+        failed = nincrease > 10
+        if failed.any():
+            self.logger.warning("batch lbfgs: %d structures had trouble finding a good step size",
+                                failed.sum())
+            self.nfailed[failed] += 1
+            self.H0[failed] = 1.
+            self.k[failed] = 0
+            Xnew[failed] = X[failed]
+            Enew[failed] = E[failed]
+            Gnew[failed] = G[failed]
+
+        self.stepsize = f * stepsize
+        return Xnew, Enew, Gnew
+
+    def _retire(self, done, X, E, G, rms, nsteps, success, message=None):
+        """store the results of the structures in done and remove them from the batch"""
+        for j in np.where(done)[0]:
+            res = Result()
+            res.message = [] if message is None else [message]
+            res.success = success
+            res.nsteps = nsteps
+            res.nfev = self.funcalls[j]
+            res.coords = X[j].copy()
+            res.energy = E[j]
+            res.rms = rms[j]
+            res.grad = G[j].copy()
+            res.H0 = self.H0[j]
+            self.results[self.active[j]] = res
+        keep = ~done
+        for name in self._state:
+            setattr(self, name, getattr(self, name)[keep])
+        return X[keep], E[keep], G[keep], rms[keep]
+
+    def run(self):
+        """
+        the main loop of the algorithm
+
+        Returns
+        -------
+        results : list of Result
+        """
+        X = self.X
+        sqrtN = np.sqrt(self.N)
+
+        i = 1
+        E, G = _energy_gradient_many(self.pot, X)
+        self.funcalls += 1
+        rms = np.sqrt((G**2).sum(1)) / sqrtN
+        while i < self.nsteps and len(X) > 0:
+            stp = self.getStep(X, G)
+            X, E, G = self.adjustStepSize(X, E, G, stp)
+            rms = np.sqrt((G**2).sum(1)) / sqrtN
+
+            if self.iprint > 0 and i % self.iprint == 0:
+                self.logger.info("batch lbfgs: %s %s %s %s %s %s %s", i, "active", len(X),
+                                 "Emin", E.min(), "max rms", rms.max())
+
+            failed = self.nfailed > 10
+            if failed.any():
+                self.logger.error("batch lbfgs: problem with adjustStepSize, ending quench of %d structures",
+                                  failed.sum())
+                X, E, G, rms = self._retire(failed, X, E, G, rms, i, False,
+                                            "problem with adjustStepSize")
+
+            done = rms < self.tol
+            if done.any():
+                X, E, G, rms = self._retire(done, X, E, G, rms, i, True)
+            i += 1
+
+        if len(X) > 0:
+            self._retire(np.ones(len(X), dtype=bool), X, E, G, rms, i, False)
+        return self.results
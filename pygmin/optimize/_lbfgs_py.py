@@ -1,5 +1,7 @@
 import numpy as np
 import logging
+from math import sqrt
+from scipy.linalg.blas import daxpy
 
 #from bfgs import lineSearch, BFGS
 from optimization_exceptions import LineSearchError
@@ -41,10 +43,18 @@ class LBFGS(object):
         implementation of LBFGS takes all the inverse diagonal components to be the same. 
     events : list of callables
         these are called after each iteration.  events can also be added using
-        attachEvent()
+        attachEvent().  They are passed a copy of the coords.
     alternate_stop_criterion : callable
         this criterion will be used rather than rms gradiant to determine when
         to stop the iteration
+    preconditioner : object, optional
+        e.g. SparseHessianPreconditioner.  If given, preconditioner.solve(v)
+        is used in place of H0 * v in the LBFGS update, with H0 a scalar
+        rescaling.  preconditioner.update(X) is called at each step.
+    abort_criterion : callable, optional
+        called after each iteration as abort_criterion(energy=e, rms=rms,
+        nsteps=i).  If it returns True the quench is abandoned unconverged
+        and the result has aborted set to True.
     debug : 
         print debugging information
     logger : logger object
@@ -73,7 +83,8 @@ class LBFGS(object):
     def __init__(self, X, pot, maxstep = 0.1, maxErise = 1e-4, M=4, 
                  rel_energy = False, H0=1., events=[],
                  alternate_stop_criterion=None, debug=False,
-                 iprint=-1, nsteps=10000, tol=1e-6, logger=None):
+                 iprint=-1, nsteps=10000, tol=1e-6, logger=None,
+                 abort_criterion=None, preconditioner=None):
         self.X = X
         self.pot = pot
         e, self.G = self.pot.getEnergyGradient(self.X)
@@ -91,6 +102,10 @@ class LBFGS(object):
             self.logger = logger
     
         self.alternate_stop_criterion = alternate_stop_criterion
+        self.abort_criterion = abort_criterion
+        self.preconditioner = preconditioner
+        if preconditioner is not None:
+            preconditioner.reset()
         self.debug = debug #print debug messages
         
         self.N = len(X)
@@ -103,7 +118,15 @@ class LBFGS(object):
         self.a = np.zeros(M)  #approximation for the inverse hessian
         #self.beta = np.zeros(M) #working space
         
+        # views of the rows of s and y, so the two loop recursion does not
+        # create new ones each step
+        self._srows = list(self.s)
+        self._yrows = list(self.y)
+        
         self.q = np.zeros(N)  #working space
+        # adjustStepSize writes the trial coordinates into whichever of
+        # these does not hold the current coordinates
+        self._Xbuf = [np.zeros(N), np.zeros(N)]
         
         if H0 is None:
             self.H0 = 1.
@@ -139,6 +162,8 @@ class LBFGS(object):
         http://dx.doi.org/10.1007/BF01589116
         """
         self.G = G #saved for the line search
+        if self.preconditioner is not None:
+            self.preconditioner.update(X)
         
         s = self.s
         y = self.y
@@ -154,8 +179,8 @@ class LBFGS(object):
         #we have a new X and G, save in s and y
         if k > 0:
             km1 = (k + M - 1) % M  #=k-1  cyclical
-            s[km1,:] = X - self.Xold
-            y[km1,:] = G - self.Gold
+            np.subtract(X, self.Xold, out=s[km1,:])
+            np.subtract(G, self.Gold, out=y[km1,:])
             
             YS = np.dot(s[km1,:], y[km1,:])
             if YS == 0.:
@@ -168,8 +193,12 @@ class LBFGS(object):
             # H_k = YS/YY * H_0 
             # this is described in Liu and Nocedal 1989 
             # http://dx.doi.org/10.1007/BF01589116
-            # note: for this step we assume H0 is always the identity
-            YY = np.dot( y[km1,:], y[km1,:] )
+            # note: for this step we assume H0 is always the identity, or 
+            # the preconditioner, in which case YY = y P^-1 y
+            if self.preconditioner is None:
+                YY = np.dot( y[km1,:], y[km1,:] )
+            else:
+                YY = np.dot( y[km1,:], self.preconditioner.solve(y[km1,:]) )
             if YY == 0.:
                 self.logger.warning("warning: resetting YY to 1 in lbfgs %s", YY)
                 YY = 1.
@@ -179,25 +208,34 @@ class LBFGS(object):
         self.Gold[:] = G[:]
 
         
-        q[:] = G[:]
-        myrange = [ i % M for i in range(max([0,k-M]), k, 1) ]
-        #print "myrange", myrange, ki, k
-        for i in reversed(myrange):
-            a[i] = rho[i] * np.dot( s[i,:], q )
-            q -= a[i] * y[i,:]
-        
-        #z[:] = self.H0[ki] * q[:]
-        z = q #q is not used anymore after this, so we can use it as workspace
+        # the two loop recursion over the last min(k, M) updates.  The
+        # vector updates are done in place with the blas axpy, which for small
+        # systems is several times faster than the equivalent numpy calls
+        q[:] = G
+        srows = self._srows
+        yrows = self._yrows
+        kmin = max(0, k - M)
+        for j in xrange(k - 1, kmin - 1, -1):
+            i = j % M
+            a[i] = rho[i] * np.dot( srows[i], q )
+            q = daxpy(yrows[i], q, a=-a[i])
+        
+        if self.preconditioner is None:
+            z = q #q is not used anymore after this, so we can use it as workspace
+        else:
+            z = q
+            z[:] = self.preconditioner.solve(q)
         z *= self.H0
-        for i in myrange:
-            beta = rho[i] * np.dot( y[i,:], z )
-            z += s[i,:] * (a[i] - beta)
+        for j in xrange(kmin, k):
+            i = j % M
+            beta = rho[i] * np.dot( yrows[i], z )
+            z = daxpy(srows[i], z, a=a[i] - beta)
         
-        self.stp[:] = -z[:]
+        np.negative(z, out=self.stp)
         
         if k == 0:
             #make first guess for the step length cautious
-            gnorm = np.linalg.norm(G)
+            gnorm = sqrt(np.dot(G, G))
             self.stp *= min(gnorm, 1./gnorm)
         
         #we now have the step direction.  now take the step
@@ -230,17 +268,22 @@ class LBFGS(object):
         
         """
         f = 1.
-        X0 = X.copy()
-        G0 = G.copy()
+        # X0 and G0 are never modified, so they need not be copied
+        X0 = X
+        G0 = G
         E0 = E
         maxErise = self.maxErise
+        if self._Xbuf[0] is not X0:
+            Xtrial = self._Xbuf[0]
+        else:
+            Xtrial = self._Xbuf[1]
         
         if np.dot(G, stp) > 0:
             #print "overlap was negative, reversing step direction"
-            stp = -stp
+            stp *= -1
             self.stp = stp
         
-        stepsize = np.linalg.norm(stp)
+        stepsize = sqrt(np.dot(stp, stp))
         
         if f*stepsize > self.maxstep:
             f = self.maxstep / stepsize
@@ -249,7 +292,9 @@ class LBFGS(object):
         #self.nfailed = 0
         nincrease = 0
         while True:
-            X = X0 + f * stp
+            np.multiply(stp, f, out=Xtrial)
+            Xtrial += X0
+            X = Xtrial
             E, G = self.pot.getEnergyGradient(X)
             self.funcalls += 1
             
@@ -320,8 +365,9 @@ class LBFGS(object):
         i = 1
         self.funcalls += 1
         e, G = self.pot.getEnergyGradient(X)
-        rms = np.linalg.norm(G) / sqrtN
+        rms = sqrt(np.dot(G, G)) / sqrtN
         res.success = False
+        res.aborted = False
         while i < nsteps:
             stp = self.getStep(X, G)
             
@@ -329,21 +375,22 @@ class LBFGS(object):
                 X, e, G = self.adjustStepSize(X, e, G, stp)
             except LineSearchError:
                 self.logger.error("problem with adjustStepSize, ending quench")
-                rms = np.linalg.norm(G) / sqrtN
+                rms = sqrt(np.dot(G, G)) / sqrtN
                 self.logger.error("    on failure: quench step %s %s %s %s", i, e, rms, self.funcalls)
                 res.message.append( "problem with adjustStepSize" )
                 break
             #e, G = self.pot.getEnergyGradient(X)
             
-            rms = np.linalg.norm(G) / sqrtN
+            rms = sqrt(np.dot(G, G)) / sqrtN
 
             
             if iprint > 0:
                 if i % iprint == 0:
                     self.logger.info("lbfgs: %s %s %s %s %s %s %s %s %s", i, "E", e, 
                                      "rms", rms, "funcalls", self.funcalls, "stepsize", self.stepsize)
+            # X is one of the work arrays, which the next step overwrites
             for event in self.events:
-                event(coords=X, energy=e, rms=rms)
+                event(coords=X.copy(), energy=e, rms=rms)
       
             if self.alternate_stop_criterion is None:
                 i_am_done = rms < self.tol
@@ -354,11 +401,16 @@ class LBFGS(object):
             if i_am_done:
                 res.success = True
                 break
+            if self.abort_criterion is not None:
+                if self.abort_criterion(energy=e, rms=rms, nsteps=i):
+                    res.aborted = True
+                    res.message.append("aborted by abort_criterion")
+                    break
             i += 1
         
         res.nsteps = i
         res.nfev = self.funcalls
-        res.coords = X
+        res.coords = X.copy()
         res.energy = e
         res.rms = rms
         res.grad = G
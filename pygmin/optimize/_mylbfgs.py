@@ -37,6 +37,12 @@ class MYLBFGS(LBFGS):
         self.H0vec = np.ones(N) * self.H0 #initial guess for the hessian
 
         self.W = np.zeros(N*(2*M+1)+2*M) #mylbfgs working space
+        # views of the storage for the search steps and the gradient
+        # differences in W, one for each of the M updates
+        ISPT = N + 2*M     # index for storage of search steps
+        IYPT = ISPT + N*M  # index for storage of gradient differences
+        self._Ws = [self.W[ISPT + N*j : ISPT + N*(j+1)] for j in xrange(M)]
+        self._Wy = [self.W[IYPT + N*j : IYPT + N*(j+1)] for j in xrange(M)]
         self.iter = 0
         self.point = 0
         
@@ -45,29 +51,22 @@ class MYLBFGS(LBFGS):
         """
         use the Fortran LBFGS code from GMIN to get the step
         size and direction.
+        
+        The Fortran code does not support a preconditioner, so with one the
+        step of the base class is used.
         """
+        if self.preconditioner is not None:
+            return LBFGS.getStep(self, X, G)
         self.X = X
         self.G = G
         #save the position and gradient change
         if self.iter > 0:
-            N = self.N
-            M = self.M
-            
-            #
-            # need write the change in position and the change in gradient
-            # to W.  This should be done more elegantly
-            #
-            ISPT= N + 2*M     # index for storage of search steps
-            IYPT= ISPT + N*M  # index for storage of gradient differences
-
-            NPT = N*((self.point + M - 1) % M)  
-            #s = X - self.Xold
-            #y = G - self.Gold
-            #print "YS YY py", np.dot( y, s ), np.dot( y,y ), ISPT+NPT
-            self.W[ISPT+NPT : ISPT+NPT +N] = X - self.Xold
-            self.W[IYPT+NPT : IYPT+NPT +N] = G - self.Gold    
-        self.Xold = X.copy()
-        self.Gold = G.copy()
+            # write the change in position and the change in gradient to W
+            j = (self.point + self.M - 1) % self.M
+            np.subtract(X, self.Xold, out=self._Ws[j])
+            np.subtract(G, self.Gold, out=self._Wy[j])
+        self.Xold[:] = X
+        self.Gold[:] = G
 
         
         #print self.iter, self.point
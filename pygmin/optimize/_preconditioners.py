@@ -0,0 +1,351 @@
+"""
+preconditioners for LBFGS
+
+A preconditioner approximates the Hessian by a positive definite matrix P.
+LBFGS uses P^-1 in place of the scalar initial inverse Hessian H0, so
+degrees of freedom with very different stiffnesses, e.g. bonds and angles,
+or translations and rotations of rigid bodies, converge at a similar rate.
+P is rebuilt and factorized only every update_interval steps.
+
+Pass a preconditioner to the minimizer, e.g.::
+
+    quench = system.get_minimizer(preconditioner=SparseHessianPreconditioner(pot))
+"""
+import numpy as np
+
+__all__ = ["BasePreconditioner", "SparseHessianPreconditioner",
+           "BondedPreconditioner", "MetricTensorPreconditioner"]
+
+
+def _laplacian_matrix(k, shift, dim):
+    """return the graph Laplacian of the stiffnesses k, one copy per cartesian direction
+    
+    k is a symmetric scipy.sparse matrix of the pair stiffnesses.  A diagonal
+    shift relative to the mean degree makes the matrix positive definite.
+    """
+    import scipy.sparse
+    natoms = k.shape[0]
+    degree = np.asarray(k.sum(1)).ravel()
+    laplacian = scipy.sparse.diags(degree, 0) - k
+    mu = shift * max(degree.mean(), 1e-10)
+    P = scipy.sparse.kron(laplacian, scipy.sparse.identity(dim))
+    return (P + mu * scipy.sparse.identity(natoms * dim)).tocsc()
+
+
+class BasePreconditioner(object):
+    """the interface of the LBFGS preconditioners
+
+    Derived classes implement factorize(coords), which builds and factorizes
+    P at coords, and solve(v), which returns P^-1 v.
+
+    Parameters
+    ----------
+    update_interval : int
+        P is rebuilt every update_interval steps
+    """
+    def __init__(self, update_interval=20):
+        self.update_interval = update_interval
+        self._nsteps = 0
+
+    def reset(self):
+        """rebuild P at the next step.  LBFGS calls this at the start of each quench"""
+        self._nsteps = 0
+
+    def update(self, coords):
+        """called by LBFGS at each step.  Rebuild P if it is due"""
+        if self._nsteps % self.update_interval == 0:
+            self.factorize(coords)
+        self._nsteps += 1
+
+    def factorize(self, coords):
+        raise NotImplementedError
+
+    def solve(self, v):
+        raise NotImplementedError
+
+
+class SparseHessianPreconditioner(BasePreconditioner):
+    """precondition with the pair stiffnesses from the sparse Hessian
+
+    The stiffness of the bond between atoms i and j is taken as the absolute
+    trace of the (i, j) block of the Hessian divided by dim.  P is the graph
+    Laplacian of these stiffnesses, one copy for each cartesian direction,
+    plus a small diagonal shift which makes it positive definite.  Unlike the
+    Hessian itself P is positive definite everywhere, also far from a minimum.
+
+    Parameters
+    ----------
+    pot : potential object
+        it must have getSparseHessian.  If that is not analytical, as for
+        the default which converts the dense Hessian, use
+        BondedPreconditioner if the bonds are known, or else a large
+        update_interval.
+    shift : float
+        the diagonal shift relative to the mean diagonal of the Laplacian
+    dim : int
+        the number of coordinates per atom
+    update_interval : int
+        P is rebuilt every update_interval steps
+    """
+    def __init__(self, pot, shift=1e-2, dim=3, update_interval=20):
+        BasePreconditioner.__init__(self, update_interval=update_interval)
+        self.pot = pot
+        self.shift = shift
+        self.dim = dim
+        self._solve = None
+
+    def stiffness_matrix(self, coords):
+        """return P as a scipy.sparse matrix"""
+        import scipy.sparse
+        dim = self.dim
+        natoms = len(coords) / dim
+        hess = self.pot.getSparseHessian(coords).tocoo()
+
+        # sum the traces of the off diagonal 3x3 blocks
+        keep = (hess.row % dim == hess.col % dim) & (hess.row / dim != hess.col / dim)
+        trace = scipy.sparse.coo_matrix((hess.data[keep], (hess.row[keep] / dim, hess.col[keep] / dim)),
+                                        shape=(natoms, natoms)).tocsr()
+        return _laplacian_matrix(abs(trace) / dim, self.shift, dim)
+
+    def factorize(self, coords):
+        import scipy.sparse.linalg
+        self._solve = scipy.sparse.linalg.factorized(self.stiffness_matrix(coords))
+
+    def solve(self, v):
+        return self._solve(v)
+
+
+class BondedPreconditioner(BasePreconditioner):
+    """precondition with the force constants of the bonded interactions
+    
+    For potentials without an analytic sparse Hessian, e.g. AMBER, P is built
+    from the topology instead.  It is the graph Laplacian of the spring
+    constants of the bonds, and of the 1-3 pairs of the angles, one copy for
+    each cartesian direction, plus a small diagonal shift.  P does not depend
+    on the coordinates, so it is factorized only once.
+    
+    Parameters
+    ----------
+    natoms : int
+        the number of atoms
+    springs : list of (i, j, k)
+        the atom pairs and their spring constants, e.g. from
+        pygmin.amber.openmm_potential.bonded_springs
+    shift : float
+        the diagonal shift relative to the mean diagonal of the Laplacian
+    dim : int
+        the number of coordinates per atom
+    """
+    def __init__(self, natoms, springs, shift=1e-2, dim=3):
+        BasePreconditioner.__init__(self)
+        springs = np.array(springs, dtype=float).reshape(-1, 3)
+        self.natoms = natoms
+        self.I = springs[:,0].astype(int)
+        self.J = springs[:,1].astype(int)
+        self.k = np.abs(springs[:,2])
+        self.shift = shift
+        self.dim = dim
+        self._solve = None
+
+    def update(self, coords):
+        if self._solve is None:
+            self.factorize(coords)
+
+    def stiffness_matrix(self, coords=None):
+        """return P as a scipy.sparse matrix"""
+        import scipy.sparse
+        k = scipy.sparse.coo_matrix((self.k, (self.I, self.J)), 
+                                    shape=(self.natoms, self.natoms)).tocsr()
+        return _laplacian_matrix(k + k.T, self.shift, self.dim)
+
+    def factorize(self, coords):
+        import scipy.sparse.linalg
+        self._solve = scipy.sparse.linalg.factorized(self.stiffness_matrix(coords))
+
+    def solve(self, v):
+        return self._solve(v)
+
+
+class MetricTensorPreconditioner(BasePreconditioner):
+    """precondition with a metric tensor, e.g. of rigid body coordinates
+
+    For angle axis coordinates the distance moved by a rotation depends on
+    the size and orientation of the body.  With P the metric tensor the steps
+    are measured in actual displacements, so translations and rotations
+    converge at the same rate.
+
+    Parameters
+    ----------
+    get_metric_tensor : callable
+        get_metric_tensor(coords) returns the metric tensor as an array, e.g.
+        system.get_metric_tensor
+    shift : float
+        added to the diagonal, relative to its mean, to keep P positive
+        definite
+    update_interval : int
+        P is rebuilt every update_interval steps
+    """
+    def __init__(self, get_metric_tensor, shift=1e-6, update_interval=20):
+        BasePreconditioner.__init__(self, update_interval=update_interval)
+        self.get_metric_tensor = get_metric_tensor
+        self.shift = shift
+        self._factor = None
+
+    def factorize(self, coords):
+        import scipy.linalg
+        g = np.array(self.get_metric_tensor(coords), dtype=float)
+        d = np.diag(g)
+        g[np.diag_indices_from(g)] += self.shift * max(d.mean(), 1e-10)
+        self._factor = scipy.linalg.cho_factor(g)
+
+    def solve(self, v):
+        import scipy.linalg
+        return scipy.linalg.cho_solve(self._factor, v)
+
+
+#
+# only testing stuff below here
+#
+
+import unittest
+class TestPreconditioners(unittest.TestCase):
+    def setUp(self):
+        from pygmin.potentials import BasePotential
+        import scipy.sparse
+
+        class SpringChain(BasePotential):
+            """a chain of harmonic springs with alternating stiffness"""
+            def __init__(self, natoms):
+                self.natoms = natoms
+                self.k = np.where(np.arange(natoms-1) % 2 == 0, 1., 1000.)
+                L = scipy.sparse.lil_matrix((natoms, natoms))
+                for i, k in enumerate(self.k):
+                    L[i,i] += k; L[i+1,i+1] += k
+                    L[i,i+1] -= k; L[i+1,i] -= k
+                self.hess = scipy.sparse.kron(L.tocsr(), scipy.sparse.identity(3)).tocsr()
+            def getEnergy(self, coords):
+                return self.getEnergyGradient(coords)[0]
+            def getEnergyGradient(self, coords):
+                x = coords.reshape(-1,3)
+                dr = x[1:] - x[:-1] - np.array([1., 0., 0.])
+                e = 0.5 * (self.k * (dr**2).sum(1)).sum()
+                g = np.zeros(x.shape)
+                g[1:] += self.k[:,np.newaxis] * dr
+                g[:-1] -= self.k[:,np.newaxis] * dr
+                return e, g.ravel()
+            def getSparseHessian(self, coords):
+                return self.hess
+
+        self.natoms = 10
+        self.pot = SpringChain(self.natoms)
+        self.x0 = np.random.uniform(-1, 1, 3 * self.natoms)
+
+    def test_sparse_hessian(self):
+        from pygmin.optimize import lbfgs_py, mylbfgs
+        res0 = lbfgs_py(self.x0.copy(), self.pot, tol=1e-6, nsteps=5000)
+        P = SparseHessianPreconditioner(self.pot)
+        res = lbfgs_py(self.x0.copy(), self.pot, tol=1e-6, preconditioner=P)
+        self.assertTrue(res.success)
+        self.assertAlmostEqual(res.energy, 0., 6)
+        self.assertLess(res.nsteps, res0.nsteps)
+        # mylbfgs falls back to the python step
+        res = mylbfgs(self.x0.copy(), self.pot, tol=1e-6, preconditioner=P)
+        self.assertTrue(res.success)
+
+    def test_stiffness_matrix(self):
+        P = SparseHessianPreconditioner(self.pot, shift=0.)
+        H = self.pot.getSparseHessian(self.x0).toarray()
+        self.assertTrue(np.allclose(P.stiffness_matrix(self.x0).toarray(), H))
+        # the same matrix from the topology
+        springs = [(i, i+1, k) for i, k in enumerate(self.pot.k)]
+        P = BondedPreconditioner(self.natoms, springs, shift=0.)
+        self.assertTrue(np.allclose(P.stiffness_matrix().toarray(), H))
+
+    def test_bonded(self):
+        """a bead spring molecule with stiff bonds, soft 1-3 springs and a
+        weak attraction between all beads.  It has no analytic Hessian, so P
+        is built from the bonds and angles"""
+        from pygmin.potentials import BasePotential
+        from pygmin.optimize import lbfgs_py
+
+        class BeadSpring(BasePotential):
+            def __init__(self, natoms):
+                self.natoms = natoms
+                self.springs = ([(i, i+1, 1000.) for i in xrange(natoms-1)]
+                                + [(i, i+2, 20.) for i in xrange(natoms-2)])
+                self.I = np.array([s[0] for s in self.springs])
+                self.J = np.array([s[1] for s in self.springs])
+                self.k = np.array([s[2] for s in self.springs])
+                self.r0 = (self.J - self.I)[:,np.newaxis] * np.array([1., 0., 0.])
+            def getEnergy(self, coords):
+                return self.getEnergyGradient(coords)[0]
+            def getEnergyGradient(self, coords):
+                x = coords.reshape(-1,3)
+                dr = x[self.J] - x[self.I] - self.r0
+                e = 0.5 * (self.k * (dr**2).sum(1)).sum()
+                g = np.zeros(x.shape)
+                for i, j, f in zip(self.I, self.J, self.k[:,np.newaxis] * dr):
+                    g[j] += f
+                    g[i] -= f
+                for i in xrange(self.natoms):
+                    d = x[i] - x[i+1:]
+                    w = 0.1 * np.exp(-(d**2).sum(1))
+                    e -= w.sum()
+                    f = 2. * w[:,np.newaxis] * d
+                    g[i] += f.sum(0)
+                    g[i+1:] -= f
+                return e, g.ravel()
+
+        natoms = 20
+        pot = BeadSpring(natoms)
+        x0 = np.zeros([natoms, 3])
+        x0[:,0] = np.arange(natoms)
+        x0 = x0.ravel() + np.random.uniform(-0.3, 0.3, 3 * natoms)
+        res0 = lbfgs_py(x0.copy(), pot, tol=1e-6, nsteps=10000)
+        P = BondedPreconditioner(natoms, pot.springs)
+        res = lbfgs_py(x0.copy(), pot, tol=1e-6, preconditioner=P)
+        self.assertTrue(res.success)
+        self.assertAlmostEqual(res.energy, res0.energy, 6)
+        self.assertLess(res.nsteps, res0.nsteps)
+
+    def test_metric_tensor(self):
+        """rigid trimers, preconditioned with the angle axis metric tensor"""
+        from copy import deepcopy
+        from pygmin.angleaxis import RBSystem, RBTopology, RigidFragment, RBPotentialWrapper
+        from pygmin.potentials import LJ
+        from pygmin.optimize import lbfgs_py
+
+        class TrimerSystem(RBSystem):
+            def __init__(self, nrigid):
+                self.nrigid = nrigid
+                RBSystem.__init__(self)
+            def setup_aatopology(self):
+                trimer = RigidFragment()
+                a = 7. * np.pi / 24.
+                trimer.add_atom("A", np.array([0., -2./3 * np.sin(a), 0.]), 1.)
+                trimer.add_atom("A", np.array([np.cos(a), 1./3 * np.sin(a), 0.]), 1.)
+                trimer.add_atom("A", np.array([-np.cos(a), 1./3 * np.sin(a), 0.]), 1.)
+                trimer.finalize_setup()
+                topology = RBTopology()
+                topology.add_sites([deepcopy(trimer) for i in xrange(self.nrigid)])
+                return topology
+            def get_potential(self):
+                return RBPotentialWrapper(self.aasystem, LJ())
+
+        system = TrimerSystem(4)
+        pot = system.get_potential()
+        x = system.get_random_configuration()
+        P = MetricTensorPreconditioner(system.get_metric_tensor, shift=0.)
+        # P^-1 inverts the metric tensor of the current coordinates
+        P.factorize(x)
+        g = system.get_metric_tensor(x)
+        v = np.random.uniform(-1, 1, x.size)
+        self.assertTrue(np.allclose(P.solve(np.dot(g, v)), v))
+
+        P = MetricTensorPreconditioner(system.get_metric_tensor)
+        res = lbfgs_py(x.copy(), pot, tol=1e-6, preconditioner=P)
+        self.assertTrue(res.success)
+        self.assertLess(res.rms, 1e-6)
+
+if __name__ == "__main__":
+    unittest.main()
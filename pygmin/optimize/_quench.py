@@ -9,11 +9,11 @@ scipy.minimize would do a similar thing
 
 import numpy as np
 
-from pygmin.optimize import LBFGS, MYLBFGS, Fire, Result
+from pygmin.optimize import LBFGS, MYLBFGS, BatchLBFGS, Fire, Result
 from pygmin.potentials import BasePotential
 
 __all__ = ["lbfgs_scipy", "fire", "lbfgs_py", "mylbfgs", "cg", 
-           "steepest_descent", "bfgs_scipy"]
+           "steepest_descent", "bfgs_scipy", "batch_lbfgs"]
 
 class _getEnergyGradientWrapper(BasePotential):
     """
@@ -200,6 +200,14 @@ def mylbfgs(coords, pot, **kwargs):
     lbfgs = MYLBFGS(coords, pot, **kwargs)
     return lbfgs.run()
 
+def batch_lbfgs(coords_stack, pot, **kwargs):
+    """minimize each row of coords_stack, returning a list of Results
+    
+    See BatchLBFGS for the keyword arguments
+    """
+    lbfgs = BatchLBFGS(coords_stack, pot, **kwargs)
+    return lbfgs.run()
+
 
 import unittest
 class TestMinimizers(unittest.TestCase):
@@ -239,7 +247,36 @@ class TestMinimizers(unittest.TestCase):
         self.assertTrue(res.success)
         self.assertAlmostEqual(self.E, res.energy, 4)
         self.check_attributes(res)
+
+    def test_lbfgs_coords_copied(self):
+        """the events and the result get copies, not the work arrays"""
+        coordslist = []
+        def event(coords=None, **kwargs):
+            coordslist.append(coords)
+        res = mylbfgs(self.x0, self.pot, tol=1e-7, events=[event])
+        self.assertGreater(len(coordslist), 2)
+        self.assertFalse(np.all(coordslist[0] == coordslist[1]))
+        self.assertTrue(np.all(coordslist[-1] == res.coords))
+        self.assertAlmostEqual(self.pot.getEnergy(res.coords), res.energy, 10)
+
+    def test_batch_lbfgs(self):
+        xs = np.array([self.x0] + [self.system.get_random_configuration() for i in xrange(3)])
+        results = batch_lbfgs(xs, self.pot, tol=1e-7)
+        self.assertEqual(len(results), len(xs))
+        self.assertAlmostEqual(self.E, results[0].energy, 4)
+        for res in results:
+            self.assertTrue(res.success)
+            self.assertLess(res.rms, 1e-7)
+            self.assertAlmostEqual(res.energy, self.pot.getEnergy(res.coords), 8)
+            self.check_attributes(res)
     
+    def test_batch_lbfgs_nsteps(self):
+        xs = np.array([self.system.get_random_configuration() for i in xrange(2)])
+        results = batch_lbfgs(xs, self.pot, tol=1e-7, nsteps=5)
+        for res in results:
+            self.assertFalse(res.success)
+            self.assertEqual(res.nsteps, 5)
+
     def test_fire(self):
         res = fire(self.x0, self.pot, tol=1e-7)
         self.assertTrue(res.success)
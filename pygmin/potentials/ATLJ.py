@@ -4,10 +4,177 @@ from scipy.weave import converters
 
 from pygmin.potentials import LJ
 from pygmin.potentials import BasePotential
-import fortran.AT as ATfort
+try:
+    import fortran.AT as ATfort
+    _have_fortran = True
+except ImportError:
+    import numpy_kernels.AT as ATfort
+    _have_fortran = False
 
 __all__ = ["ATLJ"]
 
+def _pair_table(x, pairs):
+    """sort the pairs (i, j), i < j, and tabulate their separation vectors
+    
+    Returns
+    -------
+    pairs : array, shape (npairs, 2)
+        sorted by i, then by j
+    keys : array
+        i * natoms + j for each pair, sorted, for looking up pair indices
+    dr, r2 : arrays
+        x[i] - x[j] and its square length for each pair
+    """
+    natoms = len(x)
+    pairs = np.sort(np.asarray(pairs, dtype=np.int64).reshape(-1,2), axis=1)
+    keys = pairs[:,0] * natoms + pairs[:,1]
+    order = np.argsort(keys)
+    pairs = pairs[order]
+    keys = keys[order]
+    dr = x[pairs[:,0]] - x[pairs[:,1]]
+    r2 = (dr**2).sum(1)
+    return pairs, keys, dr, r2
+
+def _switch(r2, rswitch, rcut):
+    """the smooth switching function of each pair
+    
+    f is 1 below rswitch, 0 above rcut and the polynomial
+    1 - 10 x**3 + 15 x**4 - 6 x**5, x = (r - rswitch) / (rcut - rswitch),
+    in between, so f and its first two derivatives are continuous.
+    
+    Returns
+    -------
+    f, dfr : arrays
+        f and df/dr / r
+    """
+    r = np.sqrt(r2)
+    x = np.clip((r - rswitch) / (rcut - rswitch), 0., 1.)
+    f = 1. - x**3 * (10. - 15. * x + 6. * x**2)
+    dfr = -30. * x**2 * (1. - x)**2 / ((rcut - rswitch) * r)
+    return f, dfr
+
+def axilrod_teller_triplets(coords, Z, pairs, gradient=True, blocksize=2**16,
+                            rswitch=None, rcut=None):
+    """the Axilrod-Teller energy of all triangles whose three sides are in pairs
+    
+    The separations of the pairs are computed once.  The triangles (i, j, k),
+    i < j < k, are then generated from the pairs (i, j) and (i, k), their
+    third side (j, k) is looked up in the pair table, and the energy is
+    evaluated for blocks of about blocksize triangles at a time.  If pairs
+    holds the neighbors of each atom within a cutoff the cost is of order
+    natoms * nneighbors**2.
+    
+    Parameters
+    ----------
+    coords : array
+    Z : float
+        the strength of the triple dipole term
+    pairs : array, shape (npairs, 2)
+        the pairs of atoms, each listed once in any order
+    gradient : bool
+        if False the gradient is not computed and None is returned for it
+    blocksize : int
+        the approximate number of candidate triangles per block
+    rswitch, rcut : float, optional
+        if given, the energy of each triangle is multiplied by the switching
+        function of its three sides, which goes smoothly from 1 at rswitch
+        to 0 at rcut.  See _switch.
+    
+    Returns
+    -------
+    energy, gradient
+    """
+    x = np.reshape(coords, [-1,3])
+    natoms = len(x)
+    grad = np.zeros(x.shape) if gradient else None
+    pairs, keys, dr, r2 = _pair_table(x, pairs)
+    npairs = len(pairs)
+    if npairs < 2:
+        return 0., grad
+    if rcut is not None:
+        f, dfr = _switch(r2, rswitch, rcut)
+    
+    # the pairs of atom i are the contiguous range first[i]:first[i+1]
+    first = np.zeros(natoms + 1, np.int64)
+    first[1:] = np.cumsum(np.bincount(pairs[:,0], minlength=natoms))
+    # pair p = (i, j) forms a triangle with each later pair (i, k), k > j
+    end = first[pairs[:,0] + 1]
+    ncand = end - np.arange(npairs) - 1
+    cumcand = np.cumsum(ncand)
+    
+    energy = 0.
+    p1 = 0
+    while p1 < npairs:
+        # a block of pairs with about blocksize candidate triangles
+        p2 = np.searchsorted(cumcand, cumcand[p1] - ncand[p1] + blocksize, side="right")
+        p2 = min(max(p2, p1 + 1), npairs)
+        nc = ncand[p1:p2]
+        pij = np.repeat(np.arange(p1, p2), nc)
+        offset = np.arange(len(pij)) - np.repeat(np.cumsum(nc) - nc, nc)
+        pik = pij + 1 + offset
+        # look up the third side
+        j = pairs[pij,1]
+        k = pairs[pik,1]
+        pjk = np.searchsorted(keys, j * natoms + k)
+        pjk[pjk == npairs] = 0
+        found = keys[pjk] == j * natoms + k
+        pij = pij[found]
+        pik = pik[found]
+        pjk = pjk[found]
+        p1 = p2
+        if len(pij) == 0:
+            continue
+        
+        # u = xi - xj, v = xj - xk, w = xk - xi.  see numpy_kernels.AT
+        u = dr[pij]
+        v = dr[pjk]
+        w = -dr[pik]
+        a2 = r2[pij]
+        b2 = r2[pjk]
+        c2 = r2[pik]
+        uv = (u * v).sum(1)
+        vw = (v * w).sum(1)
+        wu = (w * u).sum(1)
+        D = uv * vw * wu
+        P2 = a2 * b2 * c2
+        iP3 = P2**-1.5
+        iP5 = iP3 / P2
+        e = iP3 - 3. * D * iP5
+        if rcut is None:
+            energy += Z * e.sum()
+        else:
+            fa = f[pij]
+            fb = f[pjk]
+            fc = f[pik]
+            S = fa * fb * fc
+            energy += Z * (e * S).sum()
+        if not gradient:
+            continue
+        
+        s = (-3. * iP3 + 15. * D * iP5)
+        t = -3. * iP5
+        col = np.newaxis
+        dEdu = Z * ((s / a2)[:,col] * u + t[:,col] * (v * (vw * wu)[:,col] + w * (uv * vw)[:,col]))
+        dEdv = Z * ((s / b2)[:,col] * v + t[:,col] * (u * (vw * wu)[:,col] + w * (uv * wu)[:,col]))
+        dEdw = Z * ((s / c2)[:,col] * w + t[:,col] * (v * (uv * wu)[:,col] + u * (uv * vw)[:,col]))
+        if rcut is not None:
+            # d(e * fa * fb * fc), where fa depends on |u|, fb on |v|, fc on |w|
+            Ze = Z * e
+            dEdu = S[:,col] * dEdu + (Ze * dfr[pij] * fb * fc)[:,col] * u
+            dEdv = S[:,col] * dEdv + (Ze * fa * dfr[pjk] * fc)[:,col] * v
+            dEdw = S[:,col] * dEdw + (Ze * fa * fb * dfr[pik])[:,col] * w
+        i = pairs[pij,0]
+        j = pairs[pij,1]
+        k = pairs[pik,1]
+        for d in xrange(3):
+            grad[:,d] += np.bincount(i, dEdu[:,d] - dEdw[:,d], natoms)
+            grad[:,d] += np.bincount(j, dEdv[:,d] - dEdu[:,d], natoms)
+            grad[:,d] += np.bincount(k, dEdw[:,d] - dEdv[:,d], natoms)
+    
+    if gradient:
+        grad = grad.reshape(-1)
+    return energy, grad
+
 
 class ATLJ(BasePotential):
     """
@@ -18,13 +185,37 @@ class ATLJ(BasePotential):
     where t1, t2, t3 are the internal angles of the triangle ijk
     
     Z > 0 stabilizes linear vs. triangular geometries 
+    
+    Parameters
+    ----------
+    eps, sig : float
+        the Lennard-Jones parameters
+    Z : float
+        the strength of the three body term
+    rcut : float, optional
+        if given, only triangles whose three sides are all shorter than rcut
+        contribute to the three body term.  The triangles are found with a
+        neighbor list, so the cost grows like natoms * nneighbors**2 instead
+        of natoms**3.  The energy of each triangle is multiplied by a
+        switching function of each side, which goes smoothly from 1 at
+        rswitch to 0 at rcut, so the energy and gradient are continuous.
+    rswitch : float, optional
+        where the switching starts.  The default is 0.8 * rcut
+    rskin : float, optional
+        the skin distance of the neighbor list used with rcut
     """
-    def __init__(self, eps=1.0, sig=1.0, Z=1.):
+    def __init__(self, eps=1.0, sig=1.0, Z=1., rcut=None, rskin=0.5, rswitch=None):
         """ simple lennard jones potential"""
         self.sig = sig
         self.eps = eps
         self.Z = Z
         self.lj = LJ(self.sig, self.eps)
+        self.rcut = rcut
+        if rcut is not None and rswitch is None:
+            rswitch = 0.8 * rcut
+        self.rswitch = rswitch
+        self.rskin = rskin
+        self.neighbor_list = None
 
     
     def getEnergyWeave(self, coords):
@@ -128,11 +319,41 @@ class ATLJ(BasePotential):
         elj, gradlj = self.lj.getEnergyGradient(coords)
         return e + elj, grad + gradlj
 
+    def _getPairs(self, coords):
+        """return the pairs which can be sides of a contributing triangle"""
+        x = np.reshape(coords, [-1,3])
+        natoms = len(x)
+        if self.rcut is None:
+            i, j = np.triu_indices(natoms, 1)
+            return np.column_stack((i, j))
+        if self.neighbor_list is None:
+            from pygmin.utils.neighbor_list import NeighborList
+            self.neighbor_list = NeighborList(natoms, self.rcut, rskin=self.rskin)
+        pairs = self.neighbor_list.getList(coords)
+        # the list includes the skin
+        dr = x[pairs[:,0]] - x[pairs[:,1]]
+        return pairs[(dr**2).sum(1) < self.rcut**2]
+
+    def getEnergyTriplets(self, coords):
+        e, garbage = axilrod_teller_triplets(coords, self.Z, self._getPairs(coords), gradient=False,
+                                             rswitch=self.rswitch, rcut=self.rcut)
+        return e + self.lj.getEnergy(coords)
+
+    def getEnergyGradientTriplets(self, coords):
+        e, grad = axilrod_teller_triplets(coords, self.Z, self._getPairs(coords),
+                                          rswitch=self.rswitch, rcut=self.rcut)
+        elj, gradlj = self.lj.getEnergyGradient(coords)
+        return e + elj, grad + gradlj
+
     def getEnergy(self, coords):
+        if self.rcut is not None or not _have_fortran:
+            return self.getEnergyTriplets(coords)
         return self.getEnergyFortran(coords)
     
     def getEnergyGradient(self, coords):
         #return self.getEnergyGradientNumerical(coords)
+        if self.rcut is not None or not _have_fortran:
+            return self.getEnergyGradientTriplets(coords)
         return self.getEnergyGradientFortran(coords)
 
 import unittest
@@ -178,6 +399,50 @@ class TestATLJ(unittest.TestCase):
         print "maximum relative difference in gradients",  maxdiff, maxdiff/maxnorm
         self.assertTrue( maxdiff/maxnorm < 1e-4, "ATLJ: gradient differs from numerical gradient by %g" % (maxdiff) )
         
+    def testTriplets(self):
+        natoms = 10
+        coords = np.random.uniform(-1,1,natoms*3)*2
+        atlj = ATLJ(Z=3.)
+        e1, g1 = atlj.getEnergyGradientFortran(coords)
+        e2, g2 = atlj.getEnergyGradientTriplets(coords)
+        self.assertAlmostEqual(e1, e2, 7)
+        self.assertLess(np.max(np.abs(g1 - g2)), 1e-6 * np.max(np.abs(g1)))
+        
+        # a cutoff longer than all distances changes nothing
+        atlj = ATLJ(Z=3., rcut=10.)
+        e3, g3 = atlj.getEnergyGradient(coords)
+        self.assertAlmostEqual(e1, e3, 7)
+        self.assertLess(np.max(np.abs(g1 - g3)), 1e-6 * np.max(np.abs(g1)))
+
+    def testCutoffGradient(self):
+        natoms = 20
+        coords = np.random.uniform(-1,1,natoms*3)*2
+        from pygmin.optimize import mylbfgs as quench
+        coords = quench(coords, LJ()).coords
+        atlj = ATLJ(Z=3., rcut=1.6)
+        e, g = atlj.getEnergyGradient(coords)
+        self.assertAlmostEqual(e, atlj.getEnergy(coords), 10)
+        gnum = atlj.NumericalDerivative(coords, 1e-6)
+        self.assertLess(np.max(np.abs(g - gnum)), 1e-4)
+
+    def testCutoffContinuous(self):
+        # stretch a triangle so that one side crosses rcut
+        atlj = ATLJ(Z=3., rcut=1.6, rswitch=1.2)
+        e = []
+        for a in [1.6 - 1e-6, 1.6 + 1e-6]:
+            coords = np.array([0., 0., 0., a, 0., 0., 0.5 * a, 0.5, 0.])
+            e.append(atlj.getEnergy(coords) - atlj.lj.getEnergy(coords))
+        self.assertAlmostEqual(e[0], e[1], 10)
+        
+        # below rswitch the energy is not changed
+        coords = np.array([0., 0., 0., 1.1, 0., 0., 0.55, 0.5, 0.])
+        self.assertAlmostEqual(atlj.getEnergy(coords), atlj.getEnergyFortran(coords), 10)
+        
+        coords = np.array([0., 0., 0., 1.5, 0., 0., 0.7, 0.6, 0.1])
+        e, g = atlj.getEnergyGradient(coords)
+        gnum = atlj.NumericalDerivative(coords, 1e-6)
+        self.assertLess(np.max(np.abs(g - gnum)), 1e-6)
+
 
 
 
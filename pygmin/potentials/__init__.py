@@ -18,6 +18,16 @@ All potentials are derived from the base class
 
     BasePotential
 
+Potential wrappers
+------------------
+
+.. autosummary::
+   :toctree: generated/
+
+    CachedPotential
+    InstrumentedPotential
+    NumericalHessianPotential
+
 When creating your own potential, only member function which must absolutely
 be overloaded is getEnergy().  Many routines in pygmin 
 also use gradient information, so it is highly recommended to also
@@ -33,6 +43,7 @@ these are potentials that exist completely within the pygmin package
 
     LJ
     LJCut
+    LJPeriodic
     LJpshift
     ATLJ
     XYModel
@@ -56,6 +67,9 @@ to be written
 
 
 from potential import *
+from finite_difference import *
+from cached_potential import *
+from instrumented_potential import *
 from lj import *
 from ATLJ import *
 from coldfusioncheck import *
@@ -64,6 +78,7 @@ from heisenberg_spin import *
 from heisenberg_spin_RA import *
 from ljpshiftfast import *
 from ljcut import *
+from lj_periodic import *
 #from potential import *
 #from salt import *
 from soft_sphere import *
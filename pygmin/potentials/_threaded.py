@@ -0,0 +1,60 @@
+"""
+helpers for splitting the pair loops of the compiled potentials between threads
+
+The fortran routines which are called through here are marked threadsafe, so
+f2py releases the GIL while they run and the threads really do run in
+parallel.  Each call computes its share of the pairs into its own gradient
+array and the results are summed afterwards.
+"""
+from multiprocessing.pool import ThreadPool
+
+import numpy as np
+
+# one pool of worker threads for each number of threads, shared by all potentials
+_pools = dict()
+
+def get_pool(nthreads):
+    """return a pool of nthreads worker threads"""
+    try:
+        return _pools[nthreads]
+    except KeyError:
+        pool = _pools[nthreads] = ThreadPool(nthreads)
+        return pool
+
+def row_ranges(natoms, nthreads):
+    """split the rows of the pair loop into ranges with about equal numbers of pairs
+
+    Row j contains the j pairs (j, i) with i < j, so the number of pairs in
+    the rows before row k is k*(k-1)/2.
+
+    Returns
+    -------
+    list of (jstart, jend)
+        the half open ranges of rows, in python indexing
+    """
+    nthreads = max(min(nthreads, natoms), 1)
+    bounds = [int(round(natoms * np.sqrt(float(k) / nthreads))) for k in xrange(nthreads + 1)]
+    return [(j1, j2) for j1, j2 in zip(bounds[:-1], bounds[1:]) if j2 > j1]
+
+def list_chunks(ilist, nthreads):
+    """split a list of pairs into nthreads contiguous chunks"""
+    ilist = np.asarray(ilist).reshape(-1,2)
+    nthreads = max(min(nthreads, len(ilist)), 1)
+    bounds = np.linspace(0, len(ilist), nthreads + 1).astype(int)
+    return [ilist[i1:i2] for i1, i2 in zip(bounds[:-1], bounds[1:])]
+
+def run_threaded(func, argslist, nthreads):
+    """return [func(*args) for args in argslist], computed by nthreads threads"""
+    if len(argslist) == 1:
+        return [func(*argslist[0])]
+    return get_pool(nthreads).map(lambda args: func(*args), argslist)
+
+def sum_results(results):
+    """sum the results of run_threaded
+
+    If the results are tuples, e.g. (energy, gradient), each item is summed
+    separately.
+    """
+    if isinstance(results[0], tuple):
+        return tuple(sum(items[1:], items[0]) for items in zip(*results))
+    return sum(results[1:], results[0])
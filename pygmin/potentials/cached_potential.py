@@ -0,0 +1,244 @@
+"""
+a potential wrapper which remembers recent energy and gradient evaluations
+
+.. currentmodule:: pygmin.potentials.cached_potential
+
+Many routines ask for the energy or gradient at the same point more than once,
+e.g. NEB.getEnergy computes the gradient and throws it away, the transition
+state routines re-evaluate the center point, and the line search re-evaluates
+rejected steps.  CachedPotential keeps a small least recently used cache of
+(energy, gradient) so that the repeated calls are free.
+
+.. autosummary::
+    :toctree: generated/
+
+    CachedPotential
+"""
+from collections import OrderedDict
+
+import numpy as np
+
+from pygmin.potentials.potential import BasePotential
+
+__all__ = ["CachedPotential"]
+
+class CachedPotential(BasePotential):
+    """wrap a potential and cache the most recent energies and gradients
+
+    The cache is keyed on the raw bytes of the coordinate array, so only
+    calls with exactly the same coordinates are served from the cache.
+    Copies of the gradient are stored and returned, so callers are free to
+    modify the arrays they get back.  Everything other than the energy and
+    gradient is passed through to the wrapped potential.  Setting an
+    attribute, e.g. pot.boxl = 10., sets it on the wrapped potential and
+    clears the cache.  The finite difference routines (NumericalDerivative,
+    NumericalHessian and the default Hessian and Hessian vector product)
+    bypass the cache, so they neither fill it nor are served from it.
+
+    Parameters
+    ----------
+    pot : potential object
+        the potential to wrap
+    maxsize : int
+        the maximum number of configurations to remember
+
+    Attributes
+    ----------
+    nhits : int
+        the number of calls served from the cache
+    nmisses : int
+        the number of calls passed to the wrapped potential
+
+    Notes
+    -----
+    The cache cannot see changes made to the wrapped potential directly,
+    e.g. through another reference to it, or changes to anything else it
+    depends on.  Call clear_cache() after making them.
+    """
+    _own_attributes = frozenset(["pot", "maxsize", "_cache", "nhits", "nmisses", "_bypass"])
+    
+    def __init__(self, pot, maxsize=8):
+        self.pot = pot
+        self.maxsize = maxsize
+        self._cache = OrderedDict()
+        self.nhits = 0
+        self.nmisses = 0
+        self._bypass = False
+
+    def __getattr__(self, name):
+        # only called if normal attribute lookup fails.  Be careful not to
+        # recurse before self.pot exists, e.g. when copying or unpickling
+        if name.startswith("__") or "pot" not in self.__dict__:
+            raise AttributeError(name)
+        return getattr(self.pot, name)
+
+    def __setattr__(self, name, value):
+        if name in self._own_attributes or "pot" not in self.__dict__:
+            object.__setattr__(self, name, value)
+        else:
+            # the wrapped potential may depend on it, so the cache is stale
+            setattr(self.pot, name, value)
+            self.clear_cache()
+
+    def clear_cache(self):
+        """remove all configurations from the cache"""
+        self._cache.clear()
+
+    def _uncached(self, method, *args, **kwargs):
+        """call a BasePotential method with the cache switched off"""
+        bypass = self._bypass
+        self._bypass = True
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self._bypass = bypass
+
+    def _key(self, coords):
+        return np.ascontiguousarray(coords, dtype=float).tostring()
+
+    def _lookup(self, key, need_gradient):
+        try:
+            e, g = self._cache.pop(key)
+        except KeyError:
+            return None
+        # reinsert to mark it as the most recently used
+        self._cache[key] = (e, g)
+        if need_gradient and g is None:
+            return None
+        return e, g
+
+    def _store(self, key, e, g):
+        self._cache.pop(key, None)
+        self._cache[key] = (e, g)
+        while len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+
+    def getEnergy(self, coords):
+        if self._bypass:
+            return self.pot.getEnergy(coords)
+        key = self._key(coords)
+        ret = self._lookup(key, False)
+        if ret is not None:
+            self.nhits += 1
+            return ret[0]
+        self.nmisses += 1
+        e = self.pot.getEnergy(coords)
+        self._store(key, e, None)
+        return e
+
+    def getEnergyGradient(self, coords):
+        if self._bypass:
+            return self.pot.getEnergyGradient(coords)
+        key = self._key(coords)
+        ret = self._lookup(key, True)
+        if ret is not None:
+            self.nhits += 1
+            return ret[0], ret[1].copy()
+        self.nmisses += 1
+        e, g = self.pot.getEnergyGradient(coords)
+        self._store(key, e, np.array(g, dtype=float))
+        return e, g
+
+    def getEnergyGradientMany(self, coords_stack):
+        if hasattr(self.pot, "getEnergyGradientMany"):
+            return self.pot.getEnergyGradientMany(coords_stack)
+        return self._uncached(BasePotential.getEnergyGradientMany, coords_stack)
+
+    def NumericalDerivative(self, *args, **kwargs):
+        return self._uncached(BasePotential.NumericalDerivative, *args, **kwargs)
+
+    def NumericalHessian(self, *args, **kwargs):
+        return self._uncached(BasePotential.NumericalHessian, *args, **kwargs)
+
+    def getEnergyGradientHessian(self, coords):
+        e, g, hess = self.pot.getEnergyGradientHessian(coords)
+        self._store(self._key(coords), e, np.array(g, dtype=float))
+        return e, g, hess
+
+    def getHessian(self, coords):
+        if hasattr(self.pot, "getHessian"):
+            return self.pot.getHessian(coords)
+        return self._uncached(BasePotential.getHessian, coords)
+
+    def getSparseHessian(self, coords):
+        if hasattr(self.pot, "getSparseHessian"):
+            return self.pot.getSparseHessian(coords)
+        return self._uncached(BasePotential.getSparseHessian, coords)
+
+    def getEnergyPerAtom(self, coords):
+        return self.pot.getEnergyPerAtom(coords)
+
+    def getHessianVectorProduct(self, coords, vec, eps=1e-6):
+        if hasattr(self.pot, "getHessianVectorProduct"):
+            return self.pot.getHessianVectorProduct(coords, vec, eps=eps)
+        return self._uncached(BasePotential.getHessianVectorProduct, coords, vec, eps=eps)
+
+
+#
+# only testing stuff below here
+#
+
+import unittest
+class TestCachedPotential(unittest.TestCase):
+    def setUp(self):
+        from pygmin.potentials.lj import LJ
+        self.natoms = 6
+        self.lj = LJ()
+        self.pot = CachedPotential(self.lj, maxsize=2)
+        self.coords = np.random.uniform(-1,1.,3*self.natoms) * self.natoms**(-1./3)
+
+    def test_hits(self):
+        e, g = self.pot.getEnergyGradient(self.coords)
+        e1, g1 = self.lj.getEnergyGradient(self.coords)
+        self.assertEqual((self.pot.nhits, self.pot.nmisses), (0, 1))
+        self.assertEqual(self.pot.getEnergy(self.coords.copy()), e1)
+        e2, g2 = self.pot.getEnergyGradient(self.coords)
+        self.assertEqual((self.pot.nhits, self.pot.nmisses), (2, 1))
+        self.assertEqual(e2, e1)
+        self.assertTrue(np.all(g2 == g1))
+        # the returned gradient is a copy
+        g2[:] = 0.
+        self.assertTrue(np.all(self.pot.getGradient(self.coords) == g1))
+
+    def test_energy_only(self):
+        self.pot.getEnergy(self.coords)
+        e, g = self.pot.getEnergyGradient(self.coords)
+        self.assertEqual((self.pot.nhits, self.pot.nmisses), (0, 2))
+        self.pot.getEnergy(self.coords)
+        self.assertEqual(self.pot.nhits, 1)
+
+    def test_lru(self):
+        x1 = self.coords
+        x2 = self.coords * 1.1
+        x3 = self.coords * 0.9
+        for x in [x1, x2, x1, x3]:
+            self.pot.getEnergyGradient(x)
+        self.assertEqual(self.pot.nmisses, 3)
+        # x2 was the least recently used, so it was dropped
+        self.pot.getEnergyGradient(x1)
+        self.pot.getEnergyGradient(x2)
+        self.assertEqual((self.pot.nhits, self.pot.nmisses), (2, 4))
+
+    def test_passthrough(self):
+        self.assertEqual(self.pot.boxl, self.lj.boxl)
+        vec = np.random.uniform(-1,1,self.coords.size)
+        hv = self.pot.getHessianVectorProduct(self.coords, vec)
+        self.assertTrue(np.all(hv == self.lj.getHessianVectorProduct(self.coords, vec)))
+        
+        # the finite difference routines neither use nor fill the cache
+        e, g = self.pot.getEnergyGradient(self.coords)
+        h = self.pot.NumericalHessian(self.coords)
+        self.assertEqual((self.pot.nhits, self.pot.nmisses), (0, 1))
+        self.assertEqual(list(self.pot._cache.keys()), [self.pot._key(self.coords)])
+        hlj = self.lj.getHessian(self.coords)
+        self.assertLess(np.max(np.abs(h - hlj)), 1e-4 * np.max(np.abs(hlj)))
+        
+        # attributes are set on the wrapped potential, and the cache is cleared
+        self.pot.boxl = 10.
+        self.assertEqual(self.lj.boxl, 10.)
+        self.assertEqual(len(self.pot._cache), 0)
+        self.pot.getEnergy(self.coords)
+        self.assertEqual(self.pot.nmisses, 2)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,237 @@
+"""
+finite difference gradients and Hessians
+
+.. currentmodule:: pygmin.potentials.finite_difference
+
+The displaced configurations are evaluated in blocks, either through the
+batched potential call getEnergyGradientMany, or, if a process pool is
+passed, in parallel in the worker processes.  This is used by
+BasePotential.NumericalDerivative and BasePotential.NumericalHessian.
+
+.. autosummary::
+    :toctree: generated/
+
+    numerical_gradient
+    numerical_hessian
+    NumericalHessianPotential
+"""
+import numpy as np
+
+from pygmin.potentials.potential import BasePotential
+
+__all__ = ["numerical_gradient", "numerical_hessian", "NumericalHessianPotential"]
+
+def _energy_many(args):
+    pot, coords_stack = args
+    return np.array([pot.getEnergy(x) for x in coords_stack])
+
+def _gradient_many(args):
+    pot, coords_stack = args
+    if hasattr(pot, "getEnergyGradientMany"):
+        return pot.getEnergyGradientMany(coords_stack)[1]
+    return np.array([pot.getEnergyGradient(x)[1] for x in coords_stack])
+
+def _evaluate(func, pot, coords_stack, pool):
+    """evaluate func for all configurations, splitting the work over the pool"""
+    if pool is None:
+        return func((pot, coords_stack))
+    chunks = np.array_split(coords_stack, min(len(coords_stack), 16))
+    results = pool.map(func, [(pot, chunk) for chunk in chunks])
+    return np.concatenate(results)
+
+def _displaced(coords, indices, eps, stencil):
+    """return the displaced configurations needed for the dofs in indices
+
+    for the central stencil the + and - displacements are returned in
+    that order.
+    """
+    n = len(indices)
+    rows = np.arange(n)
+    xplus = np.tile(coords, (n, 1))
+    xplus[rows, indices] += eps
+    if stencil == "forward":
+        return xplus
+    xminus = np.tile(coords, (n, 1))
+    xminus[rows, indices] -= eps
+    return np.concatenate((xplus, xminus))
+
+def _check_stencil(stencil):
+    if stencil not in ("central", "forward"):
+        raise ValueError("stencil must be 'central' or 'forward', not %s" % str(stencil))
+
+def numerical_gradient(pot, coords, eps=1e-6, stencil="central", pool=None, blocksize=256):
+    """return the gradient computed by finite differences of the energy
+
+    Parameters
+    ----------
+    pot : potential object
+    coords : array
+    eps : float
+        the finite difference step size
+    stencil : "central" or "forward"
+        the central stencil needs 2*ndof energy evaluations and is accurate to
+        second order in eps.  The forward stencil needs ndof+1 and is
+        accurate to first order.
+    pool : multiprocessing.Pool, optional
+        if passed, the energy evaluations are done in the worker processes.
+        The potential must be picklable.
+    blocksize : int
+        the number of degrees of freedom that are displaced at once.  This
+        bounds the memory used for the displaced configurations.
+    """
+    _check_stencil(stencil)
+    coords = np.asarray(coords, dtype=float)
+    ndof = coords.size
+    grad = np.zeros(ndof)
+    if stencil == "forward":
+        e0 = pot.getEnergy(coords)
+    for start in xrange(0, ndof, blocksize):
+        indices = np.arange(start, min(start + blocksize, ndof))
+        n = len(indices)
+        energies = _evaluate(_energy_many, pot, _displaced(coords, indices, eps, stencil), pool)
+        if stencil == "forward":
+            grad[indices] = (energies - e0) / eps
+        else:
+            grad[indices] = (energies[:n] - energies[n:]) / (2. * eps)
+    return grad
+
+def numerical_hessian(pot, coords, eps=1e-6, stencil="central", symmetric=True,
+                      pool=None, blocksize=64):
+    """return the Hessian computed by finite differences of the gradient
+
+    Parameters
+    ----------
+    pot : potential object
+    coords : array
+    eps : float
+        the finite difference step size
+    stencil : "central" or "forward"
+        the central stencil needs 2*ndof gradient evaluations, the forward
+        stencil needs ndof+1.
+    symmetric : bool
+        if True the Hessian is symmetrized, (H + H.T) / 2.  This removes part
+        of the finite difference error.
+    pool : multiprocessing.Pool, optional
+        if passed, the gradient evaluations are done in the worker processes.
+        The potential must be picklable.
+    blocksize : int
+        the number of degrees of freedom that are displaced at once.  This
+        bounds the memory used for the displaced configurations.
+    """
+    _check_stencil(stencil)
+    coords = np.asarray(coords, dtype=float)
+    ndof = coords.size
+    hess = np.zeros([ndof, ndof])
+    if stencil == "forward":
+        g0 = _gradient_many((pot, coords[np.newaxis,:]))[0]
+    for start in xrange(0, ndof, blocksize):
+        indices = np.arange(start, min(start + blocksize, ndof))
+        n = len(indices)
+        grads = _evaluate(_gradient_many, pot, _displaced(coords, indices, eps, stencil), pool)
+        if stencil == "forward":
+            hess[indices,:] = (grads - g0[np.newaxis,:]) / eps
+        else:
+            hess[indices,:] = (grads[:n,:] - grads[n:,:]) / (2. * eps)
+    if symmetric:
+        hess += hess.transpose()
+        hess *= 0.5
+    return hess
+
+
+class NumericalHessianPotential(BasePotential):
+    """a potential wrapper which computes the Hessian by finite differences
+
+    Everything except the Hessian is passed through to the wrapped potential,
+    so this can be used in place of the potential wherever a Hessian is
+    needed, e.g. for normal mode analysis of potentials without analytic
+    second derivatives.
+
+    Parameters
+    ----------
+    pot : potential object
+        the potential to wrap
+    eps, stencil, symmetric, pool, blocksize :
+        passed to numerical_hessian
+
+    See Also
+    --------
+    numerical_hessian
+    """
+    def __init__(self, pot, eps=1e-6, stencil="central", symmetric=True, pool=None,
+                 blocksize=64):
+        _check_stencil(stencil)
+        self.pot = pot
+        self.eps = eps
+        self.stencil = stencil
+        self.symmetric = symmetric
+        self.pool = pool
+        self.blocksize = blocksize
+
+    def getEnergy(self, coords):
+        return self.pot.getEnergy(coords)
+
+    def getEnergyGradient(self, coords):
+        return self.pot.getEnergyGradient(coords)
+
+    def getEnergyGradientMany(self, coords_stack):
+        if hasattr(self.pot, "getEnergyGradientMany"):
+            return self.pot.getEnergyGradientMany(coords_stack)
+        return BasePotential.getEnergyGradientMany(self, coords_stack)
+
+    def getEnergyGradientHessian(self, coords):
+        e, g = self.pot.getEnergyGradient(coords)
+        hess = numerical_hessian(self.pot, coords, eps=self.eps, stencil=self.stencil,
+                                 symmetric=self.symmetric, pool=self.pool,
+                                 blocksize=self.blocksize)
+        return e, g, hess
+
+
+#
+# only testing stuff below here
+#
+
+import unittest
+class TestFiniteDifference(unittest.TestCase):
+    def setUp(self):
+        from pygmin.potentials.lj import LJ
+        from pygmin.optimize import mylbfgs
+        self.natoms = 8
+        self.pot = LJ()
+        coords = np.random.uniform(-1,1.,3*self.natoms) * self.natoms**(-1./3)
+        self.coords = mylbfgs(coords, self.pot, tol=2.).coords
+        self.e, self.g, self.hess = self.pot.getEnergyGradientHessian(self.coords)
+
+    def assert_close(self, a, b, tol):
+        self.assertLess(np.max(np.abs(a - b)) / np.max(np.abs(b)), tol)
+
+    def test_gradient(self):
+        self.assert_close(numerical_gradient(self.pot, self.coords, blocksize=5), self.g, 1e-5)
+        self.assert_close(numerical_gradient(self.pot, self.coords, eps=1e-7, stencil="forward"),
+                          self.g, 1e-3)
+
+    def test_hessian(self):
+        hess = numerical_hessian(self.pot, self.coords, blocksize=5)
+        self.assert_close(hess, self.hess, 1e-5)
+        self.assertEqual(np.max(np.abs(hess - hess.transpose())), 0.)
+        hess = numerical_hessian(self.pot, self.coords, eps=1e-7, stencil="forward")
+        self.assert_close(hess, self.hess, 1e-3)
+
+    def test_pool(self):
+        import multiprocessing
+        pool = multiprocessing.Pool(2)
+        try:
+            hess = numerical_hessian(self.pot, self.coords, pool=pool)
+            grad = numerical_gradient(self.pot, self.coords, pool=pool)
+        finally:
+            pool.terminate()
+        self.assert_close(hess, self.hess, 1e-5)
+        self.assert_close(grad, self.g, 1e-5)
+
+    def test_wrapper(self):
+        pot = NumericalHessianPotential(self.pot)
+        e, g, hess = pot.getEnergyGradientHessian(self.coords)
+        self.assertAlmostEqual(e, self.e, 7)
+        self.assert_close(hess, self.hess, 1e-5)
+
+if __name__ == "__main__":
+    unittest.main()
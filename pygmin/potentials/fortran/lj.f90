@@ -1,3 +1,9 @@
+!
+!note: the neighbor lists are passed as np.int64 arrays, so the ilist routines
+!define their integers to be kind=8, as in ljcut.f90.  Otherwise f2py must copy
+!the list to a 32 bit array on every call.
+!
+
 subroutine ljenergy( coords, natoms, e, eps, sig, periodic, boxl )
 implicit none
 integer, intent(in) :: natoms
@@ -64,12 +70,13 @@ end subroutine ljenergy_gradient
 
 subroutine energy_ilist( coords, natoms, e, eps, sig, ilist, nlist, periodic, boxl )
 implicit none
-integer, intent(in) :: natoms, nlist, ilist(nlist* 2)
+!f2py threadsafe
+integer(kind=8), intent(in) :: natoms, nlist, ilist(nlist* 2)
 double precision, intent(in) :: coords(3*natoms), sig, eps, boxl
 double precision, intent(out) :: e
 logical, intent(in) :: periodic
 double precision dr(3), sig6, sig12, r2, ir2, ir6, ir12, iboxl
-integer j1, j2, i1, i2, n
+integer(kind=8) j1, j2, i1, i2, n
 
 if (periodic) iboxl = 1.d0 / boxl
 
@@ -98,12 +105,13 @@ end subroutine energy_ilist
 
 subroutine energy_gradient_ilist( coords, natoms, e, grad, eps, sig, ilist, nlist, periodic, boxl )
 implicit none
-integer, intent(in) :: natoms, nlist, ilist(nlist* 2)
+!f2py threadsafe
+integer(kind=8), intent(in) :: natoms, nlist, ilist(nlist* 2)
 double precision, intent(in) :: coords(3*natoms), sig, eps, boxl
 double precision, intent(out) :: e, grad(3*natoms)
 logical, intent(in) :: periodic
 double precision dr(3), sig6, sig12, r2, ir2, ir6, ir12, g, iboxl
-integer j1, j2, i1, i2, n
+integer(kind=8) j1, j2, i1, i2, n
 
 if (periodic) iboxl = 1.d0 / boxl
 
@@ -133,3 +141,170 @@ do n = 1,nlist
    grad(i2+1 : i2+3) = grad(i2+1 : i2+3) + g * dr(:)
 enddo
 end subroutine energy_gradient_ilist
+
+subroutine ljenergy_gradient_many( coords, natoms, nconf, e, grad, eps, sig, periodic, boxl )
+! energy and gradient of nconf independent configurations in a single call.
+! Each column of coords is one configuration, so passing the transpose of a
+! C ordered (nconf, 3*natoms) numpy array avoids a copy.
+implicit none
+integer, intent(in) :: natoms, nconf
+double precision, intent(in) :: coords(3*natoms, nconf), sig, eps, boxl
+double precision, intent(out) :: e(nconf), grad(3*natoms, nconf)
+logical, intent(in) :: periodic
+integer k
+
+do k = 1,nconf
+   call ljenergy_gradient( coords(:,k), natoms, e(k), grad(:,k), eps, sig, periodic, boxl )
+enddo
+end subroutine ljenergy_gradient_many
+
+subroutine hessian_vector_product( coords, natoms, v, hv, eps, sig, periodic, boxl )
+! the product of the hessian with the vector v.  The cost is the same as a
+! gradient evaluation and the hessian is never constructed.
+implicit none
+integer, intent(in) :: natoms
+double precision, intent(in) :: coords(3*natoms), v(3*natoms), sig, eps, boxl
+double precision, intent(out) :: hv(3*natoms)
+logical, intent(in) :: periodic
+double precision dr(3), dv(3), t(3), sig6, sig12, r2, ir2, ir6, ir12, g, h, iboxl
+integer j1, j2, i1, i2
+
+if (periodic) iboxl = 1.d0 / boxl
+
+sig6 = sig**6
+sig12 = sig6*sig6
+
+hv(:) = 0.d0
+do j1 = 1,natoms
+   i1 = 3*(j1-1)
+   do j2 = 1,j1-1
+      i2 = 3*(j2-1)
+      dr(:) = coords(i1+1 : i1 + 3) - coords(i2+1 : i2 + 3)
+      if (periodic)  dr(:) = dr(:) - nint( dr(:) * iboxl ) * boxl
+      r2 = sum( dr(:)**2 )
+      ir2 = 1.d0/r2
+      ir6 = ir2**3
+      ir12 = ir6**2
+
+      ! g = V'(r)/r,  h = (V''(r) - V'(r)/r) / r**2
+      g = -4.d0 * eps * (12.d0 * sig12 * ir12 -  6.d0 * sig6 * ir6) * ir2
+      h = 4.d0 * eps * (168.d0 * sig12 * ir12 - 48.d0 * sig6 * ir6) * ir2 * ir2
+      dv(:) = v(i1+1 : i1+3) - v(i2+1 : i2+3)
+      t(:) = h * sum( dr(:) * dv(:) ) * dr(:) + g * dv(:)
+      hv(i1+1 : i1+3) = hv(i1+1 : i1+3) + t(:)
+      hv(i2+1 : i2+3) = hv(i2+1 : i2+3) - t(:)
+   enddo
+enddo
+end subroutine hessian_vector_product
+
+subroutine hessian_vector_product_ilist( coords, natoms, v, hv, eps, sig, ilist, nlist, periodic, boxl )
+implicit none
+integer(kind=8), intent(in) :: natoms, nlist, ilist(nlist* 2)
+double precision, intent(in) :: coords(3*natoms), v(3*natoms), sig, eps, boxl
+double precision, intent(out) :: hv(3*natoms)
+logical, intent(in) :: periodic
+double precision dr(3), dv(3), t(3), sig6, sig12, r2, ir2, ir6, ir12, g, h, iboxl
+integer(kind=8) j1, j2, i1, i2, n
+
+if (periodic) iboxl = 1.d0 / boxl
+
+sig6 = sig**6
+sig12 = sig6*sig6
+
+hv(:) = 0.d0
+do n = 1,nlist
+   j1 = ilist(2*(n-1)+1) + 1 !convert to fortran indexing
+   j2 = ilist(2*(n-1)+2) + 1 !convert to fortran indexing
+
+   i1 = 3*(j1-1)
+   i2 = 3*(j2-1)
+
+   dr(:) = coords(i1+1 : i1 + 3) - coords(i2+1 : i2 + 3)
+   if (periodic)  dr(:) = dr(:) - nint( dr(:) * iboxl ) * boxl
+   r2 = sum( dr(:)**2 )
+   ir2 = 1.d0/r2
+   ir6 = ir2**3
+   ir12 = ir6**2
+
+   ! g = V'(r)/r,  h = (V''(r) - V'(r)/r) / r**2
+   g = -4.d0 * eps * (12.d0 * sig12 * ir12 -  6.d0 * sig6 * ir6) * ir2
+   h = 4.d0 * eps * (168.d0 * sig12 * ir12 - 48.d0 * sig6 * ir6) * ir2 * ir2
+   dv(:) = v(i1+1 : i1+3) - v(i2+1 : i2+3)
+   t(:) = h * sum( dr(:) * dv(:) ) * dr(:) + g * dv(:)
+   hv(i1+1 : i1+3) = hv(i1+1 : i1+3) + t(:)
+   hv(i2+1 : i2+3) = hv(i2+1 : i2+3) - t(:)
+enddo
+end subroutine hessian_vector_product_ilist
+
+subroutine ljenergy_rows( coords, natoms, e, eps, sig, periodic, boxl, jstart, jend )
+! the energy of the pairs (j1, j2) with j2 < j1 and jstart <= j1 < jend
+! (python indexing).  The GIL is released, so several python threads can
+! each compute a range of rows at the same time.
+implicit none
+!f2py threadsafe
+integer, intent(in) :: natoms, jstart, jend
+double precision, intent(in) :: coords(3*natoms), sig, eps, boxl
+double precision, intent(out) :: e
+logical, intent(in) :: periodic
+double precision dr(3), sig6, sig12, r2, ir2, ir6, ir12, iboxl
+integer j1, j2, i1, i2
+
+if (periodic) iboxl = 1.d0 / boxl
+
+sig6 = sig**6
+sig12 = sig6*sig6
+
+e = 0.d0
+do j1 = jstart+1,jend
+   i1 = 3*(j1-1)
+   do j2 = 1,j1-1
+      i2 = 3*(j2-1)
+      dr(:) = coords(i1+1 : i1 + 3) - coords(i2+1 : i2 + 3)
+      if (periodic)  dr(:) = dr(:) - nint( dr(:) * iboxl ) * boxl
+      r2 = sum( dr(:)**2 )
+      ir2 = 1.d0/r2
+      ir6 = ir2**3
+      ir12 = ir6**2
+      e = e - 4.d0 * eps * (sig6*ir6 - sig12*ir12)
+   enddo
+enddo
+end subroutine ljenergy_rows
+
+subroutine ljenergy_gradient_rows( coords, natoms, e, grad, eps, sig, periodic, boxl, jstart, jend )
+! the energy and gradient of the pairs (j1, j2) with j2 < j1 and 
+! jstart <= j1 < jend (python indexing).  The GIL is released, so several
+! python threads can each compute a range of rows into their own grad.
+implicit none
+!f2py threadsafe
+integer, intent(in) :: natoms, jstart, jend
+double precision, intent(in) :: coords(3*natoms), sig, eps, boxl
+double precision, intent(out) :: e, grad(3*natoms)
+logical, intent(in) :: periodic
+double precision dr(3), sig6, sig12, r2, ir2, ir6, ir12, g, iboxl
+integer j1, j2, i1, i2
+
+if (periodic) iboxl = 1.d0 / boxl
+
+sig6 = sig**6
+sig12 = sig6*sig6
+
+e = 0.d0
+grad(:) = 0.d0
+do j1 = jstart+1,jend
+   i1 = 3*(j1-1)
+   do j2 = 1,j1-1
+      i2 = 3*(j2-1)
+      dr(:) = coords(i1+1 : i1 + 3) - coords(i2+1 : i2 + 3)
+      if (periodic)  dr(:) = dr(:) - nint( dr(:) * iboxl ) * boxl
+      r2 = sum( dr(:)**2 )
+      ir2 = 1.d0/r2
+      ir6 = ir2**3
+      ir12 = ir6**2
+      e = e - 4.d0 * eps * (sig6*ir6 - sig12*ir12)
+
+      g = 4.d0 * eps * (12.d0 * sig12 * ir12 -  6.d0 * sig6 * ir6) * ir2;
+      grad(i1+1 : i1+3) = grad(i1+1 : i1+3) - g * dr(:)
+      grad(i2+1 : i2+3) = grad(i2+1 : i2+3) + g * dr(:)
+   enddo
+enddo
+end subroutine ljenergy_gradient_rows
@@ -233,3 +233,128 @@ eneibs = eneibs * epsneibs
 e = e + eneibs
 
 end subroutine maxneib_ljenergy_gradient
+
+!
+! the routines below split maxneib_ljenergy_gradient into two passes over a
+! range of rows jstart <= j1 < jend (python indexing) so that the rows can be
+! shared between threads.  The GIL is released.  The first pass computes the
+! lj energy and gradient and the contribution to the number of neighbors of
+! each atom.  After the neighbor counts of all rows have been summed the
+! second pass computes the gradient of the neighbor penalty.
+!
+
+subroutine maxneib_lj_rows( coords, natoms, e, grad, nneibs, ntypea, &
+   epsa, siga, &
+   epsb, sigb, &
+   epsab, sigab, &
+   periodic, boxl, &
+   rneib, rneib_crossover, &
+   only_AB_neibs, gradt, jstart, jend)
+implicit none
+!f2py threadsafe
+integer, intent(in) :: natoms, ntypea, jstart, jend
+double precision, intent(in) :: coords(3*natoms), boxl
+double precision, intent(in) :: siga, epsa
+double precision, intent(in) :: sigb, epsb
+double precision, intent(in) :: sigab, epsab
+double precision, intent(out) :: e, grad(3*natoms), nneibs(natoms)
+logical, intent(in) :: periodic, only_AB_neibs, gradt
+double precision, intent(in) :: rneib, rneib_crossover
+double precision dr(3), r2, ir2, ir6, ir12, iboxl
+integer j1, j2, i1, i2
+double precision sig, eps, areneibs, g
+double precision fermi
+
+if (periodic) iboxl = 1.d0 / boxl
+
+e = 0.d0
+grad(:) = 0.d0
+nneibs(:) = 0.d0
+do j1 = jstart+1,jend
+   i1 = 3*(j1-1)
+   do j2 = 1,j1-1
+      i2 = 3*(j2-1)
+      if (j1 .le. ntypea .and. j2 .le. ntypea) then
+         sig = siga
+         eps = epsa
+      elseif (j1 .gt. ntypea .and. j2 .gt. ntypea) then
+         sig = sigb
+         eps = epsb
+      else
+         sig = sigab
+         eps = epsab
+      endif
+      dr(:) = coords(i1+1 : i1 + 3) - coords(i2+1 : i2 + 3)
+      if (periodic)  dr(:) = dr(:) - nint( dr(:) * iboxl ) * boxl
+      r2 = sum( dr(:)**2 )
+      r2 = r2 / sig**2
+      ir2 = 1.d0 / r2
+      ir6 = ir2**3
+      ir12 = ir6**2
+      e = e - 4.d0 * eps * (ir6 - ir12)
+      if (gradt) then
+         g = 4.d0 * eps * (12.d0 * ir12 -  6.d0 * ir6) * ir2 / sig**2;
+         grad(i1+1 : i1+3) = grad(i1+1 : i1+3) - g * dr(:)
+         grad(i2+1 : i2+3) = grad(i2+1 : i2+3) + g * dr(:)
+      endif
+
+      if (only_AB_neibs .and. ((j1 .le. ntypea) .eqv. (j2 .le. ntypea))) then
+         areneibs = 0.d0
+      else
+         areneibs = 1.d0 - fermi(sqrt(r2), rneib, rneib_crossover)
+      endif
+      nneibs(j1) = nneibs(j1)  + areneibs
+      nneibs(j2) = nneibs(j2)  + areneibs
+   enddo
+enddo
+end subroutine maxneib_lj_rows
+
+subroutine maxneib_neib_gradient_rows( coords, natoms, grad, nneibs, ntypea, &
+   siga, sigb, sigab, &
+   periodic, boxl, &
+   rneib, rneib_crossover, max_neibs, neib_crossover, epsneibs, &
+   only_AB_neibs, jstart, jend)
+implicit none
+!f2py threadsafe
+integer, intent(in) :: natoms, ntypea, jstart, jend
+double precision, intent(in) :: coords(3*natoms), boxl, nneibs(natoms)
+double precision, intent(in) :: siga, sigb, sigab
+double precision, intent(out) :: grad(3*natoms)
+logical, intent(in) :: periodic, only_AB_neibs
+double precision, intent(in) :: rneib, rneib_crossover, max_neibs
+double precision, intent(in) :: neib_crossover, epsneibs
+double precision dr(3), r2, r, iboxl
+integer j1, j2, i1, i2
+double precision sig, dfr, dfn1, dfn2, g
+double precision dfermi_dx
+
+if (periodic) iboxl = 1.d0 / boxl
+
+grad(:) = 0.d0
+do j1 = jstart+1,jend
+   i1 = 3*(j1-1)
+   dfn1 = dfermi_dx(nneibs(j1), max_neibs, neib_crossover)
+   do j2 = 1,j1-1
+      i2 = 3*(j2-1)
+      if (only_AB_neibs .and. ((j1 .le. ntypea) .eqv. (j2 .le. ntypea))) cycle
+      if (j1 .le. ntypea .and. j2 .le. ntypea) then
+         sig = siga
+      elseif (j1 .gt. ntypea .and. j2 .gt. ntypea) then
+         sig = sigb
+      else
+         sig = sigab
+      endif
+      dr(:) = coords(i1+1 : i1 + 3) - coords(i2+1 : i2 + 3)
+      if (periodic)  dr(:) = dr(:) - nint( dr(:) * iboxl ) * boxl
+      r2 = sum( dr(:)**2 )
+      r2 = r2 / sig**2
+      r = sqrt(r2)
+
+      dfr = dfermi_dx(r, rneib, rneib_crossover)
+      dfn2 = dfermi_dx(nneibs(j2), max_neibs, neib_crossover)
+      g = epsneibs * dfr * (dfn1 + dfn2)
+      grad(i1+1 : i1+3) = grad(i1+1 : i1+3) - g * dr(:) / r / sig**2
+      grad(i2+1 : i2+3) = grad(i2+1 : i2+3) + g * dr(:) / r / sig**2
+   enddo
+enddo
+end subroutine maxneib_neib_gradient_rows
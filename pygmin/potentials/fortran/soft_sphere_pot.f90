@@ -103,3 +103,25 @@ subroutine soft_sphere_pot(dimen,npart,x,diams,energy,force) ! Subroutine that c
   energy = energy/2.0D0
   
 end subroutine soft_sphere_pot
+
+subroutine soft_sphere_pot_many(dimen,npart,nconf,x,diams,energy,force) ! soft_sphere_pot for nconf configurations at once.
+
+  implicit none
+
+  !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
+  ! nconf = number of configurations.  Each column of x is one     !
+  ! configuration, the remaining arguments are as in               !
+  ! soft_sphere_pot.                                               !
+  !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!
+
+  integer, intent(in) :: npart,dimen,nconf
+  double precision, intent(in) :: x(dimen*npart,nconf)
+  double precision, intent(out) :: force(dimen*npart,nconf), energy(nconf)
+  double precision, intent(in) :: diams(npart)
+  integer :: k
+
+  do k=1,nconf
+    call soft_sphere_pot(dimen,npart,x(:,k),diams,energy(k),force(:,k))
+  end do
+
+end subroutine soft_sphere_pot_many
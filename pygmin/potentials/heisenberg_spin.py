@@ -4,6 +4,7 @@ from numpy import sin, cos
 import networkx as nx
 
 from pygmin.potentials import BasePotential
+from pygmin.potentials.xyspin import lattice_edges
 import pygmin.utils.rotations as rotations
 
 __all__ = ["HeisenbergModel"]
@@ -32,25 +33,26 @@ def make2dVector(u):
 
 
 def coords2ToCoords3(coords2):
-    if len(np.shape(coords2)) == 1:
-        nvec = len(coords2) / 2
-        coords2 = np.reshape(coords2, [nvec, 2])
-    else:
-        nvec = len(coords2[:,0])
-    coords3 = np.zeros([nvec, 3])
-    for i in range(nvec):
-        coords3[i,:] = make3dVector( coords2[i,:] )
+    """
+    convert (theta, phi) for each spin to 3d unit vectors, shape (nvec, 3)
+    """
+    coords2 = np.reshape(coords2, [-1, 2])
+    theta = coords2[:,0]
+    sinphi = sin(coords2[:,1])
+    coords3 = np.empty([len(coords2), 3])
+    coords3[:,0] = sinphi * cos(theta)
+    coords3[:,1] = sinphi * sin(theta)
+    coords3[:,2] = cos(coords2[:,1])
     return coords3
 
 def coords3ToCoords2(coords3):
-    if len(np.shape(coords3)) == 1:
-        nvec = len(coords3) / 3
-        coords3 = np.reshape(coords3, [nvec, 3])
-    else:
-        nvec = len(coords3[:,0])
-    coords2 = np.zeros([nvec, 2])
-    for i in range(nvec):
-        coords2[i,:] = make2dVector( coords3[i,:] )
+    """
+    convert 3d unit vectors to (theta, phi) for each spin, shape (nvec, 2)
+    """
+    coords3 = np.reshape(coords3, [-1, 3])
+    coords2 = np.empty([len(coords3), 2])
+    coords2[:,1] = np.arccos(coords3[:,2])
+    coords2[:,0] = np.arctan2(coords3[:,1], coords3[:,0])
     return coords2
 
 def makeGrad2(vec2, grad3):
@@ -67,18 +69,37 @@ def makeGrad2(vec2, grad3):
 
 
 def grad3ToGrad2(coords2, grad3):
-    if len(np.shape(grad3)) == 1:
-        nvec = len(grad3) / 3
-        grad3 = np.reshape(grad3, [nvec, 3])
-    else:
-        nvec = len(grad3[:,0])
-    if len(np.shape(coords2)) == 1:
-        coords2 = np.reshape(coords2, [nvec, 2])
-    grad2 = np.zeros([nvec, 2])
-    for i in range(nvec):
-        grad2[i,:] = makeGrad2( coords2[i,:], grad3[i,:] )
+    """
+    convert the gradient with respect to the 3d vectors into the gradient
+    with respect to (theta, phi).  This is makeGrad2 applied to all spins at once.
+    """
+    grad3 = np.reshape(grad3, [-1, 3])
+    coords2 = np.reshape(coords2, [-1, 2])
+    c0 = cos(coords2[:,0])
+    c1 = cos(coords2[:,1])
+    s0 = sin(coords2[:,0])
+    s1 = sin(coords2[:,1])
+    grad2 = np.empty([len(grad3), 2])
+    grad2[:,0] = (-s0 * grad3[:,0] + c0 * grad3[:,1]) * s1
+    grad2[:,1] = c0*c1 * grad3[:,0] + s0*c1 * grad3[:,1] - s1 * grad3[:,2]
     return grad2
 
+def exchangeEnergyGradient(coords3, edge_u, edge_v, couplings, grad3=None):
+    """
+    return the exchange energy - sum_ij J_ij dot( s_i, s_j ) over the edges
+    
+    if grad3 is passed the gradient with respect to the 3d vectors is added to it
+    """
+    su = coords3[edge_u,:]
+    sv = coords3[edge_v,:]
+    E = -np.dot(couplings, np.sum(su * sv, axis=1))
+    if grad3 is not None:
+        nspins = len(coords3)
+        for k in range(3):
+            grad3[:,k] -= np.bincount(edge_u, couplings * sv[:,k], minlength=nspins)
+            grad3[:,k] -= np.bincount(edge_v, couplings * su[:,k], minlength=nspins)
+    return E
+
 
 
 
@@ -118,6 +139,9 @@ class HeisenbergModel(BasePotential):
             self.fields[i,:] = rotations.vec_random() * \
                 field_disorder#np.random.uniform(0, field_disorder, [3])
             i += 1 
+        
+        self.edge_u, self.edge_v = lattice_edges(self.G, self.indices)
+        self.couplings = np.ones(len(self.edge_u))
 
 
     
@@ -128,12 +152,7 @@ class HeisenbergModel(BasePotential):
         where phi is the azimuthal angle (angle to the z axis) 
         """
         coords3 = coords2ToCoords3( coords )
-            
-        E = 0.
-        for edge in self.G.edges():
-            u = self.indices[edge[0]]
-            v = self.indices[edge[1]]
-            E -= np.dot( coords3[u,:], coords3[v,:] )
+        E = exchangeEnergyGradient(coords3, self.edge_u, self.edge_v, self.couplings)
         
         Efields = -np.sum( self.fields * coords3 )
         
@@ -148,22 +167,13 @@ class HeisenbergModel(BasePotential):
         coords3 = coords2ToCoords3( coords )
         coords2 = coords
             
-        E = 0.
         grad3 = np.zeros( [self.nspins, 3] )
-        for edge in self.G.edges():
-            u = self.indices[edge[0]]
-            v = self.indices[edge[1]]
-            E -= np.dot( coords3[u,:], coords3[v,:] )
-            
-            grad3[u,:] -= coords3[v,:]
-            grad3[v,:] -= coords3[u,:]
+        E = exchangeEnergyGradient(coords3, self.edge_u, self.edge_v, self.couplings,
+                                   grad3=grad3)
         
         Efields = -np.sum( self.fields * coords3 )
         grad3 -= self.fields
         
-        #for i in range(self.nspins):
-        #    grad3[i,:] /= np.linalg.norm( grad3[i,:] )
-        
         grad2 = grad3ToGrad2(coords2, grad3)
         grad2 = np.reshape(grad2, self.nspins*2)
         
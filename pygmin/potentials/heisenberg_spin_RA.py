@@ -5,7 +5,9 @@ import networkx as nx
 
 from pygmin.potentials import BasePotential
 import pygmin.utils.rotations as rotations
-from pygmin.potentials.heisenberg_spin import make3dVector,  make2dVector, coords2ToCoords3, coords3ToCoords2, grad3ToGrad2
+from pygmin.potentials.heisenberg_spin import make3dVector,  make2dVector, coords2ToCoords3, coords3ToCoords2, grad3ToGrad2, \
+    exchangeEnergyGradient
+from pygmin.potentials.xyspin import lattice_edges
 
 
 
@@ -43,6 +45,9 @@ class HeisenbergModelRA(BasePotential):
             self.fields[i,:] = rotations.vec_random() * \
                 np.sqrt(field_disorder) #np.random.uniform(0, field_disorder, [3])
             i += 1 
+        
+        self.edge_u, self.edge_v = lattice_edges(self.G, self.indices)
+        self.couplings = np.ones(len(self.edge_u))
 
 
     
@@ -53,12 +58,7 @@ class HeisenbergModelRA(BasePotential):
         where phi is the azimuthal angle (angle to the z axis) 
         """
         coords3 = coords2ToCoords3( coords )
-            
-        E = 0.
-        for edge in self.G.edges():
-            u = self.indices[edge[0]]
-            v = self.indices[edge[1]]
-            E -= np.dot( coords3[u,:], coords3[v,:] )
+        E = exchangeEnergyGradient(coords3, self.edge_u, self.edge_v, self.couplings)
         
         Efields = - np.sum( np.sum( self.fields * coords3, axis=1 )**2 )
         
@@ -73,24 +73,15 @@ class HeisenbergModelRA(BasePotential):
         coords3 = coords2ToCoords3( coords )
         coords2 = coords
             
-        E = 0.
         grad3 = np.zeros( [self.nspins, 3] )
-        for edge in self.G.edges():
-            u = self.indices[edge[0]]
-            v = self.indices[edge[1]]
-            E -= np.dot( coords3[u,:], coords3[v,:] )
-            
-            grad3[u,:] -= coords3[v,:]
-            grad3[v,:] -= coords3[u,:]
+        E = exchangeEnergyGradient(coords3, self.edge_u, self.edge_v, self.couplings,
+                                   grad3=grad3)
         
         vdotf = np.sum( self.fields * coords3, axis=1 )
-        Efields = - np.sum( np.sum( self.fields * coords3, axis=1 )**2 )
+        Efields = - np.sum( vdotf**2 )
 
         grad3 -= 2.* self.fields * vdotf[:, np.newaxis]
         
-        #for i in range(self.nspins):
-        #    grad3[i,:] /= np.linalg.norm( grad3[i,:] )
-        
         grad2 = grad3ToGrad2(coords2, grad3)
         grad2 = np.reshape(grad2, self.nspins*2)
         
@@ -0,0 +1,242 @@
+"""
+a potential wrapper which counts and times the potential calls
+
+.. currentmodule:: pygmin.potentials.instrumented_potential
+
+InstrumentedPotential records, for every kind of call (energy, gradient,
+Hessian, Hessian-vector product), how often it was made and how much wall
+time it took.  The calls are broken down by a caller tag, e.g. quench, neb,
+ts_search or mindist.  The algorithms set the tag with potential_tag, so the
+summary shows where a run spends its potential budget.  If the wrapped
+potential is a CachedPotential the cache hits are recorded too.
+
+.. autosummary::
+    :toctree: generated/
+
+    InstrumentedPotential
+    potential_tag
+"""
+import time
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+from pygmin.potentials.potential import BasePotential
+
+__all__ = ["InstrumentedPotential", "potential_tag"]
+
+# the tag of the current caller is kept per thread
+_tags = threading.local()
+
+def _current_tag():
+    stack = getattr(_tags, "stack", None)
+    if not stack:
+        return "other"
+    return stack[-1]
+
+@contextmanager
+def potential_tag(tag):
+    """attribute the potential calls made inside the with block to tag
+
+    Tags can be nested, the innermost one is used.  This costs almost nothing
+    if the potential is not instrumented.
+
+    Examples
+    --------
+    >>> with potential_tag("quench"):
+    ...     ret = mylbfgs(coords, pot)
+    """
+    stack = getattr(_tags, "stack", None)
+    if stack is None:
+        stack = _tags.stack = []
+    stack.append(tag)
+    try:
+        yield
+    finally:
+        stack.pop()
+
+
+class InstrumentedPotential(BasePotential):
+    """wrap a potential and record call counts and timings by caller tag
+
+    Parameters
+    ----------
+    pot : potential object
+        the potential to wrap.  All other attributes are passed through to it.
+    stats : dict, optional
+        the table to record the calls in.  Wrappers which are given the same
+        dict share their records, e.g. the potentials a system hands to
+        basinhopping and to its quencher.
+
+    Attributes
+    ----------
+    stats : dict
+        stats[(tag, kind)] is a list [ncalls, time, ncache_hits]
+
+    Notes
+    -----
+    Only the outermost call is recorded.  E.g. a numerical Hessian is
+    counted as one Hessian call, not as the many gradient calls it is made
+    of.
+
+    See Also
+    --------
+    potential_tag
+    """
+    kinds = ["energy", "gradient", "hessian", "hessian_vector"]
+
+    def __init__(self, pot, stats=None):
+        self.pot = pot
+        self._depth = 0
+        if stats is None:
+            stats = dict()
+        self.stats = stats
+
+    def __getattr__(self, name):
+        # only called if normal attribute lookup fails.  Be careful not to
+        # recurse before self.pot exists, e.g. when copying or unpickling
+        if name.startswith("__") or "pot" not in self.__dict__:
+            raise AttributeError(name)
+        return getattr(self.pot, name)
+
+    def reset(self):
+        """forget all recorded calls"""
+        self.stats.clear()
+
+    def _call(self, kind, func, *args, **kwargs):
+        if self._depth > 0:
+            return func(*args, **kwargs)
+        nhits = getattr(self.pot, "nhits", 0)
+        self._depth += 1
+        t0 = time.time()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            dt = time.time() - t0
+            self._depth -= 1
+            s = self.stats.setdefault((_current_tag(), kind), [0, 0., 0])
+            s[0] += 1
+            s[1] += dt
+            s[2] += getattr(self.pot, "nhits", 0) - nhits
+
+    def getEnergy(self, coords):
+        return self._call("energy", self.pot.getEnergy, coords)
+
+    def getEnergyGradient(self, coords):
+        return self._call("gradient", self.pot.getEnergyGradient, coords)
+
+    def getEnergyGradientMany(self, coords_stack):
+        if hasattr(self.pot, "getEnergyGradientMany"):
+            return self._call("gradient", self.pot.getEnergyGradientMany, coords_stack)
+        return self._call("gradient", BasePotential.getEnergyGradientMany, self, coords_stack)
+
+    def getEnergyPerAtom(self, coords):
+        return self._call("energy", self.pot.getEnergyPerAtom, coords)
+
+    def getEnergyGradientHessian(self, coords):
+        return self._call("hessian", self.pot.getEnergyGradientHessian, coords)
+
+    def getHessian(self, coords):
+        if hasattr(self.pot, "getHessian"):
+            return self._call("hessian", self.pot.getHessian, coords)
+        return self._call("hessian", BasePotential.getHessian, self, coords)
+
+    def getSparseHessian(self, coords):
+        if hasattr(self.pot, "getSparseHessian"):
+            return self._call("hessian", self.pot.getSparseHessian, coords)
+        return self._call("hessian", BasePotential.getSparseHessian, self, coords)
+
+    def getHessianVectorProduct(self, coords, vec, eps=1e-6):
+        if hasattr(self.pot, "getHessianVectorProduct"):
+            return self._call("hessian_vector", self.pot.getHessianVectorProduct,
+                              coords, vec, eps=eps)
+        return self._call("hessian_vector", BasePotential.getHessianVectorProduct,
+                          self, coords, vec, eps=eps)
+
+    def getEnergyChange(self, coords_old, coords_new, moved_atoms):
+        if hasattr(self.pot, "getEnergyChange"):
+            return self._call("energy", self.pot.getEnergyChange,
+                              coords_old, coords_new, moved_atoms)
+        return self._call("energy",
+                          lambda: self.pot.getEnergy(coords_new) - self.pot.getEnergy(coords_old))
+
+    def totals(self, tag=None):
+        """return the number of calls, time and cache hits summed over all kinds
+
+        if tag is given, only the calls with this tag are summed
+        """
+        s = np.zeros(3)
+        for (t, kind), v in self.stats.iteritems():
+            if tag is None or t == tag:
+                s += v
+        return int(s[0]), s[1], int(s[2])
+
+    def summary(self):
+        """return a table of the recorded calls as a string"""
+        lines = ["potential calls by caller",
+                 "%-16s %-16s %10s %12s %10s" % ("tag", "kind", "calls", "time (s)", "cache hits")]
+        for tag in sorted(set(t for t, kind in self.stats)):
+            for kind in self.kinds:
+                try:
+                    ncalls, t, nhits = self.stats[(tag, kind)]
+                except KeyError:
+                    continue
+                lines.append("%-16s %-16s %10d %12.4f %10d" % (tag, kind, ncalls, t, nhits))
+        ncalls, t, nhits = self.totals()
+        lines.append("%-16s %-16s %10d %12.4f %10d" % ("total", "", ncalls, t, nhits))
+        return "\n".join(lines)
+
+
+#
+# only testing stuff below here
+#
+
+import unittest
+class TestInstrumentedPotential(unittest.TestCase):
+    def setUp(self):
+        from pygmin.potentials.lj import LJ
+        from pygmin.potentials.cached_potential import CachedPotential
+        self.natoms = 6
+        self.lj = LJ()
+        self.pot = InstrumentedPotential(CachedPotential(self.lj))
+        self.coords = np.random.uniform(-1,1.,3*self.natoms) * self.natoms**(-1./3)
+
+    def test_counts(self):
+        with potential_tag("quench"):
+            self.pot.getEnergyGradient(self.coords)
+            self.pot.getEnergy(self.coords)
+            with potential_tag("neb"):
+                self.pot.getEnergy(self.coords * 1.1)
+        self.pot.getGradient(self.coords)
+        self.assertEqual(self.pot.stats[("quench", "gradient")][0], 1)
+        self.assertEqual(self.pot.stats[("quench", "energy")][0], 1)
+        # the energy was served from the cache
+        self.assertEqual(self.pot.stats[("quench", "energy")][2], 1)
+        self.assertEqual(self.pot.stats[("neb", "energy")][0], 1)
+        self.assertEqual(self.pot.stats[("other", "gradient")][0], 1)
+        self.assertEqual(self.pot.totals(), (4, self.pot.totals()[1], 2))
+        self.assertEqual(self.pot.totals("quench")[0], 2)
+        self.assertTrue("quench" in self.pot.summary())
+
+    def test_outermost_only(self):
+        e, g, hess = self.pot.getEnergyGradientHessian(self.coords)
+        self.assertEqual(self.pot.totals()[0], 1)
+        self.assertEqual(self.pot.stats[("other", "hessian")][0], 1)
+
+    def test_shared_stats(self):
+        pot2 = InstrumentedPotential(self.lj, stats=self.pot.stats)
+        self.pot.getEnergy(self.coords)
+        pot2.getEnergy(self.coords * 1.1)
+        self.assertEqual(self.pot.totals()[0], 2)
+        self.assertTrue(pot2.stats is self.pot.stats)
+
+    def test_passthrough(self):
+        self.assertEqual(self.pot.boxl, self.lj.boxl)
+        e = self.pot.getEnergy(self.coords)
+        self.assertEqual(e, self.lj.getEnergy(self.coords))
+        self.pot.reset()
+        self.assertEqual(self.pot.totals()[0], 0)
+
+if __name__ == "__main__":
+    unittest.main()
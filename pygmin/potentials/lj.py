@@ -2,38 +2,105 @@ from math import *
 import numpy as np #to access np.exp() not built int exp
 
 from pygmin.potentials import BasePotential
-import fortran.lj as ljf
+from pygmin.potentials.potential import _moved_atom_pairs
+from pygmin.potentials import _threaded
+from pygmin.potentials.numpy_kernels import lj as _lj_np
+from pygmin.potentials.numpy_kernels._pairs import pair_energy_per_atom
+try:
+    import fortran.lj as ljf
+except ImportError:
+    import numpy_kernels.lj as ljf
 
 
 __all__ = ["LJ"]
 
 class LJ(BasePotential):
-    """ simple lennard jones potential"""
-    def __init__(self, eps=1.0, sig=1.0, boxl=None):
+    """ simple lennard jones potential
+    
+    Parameters
+    ----------
+    eps, sig : float
+        the lj parameters
+    boxl : float, optional
+        if given, use periodic boundary conditions in a cubic box.  The
+        minimum image is applied to all pairs.  For large periodic systems use
+        LJPeriodic, which has a cutoff and a persistent Verlet list
+    nthreads : int
+        if greater than 1, the energy and gradient are computed by this many
+        threads, each doing a share of the pairs.  This only pays off for
+        large systems, e.g. thousands of atoms.  It is ignored if the
+        compiled fortran module is not available
+    """
+    def __init__(self, eps=1.0, sig=1.0, boxl=None, nthreads=1):
         self.sig = sig
         self.eps = eps
         self.boxl = boxl
+        self.nthreads = nthreads
         if self.boxl is None:
             self.periodic = False
             self.boxl = 10000.
         else:
             self.periodic = True
 
+    def _box(self):
+        """the box length for the numpy pair kernels"""
+        if self.periodic:
+            return self.boxl
+        return None
+
+    def _threaded(self):
+        return self.nthreads > 1 and hasattr(ljf, "ljenergy_gradient_rows")
+
+    def _run_rows(self, func, coords):
+        """call func for a range of rows of the pair loop in each thread and sum the results"""
+        natoms = len(coords) / 3
+        argslist = [(coords, self.eps, self.sig, self.periodic, self.boxl, j1, j2, [natoms])
+                    for j1, j2 in _threaded.row_ranges(natoms, self.nthreads)]
+        return _threaded.sum_results(_threaded.run_threaded(func, argslist, self.nthreads))
+
+    def _run_list(self, func, coords, ilist):
+        """call func for a chunk of ilist in each thread and sum the results"""
+        natoms = len(coords) / 3
+        argslist = [(coords, self.eps, self.sig, chunk.reshape(-1), self.periodic, self.boxl,
+                     [natoms, len(chunk)])
+                    for chunk in _threaded.list_chunks(ilist, self.nthreads)]
+        return _threaded.sum_results(_threaded.run_threaded(func, argslist, self.nthreads))
+
     def getEnergy(self, coords):
+        if self._threaded():
+            return self._run_rows(ljf.ljenergy_rows, coords)
         natoms = len(coords) / 3
         E = ljf.ljenergy(
                 coords, self.eps, self.sig, self.periodic, self.boxl, [natoms])
         return E
 
     def getEnergyGradient(self, coords):
+        if self._threaded():
+            return self._run_rows(ljf.ljenergy_gradient_rows, coords)
         natoms = len(coords) / 3
         E, grad = ljf.ljenergy_gradient(
                 coords, self.eps, self.sig, self.periodic, self.boxl, [natoms])
-        return E, grad 
-    
+        return E, grad
+
+    def getEnergyGradientMany(self, coords_stack):
+        """return the energies and gradients of a stack of configurations
+
+        All configurations are evaluated in a single call to the fortran code
+        """
+        coords_stack = np.asarray(coords_stack)
+        nconf = coords_stack.shape[0]
+        natoms = coords_stack.shape[1] / 3
+        # the transpose is fortran ordered, so no copy is made
+        E, grad = ljf.ljenergy_gradient_many(
+                coords_stack.T, self.eps, self.sig, self.periodic, self.boxl,
+                [natoms, nconf])
+        return E, grad.T
+
     def getEnergyList(self, coords, ilist):
         #ilist = ilist_i.getNPilist()
         #ilist += 1 #fortran indexing
+        if self._threaded():
+            return self._run_list(ljf.energy_ilist, coords, ilist)
         nlist = len(ilist)
         natoms = len(coords) / 3
         E = ljf.energy_ilist(
@@ -42,9 +109,29 @@ class LJ(BasePotential):
         #ilist -= 1
         return E
     
+    def getEnergyPerAtomList(self, coords, ilist):
+        """return the energy of each atom from the interactions in ilist"""
+        return pair_energy_per_atom(coords, _lj_np._energy(self.eps, self.sig), self._box(), 
+                                    ilist=ilist)
+
+    def getEnergyPerAtom(self, coords):
+        """return the energy of each atom, each pair energy split equally between its atoms"""
+        return pair_energy_per_atom(coords, _lj_np._energy(self.eps, self.sig), self._box())
+
+    def getEnergyChange(self, coords_old, coords_new, moved_atoms):
+        """return the change in energy when only the atoms in moved_atoms have moved
+        
+        only the interactions of the moved atoms are computed
+        """
+        ilist = _moved_atom_pairs(len(coords_new) / 3, moved_atoms)
+        return (self.getEnergyList(coords_new, ilist) 
+                - self.getEnergyList(coords_old, ilist))
+
     def getEnergyGradientList(self, coords, ilist):
         #ilist = ilist_i.getNPilist()
         #ilist += 1 #fortran indexing
+        if self._threaded():
+            return self._run_list(ljf.energy_gradient_ilist, coords, ilist)
         nlist = len(ilist)
         natoms = len(coords) / 3
         E, grad = ljf.energy_gradient_ilist(
@@ -53,9 +140,34 @@ class LJ(BasePotential):
         #ilist -= 1
         return E, grad 
     
+    def getHessianVectorProduct(self, coords, vec, eps=None):
+        """return the product of the Hessian with vec, computed analytically"""
+        natoms = len(coords) / 3
+        hv = ljf.hessian_vector_product(
+                coords, vec, self.eps, self.sig, self.periodic, self.boxl, [natoms])
+        return hv
+    
+    def getHessianVectorProductList(self, coords, vec, ilist):
+        """return the product of the Hessian with vec for the interactions in ilist"""
+        nlist = len(ilist)
+        natoms = len(coords) / 3
+        hv = ljf.hessian_vector_product_ilist(
+                coords, vec, self.eps, self.sig, ilist.reshape(-1), self.periodic, 
+                self.boxl, [natoms, nlist])
+        return hv
+    
     def getEnergyGradientHessian(self, coords):
-        if self.periodic: raise Exception("Hessian not implemented for periodic boundaries")
-        from fortran.lj_hess import ljdiff
+        if self.periodic:
+            # minimum image over all pairs, as in the energy and gradient.
+            # LJPeriodic does this with a cutoff in O(N)
+            from numpy_kernels._pairs import pair_hessian
+            energy, g = self.getEnergyGradient(coords)
+            hess = pair_hessian(coords, _lj_np._hessian(self.eps, self.sig), self.boxl)
+            return energy, g, hess
+        try:
+            from fortran.lj_hess import ljdiff
+        except ImportError:
+            from numpy_kernels.lj_hess import ljdiff
         g, energy, hess = ljdiff(coords, True, True)
         return energy, g, hess
     
@@ -91,6 +203,23 @@ class LJTest(unittest.TestCase):
         self.assertAlmostEqual(self.E, e, 7)
         gdiffmax = np.max(np.abs( g-self.grad )) / np.max(np.abs(self.grad))
         self.assertLess(gdiffmax, 1e-7)
+    def test_many(self):
+        coords_stack = np.array([self.coords, self.coords * 1.1, self.coords * 0.9])
+        energies, grads = self.pot.getEnergyGradientMany(coords_stack)
+        self.assertEqual(grads.shape, coords_stack.shape)
+        for x, e, g in zip(coords_stack, energies, grads):
+            e1, g1 = self.pot.getEnergyGradient(x)
+            self.assertAlmostEqual(e1, e, 7)
+            self.assertLess(np.max(np.abs(g1 - g)), 1e-7 * np.max(np.abs(g1)))
+    def test_threaded(self):
+        pot = LJ(nthreads=3)
+        e, g = pot.getEnergyGradient(self.coords)
+        self.assertAlmostEqual(e / self.E, 1., 10)
+        self.assertAlmostEqual(pot.getEnergy(self.coords) / self.E, 1., 10)
+        self.assertLess(np.max(np.abs(g - self.grad)), 1e-10 * np.max(np.abs(self.grad)))
+        e, g = pot.getEnergyGradientList(self.coords, self.ilist)
+        self.assertAlmostEqual(e / self.E, 1., 10)
+        self.assertLess(np.max(np.abs(g - self.grad)), 1e-10 * np.max(np.abs(self.grad)))
     
 
 class TestLJAfterQuench(unittest.TestCase):
@@ -130,6 +259,21 @@ class TestLJAfterQuench(unittest.TestCase):
 #        print np.max(np.abs((hess-nhess)/nhess))
         self.assertLess(maxdiff / maxhess, 1e-5)
 
+    def test_hessian_vector_product(self):
+        e, g, hess = self.pot.getEnergyGradientHessian(self.coords)
+        vec = np.random.uniform(-1,1,self.coords.size)
+        hv = self.pot.getHessianVectorProduct(self.coords, vec)
+        hvtrue = np.dot(hess, vec)
+        self.assertLess(np.max(np.abs(hv - hvtrue)), 1e-7 * np.max(np.abs(hvtrue)))
+
+    def test_hessian_periodic(self):
+        pot = LJ(boxl=3.)
+        e, g, hess = pot.getEnergyGradientHessian(self.coords)
+        nhess = pot.NumericalHessian(self.coords, eps=1e-8)
+        maxhess = np.max(np.abs(hess))
+        self.assertAlmostEqual(e, pot.getEnergy(self.coords), 7)
+        self.assertLess(np.max(np.abs(hess - nhess)) / maxhess, 1e-5)
+
 
 def main():
     #test class
@@ -0,0 +1,324 @@
+"""
+Lennard-Jones in an orthorhombic periodic box with a persistent Verlet list
+
+.. currentmodule:: pygmin.potentials.lj_periodic
+
+.. autosummary::
+    :toctree: generated/
+
+    LJPeriodic
+    PeriodicPairList
+"""
+import numpy as np
+
+from pygmin.potentials import BasePotential
+from pygmin.potentials.potential import _select_moved_pairs
+from pygmin.potentials.ljcut import LJCut
+from pygmin.potentials.pair_hessian import pair_hessian_sparse
+from pygmin.potentials.numpy_kernels import ljcut as _ljcut_np
+from pygmin.potentials.numpy_kernels._pairs import (pair_energy, pair_energy_gradient,
+                                                    pair_energy_per_atom,
+                                                    pair_hessian_vector_product)
+
+__all__ = ["LJPeriodic", "PeriodicPairList"]
+
+def _as_boxvec(boxvec):
+    """return the box lengths as an array of length 3"""
+    boxvec = np.array(boxvec, np.float64) * np.ones(3)
+    if np.any(boxvec <= 0.):
+        raise ValueError("the box lengths must be positive")
+    return boxvec
+
+def _minimum_image(dr, boxvec):
+    dr -= boxvec * np.round(dr / boxvec)
+    return dr
+
+def build_pairs_box(coords, rlist, boxvec):
+    """return all pairs closer than rlist in an orthorhombic periodic box
+
+    The atoms are binned into cells of side at least rlist along each
+    direction and only atoms in adjacent cells are compared, so the cost is
+    linear in the number of atoms.  All loops are vectorized with numpy.
+
+    Parameters
+    ----------
+    coords : array
+    rlist : float
+    boxvec : array of length 3
+        the box lengths
+
+    Returns
+    -------
+    neib_list : array of np.int64, shape (nlist, 2)
+        each pair is listed once, with neib_list[:,0] > neib_list[:,1]
+    """
+    x = np.reshape(coords, [-1,3])
+    natoms = len(x)
+    ncells = np.maximum((boxvec / rlist).astype(np.int64), 1)
+    xwrap = x - boxvec * np.floor(x / boxvec)
+    # guard against rounding putting an atom in cell ncells
+    c = np.minimum((xwrap / boxvec * ncells).astype(np.int64), ncells - 1)
+    def cell_index(c):
+        return (c[:,0] * ncells[1] + c[:,1]) * ncells[2] + c[:,2]
+    icell = cell_index(c)
+    order = np.argsort(icell, kind="mergesort")
+    counts = np.bincount(icell, minlength=np.prod(ncells))
+    start = np.cumsum(counts) - counts
+
+    # the distinct neighboring cells along each direction.  For fewer than
+    # three cells the offsets -1 and +1 are the same cell
+    offsets = [np.unique(np.array([-1, 0, 1]) % n) for n in ncells]
+    atoms = np.arange(natoms)
+    pairs = []
+    for o0 in offsets[0]:
+        for o1 in offsets[1]:
+            for o2 in offsets[2]:
+                jcell = cell_index((c + np.array([o0, o1, o2])) % ncells)
+                nj = counts[jcell]
+                I = np.repeat(atoms, nj)
+                # the position of each J in the cell sorted atom order
+                first = np.repeat(start[jcell] - (np.cumsum(nj) - nj), nj)
+                J = order[np.arange(len(I)) + first]
+                # every pair is found from both sides
+                keep = I > J
+                I = I[keep]
+                J = J[keep]
+                dr = _minimum_image(x[I,:] - x[J,:], boxvec)
+                inside = (dr**2).sum(1) <= rlist**2
+                pairs.append(np.column_stack((I[inside], J[inside])))
+    return np.array(np.vstack(pairs), np.int64)
+
+
+class PeriodicPairList(object):
+    """
+    a Verlet list with skin for an orthorhombic periodic box
+
+    The list is rebuilt with cell lists when an atom has moved further than
+    rskin / 2 since the last build.
+
+    Parameters
+    ----------
+    rcut : float
+        the cutoff distance of the potential
+    boxvec : float or array of length 3
+        the box lengths
+    rskin : float
+        the skin distance.  Atoms closer than rcut + rskin are listed
+    """
+    def __init__(self, rcut, boxvec, rskin=0.5):
+        self.rcut = rcut
+        self.rskin = rskin
+        self.rlist = rcut + rskin
+        self.redo_displacement = 0.5 * rskin
+        self.boxvec = _as_boxvec(boxvec)
+        self.buildcount = 0
+        self.oldcoords = None
+        self.neib_list = np.zeros([0,2], np.int64)
+
+    def buildList(self, coords):
+        self.buildcount += 1
+        self.oldcoords = np.copy(np.reshape(coords, [-1,3]))
+        self.neib_list = build_pairs_box(coords, self.rlist, self.boxvec)
+
+    def needNewList(self, coords):
+        """check if any atom has moved far enough that the list must be rebuilt"""
+        if self.oldcoords is None:
+            return True
+        coords = np.reshape(coords, [-1,3])
+        if coords.shape != self.oldcoords.shape:
+            return True
+        dr = _minimum_image(coords - self.oldcoords, self.boxvec)
+        return np.max((dr**2).sum(1)) > self.redo_displacement**2
+
+    def getList(self, coords):
+        if self.needNewList(coords):
+            self.buildList(coords)
+        return self.neib_list
+
+
+class LJPeriodic(BasePotential):
+    """
+    lennard jones with the smooth cutoff of LJCut in an orthorhombic periodic box
+
+    The interacting pairs are taken from a persistent Verlet list, so
+    energies, gradients and Hessians all cost O(N).  The Hessian is computed
+    analytically and can be returned as a sparse matrix.
+
+    Parameters
+    ----------
+    boxvec : float or array of length 3
+        the box lengths.  A float gives a cubic box
+    eps, sig : float
+        the lj parameters
+    rcut : float
+        the cutoff distance.  It must be at most half the smallest box length
+    rskin : float
+        the skin of the Verlet list
+
+    Notes
+    -----
+    For cubic boxes the energy and gradient are computed by the LJCut list
+    routines, which are compiled if the fortran modules are available.
+    Other boxes use the numpy pair kernels.
+
+    See Also
+    --------
+    LJCut, PeriodicPairList
+    """
+    def __init__(self, boxvec, eps=1.0, sig=1.0, rcut=2.5, rskin=0.5):
+        self.boxvec = _as_boxvec(boxvec)
+        if rcut > 0.5 * np.min(self.boxvec):
+            raise ValueError("rcut must be at most half the smallest box length")
+        self.eps = eps
+        self.sig = sig
+        self.rcut = rcut
+        self.neighborList = PeriodicPairList(rcut, self.boxvec, rskin=rskin)
+        if np.all(self.boxvec == self.boxvec[0]):
+            self._ljcut = LJCut(eps=eps, sig=sig, rcut=rcut, boxl=self.boxvec[0])
+        else:
+            self._ljcut = None
+
+    def getEnergyList(self, coords, ilist):
+        if self._ljcut is not None:
+            return self._ljcut.getEnergyList(coords, ilist)
+        return pair_energy(coords, _ljcut_np._energy(self.eps, self.sig, self.rcut),
+                           self.boxvec, ilist=ilist)
+
+    def getEnergyGradientList(self, coords, ilist):
+        if self._ljcut is not None:
+            return self._ljcut.getEnergyGradientList(coords, ilist)
+        return pair_energy_gradient(coords, _ljcut_np._energy_gradient(self.eps, self.sig, self.rcut),
+                                    self.boxvec, ilist=ilist)
+
+    def getEnergyPerAtomList(self, coords, ilist):
+        """return the energy of each atom from the interactions in ilist"""
+        return pair_energy_per_atom(coords, _ljcut_np._energy(self.eps, self.sig, self.rcut),
+                                    self.boxvec, ilist=ilist)
+
+    def getHessianVectorProductList(self, coords, vec, ilist):
+        return pair_hessian_vector_product(coords, vec,
+                                           _ljcut_np._hessian(self.eps, self.sig, self.rcut),
+                                           self.boxvec, ilist=ilist)
+
+    def getSparseHessianList(self, coords, ilist):
+        """return the analytic Hessian of the interactions in ilist as a scipy.sparse matrix"""
+        ilist = np.reshape(ilist, [-1,2])
+        x = np.reshape(coords, [-1,3])
+        dr = _minimum_image(x[ilist[:,0],:] - x[ilist[:,1],:], self.boxvec)
+        g, h = _ljcut_np._hessian(self.eps, self.sig, self.rcut)((dr**2).sum(1), None, None)
+        return pair_hessian_sparse(len(x), ilist, dr, g, h)
+
+    def getEnergy(self, coords):
+        return self.getEnergyList(coords, self.neighborList.getList(coords))
+
+    def getEnergyGradient(self, coords):
+        return self.getEnergyGradientList(coords, self.neighborList.getList(coords))
+
+    def getEnergyPerAtom(self, coords):
+        """return the energy of each atom, each pair energy split equally between its atoms"""
+        return self.getEnergyPerAtomList(coords, self.neighborList.getList(coords))
+
+    def getHessianVectorProduct(self, coords, vec, eps=None):
+        """return the product of the Hessian with vec, computed analytically"""
+        return self.getHessianVectorProductList(coords, vec, self.neighborList.getList(coords))
+
+    def getSparseHessian(self, coords):
+        """return the analytic Hessian as a scipy.sparse matrix"""
+        return self.getSparseHessianList(coords, self.neighborList.getList(coords))
+
+    def getHessian(self, coords):
+        return self.getSparseHessian(coords).toarray()
+
+    def getEnergyGradientHessian(self, coords):
+        e, g = self.getEnergyGradient(coords)
+        return e, g, self.getHessian(coords)
+
+    def getEnergyChange(self, coords_old, coords_new, moved_atoms):
+        """return the change in energy when only the atoms in moved_atoms have moved
+
+        if the Verlet list is valid for both sets of coordinates only the
+        listed interactions of the moved atoms are computed
+        """
+        nl = self.neighborList
+        if nl.needNewList(coords_old) or nl.needNewList(coords_new):
+            return self.getEnergy(coords_new) - self.getEnergy(coords_old)
+        ilist = _select_moved_pairs(nl.getList(coords_new), len(coords_new) / 3, moved_atoms)
+        return (self.getEnergyList(coords_new, ilist)
+                - self.getEnergyList(coords_old, ilist))
+
+
+import unittest
+class TestLJPeriodic(unittest.TestCase):
+    """compare LJPeriodic with LJCut evaluated over all pairs"""
+    def setUp(self):
+        np.random.seed(0)
+        self.natoms = 64
+        self.boxvec = np.array([5.5, 6.5, 8.])
+        self.coords = self.lattice(self.boxvec)
+
+    def lattice(self, boxvec):
+        """a perturbed simple cubic lattice filling the box, so no two atoms overlap"""
+        n = 4
+        grid = np.array(np.meshgrid(range(n), range(n), range(n))).reshape(3,-1).T
+        x = (grid + np.random.uniform(-0.1, 0.1, grid.shape)) * boxvec / n
+        return x.reshape(-1)
+
+    def all_pairs(self):
+        i, j = np.triu_indices(self.natoms, 1)
+        return np.column_stack((j, i))
+
+    def reference(self, pot, coords):
+        ilist = self.all_pairs()
+        return pair_energy_gradient(coords, _ljcut_np._energy_gradient(pot.eps, pot.sig, pot.rcut),
+                                    pot.boxvec, ilist=ilist)
+
+    def test_build_pairs(self):
+        x = self.coords.reshape(-1,3)
+        for rlist in [1.3, 2.7, 3.2]:
+            ilist = self.all_pairs()
+            dr = _minimum_image(x[ilist[:,0]] - x[ilist[:,1]], self.boxvec)
+            slow = sorted(map(tuple, ilist[(dr**2).sum(1) <= rlist**2]))
+            fast = sorted(map(tuple, build_pairs_box(self.coords, rlist, self.boxvec)))
+            self.assertEqual(fast, slow)
+
+    def test_energy_gradient(self):
+        pot = LJPeriodic(self.boxvec, rcut=2.5)
+        coords = self.coords
+        for i in xrange(3):
+            e, g = pot.getEnergyGradient(coords)
+            eref, gref = self.reference(pot, coords)
+            self.assertAlmostEqual(e, eref, 8)
+            self.assertAlmostEqual(pot.getEnergy(coords), eref, 8)
+            self.assertLess(np.max(np.abs(g - gref)), 1e-8)
+            # small moves, which do not need a new list
+            coords = coords + np.random.uniform(-0.02, 0.02, coords.shape)
+        self.assertEqual(pot.neighborList.buildcount, 1)
+        coords[:3] += 0.3
+        e, g = pot.getEnergyGradient(coords)
+        self.assertEqual(pot.neighborList.buildcount, 2)
+        self.assertAlmostEqual(e, self.reference(pot, coords)[0], 8)
+
+    def test_cubic(self):
+        boxvec = np.ones(3) * 6.
+        pot = LJPeriodic(6., rcut=2.5)
+        self.assertTrue(pot._ljcut is not None)
+        coords = self.lattice(boxvec)
+        e, g = pot.getEnergyGradient(coords)
+        eref, gref = self.reference(pot, coords)
+        self.assertAlmostEqual(e, eref, 8)
+        self.assertLess(np.max(np.abs(g - gref)), 1e-8)
+
+    def test_hessian(self):
+        pot = LJPeriodic(self.boxvec, rcut=2.5)
+        hess = pot.getSparseHessian(self.coords)
+        nhess = pot.NumericalHessian(self.coords, eps=1e-6)
+        self.assertLess(np.max(np.abs(hess.toarray() - nhess)), 1e-4 * np.max(np.abs(nhess)))
+        vec = np.random.uniform(-1, 1, self.coords.size)
+        hv = pot.getHessianVectorProduct(self.coords, vec)
+        self.assertLess(np.max(np.abs(hess.dot(vec) - hv)), 1e-8 * np.max(np.abs(hv)))
+
+    def test_rcut_too_large(self):
+        self.assertRaises(ValueError, LJPeriodic, self.boxvec, rcut=3.)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,19 +1,41 @@
 import numpy as np
 
-import fortran.ljcut as _ljcut
+try:
+    import fortran.ljcut as _ljcut
+except ImportError:
+    import numpy_kernels.ljcut as _ljcut
 from pygmin.potentials import BasePotentialAtomistic
+from pygmin.potentials.potential import _moved_atom_pairs
+from pygmin.potentials import _threaded
+from pygmin.potentials.pair_hessian import pair_hessian_sparse
+from pygmin.potentials.numpy_kernels import ljcut as _ljcut_np
+from pygmin.potentials.numpy_kernels._pairs import pair_energy_per_atom
 
 __all__ = ["LJCut"]
 
 class LJCut(BasePotentialAtomistic):
     """
     lennard jones potential with a cutoff that is continuous and smooth
+    
+    Parameters
+    ----------
+    eps, sig : float
+        the lj parameters
+    rcut : float
+        the cutoff distance
+    boxl : float, optional
+        if given, use periodic boundary conditions in a cubic box
+    nthreads : int
+        if greater than 1, the energy and gradient, including those from
+        interaction lists, are computed by this many threads.  It is ignored if
+        the compiled fortran module is not available
     """
-    def __init__(self, eps=1.0, sig=1.0, rcut = 2.5, boxl=None):
+    def __init__(self, eps=1.0, sig=1.0, rcut = 2.5, boxl=None, nthreads=1):
         self.sig = sig
         self.eps = eps
         self.rcut = rcut
         self.boxl = boxl
+        self.nthreads = nthreads
         if self.boxl is None:
             self.periodic = False
             self.boxl = 100000.
@@ -28,7 +50,34 @@ class LJCut(BasePotentialAtomistic):
             else:
                 print ""
         
+    def _box(self):
+        """the box length for the numpy pair kernels"""
+        if self.periodic:
+            return self.boxl
+        return None
+
+    def _threaded(self):
+        return self.nthreads > 1 and hasattr(_ljcut, "ljenergy_gradient_rows")
+
+    def _run_rows(self, func, coords):
+        """call func for a range of rows of the pair loop in each thread and sum the results"""
+        natoms = len(coords) / 3
+        argslist = [(coords, self.eps, self.sig, self.periodic, self.boxl, self.rcut, 
+                     j1, j2, [natoms])
+                    for j1, j2 in _threaded.row_ranges(natoms, self.nthreads)]
+        return _threaded.sum_results(_threaded.run_threaded(func, argslist, self.nthreads))
+
+    def _run_list(self, func, coords, ilist):
+        """call func for a chunk of ilist in each thread and sum the results"""
+        natoms = len(coords) / 3
+        argslist = [(coords, self.eps, self.sig, chunk.reshape(-1), self.periodic, self.boxl,
+                     self.rcut, [natoms, len(chunk)])
+                    for chunk in _threaded.list_chunks(ilist, self.nthreads)]
+        return _threaded.sum_results(_threaded.run_threaded(func, argslist, self.nthreads))
+
     def getEnergy(self, coords):
+        if self._threaded():
+            return self._run_rows(_ljcut.ljenergy_rows, coords)
         natoms = len(coords) / 3
         E = _ljcut.ljenergy(
                 coords, self.eps, self.sig, self.periodic, self.boxl,
@@ -36,15 +85,33 @@ class LJCut(BasePotentialAtomistic):
         return E
 
     def getEnergyGradient(self, coords):
+        if self._threaded():
+            return self._run_rows(_ljcut.ljenergy_gradient_rows, coords)
         natoms = len(coords) / 3
         E, grad = _ljcut.ljenergy_gradient(
                 coords, self.eps, self.sig, self.periodic, self.boxl,
                 self.rcut, [natoms])
-        return E, grad 
-    
+        return E, grad
+
+    def getEnergyGradientMany(self, coords_stack):
+        """return the energies and gradients of a stack of configurations
+
+        All configurations are evaluated in a single call to the fortran code
+        """
+        coords_stack = np.asarray(coords_stack)
+        nconf = coords_stack.shape[0]
+        natoms = coords_stack.shape[1] / 3
+        # the transpose is fortran ordered, so no copy is made
+        E, grad = _ljcut.ljenergy_gradient_many(
+                coords_stack.T, self.eps, self.sig, self.periodic, self.boxl,
+                self.rcut, [natoms, nconf])
+        return E, grad.T
+
     def getEnergyList(self, coords, ilist):
         #ilist = ilist_i.getNPilist()
         #ilist += 1 #fortran indexing
+        if self._threaded():
+            return self._run_list(_ljcut.energy_ilist, coords, ilist)
         nlist = len(ilist)
         natoms = len(coords) / 3
         E = _ljcut.energy_ilist(
@@ -53,9 +120,30 @@ class LJCut(BasePotentialAtomistic):
         #ilist -= 1
         return E
     
+    def getEnergyPerAtomList(self, coords, ilist):
+        """return the energy of each atom from the interactions in ilist"""
+        return pair_energy_per_atom(coords, _ljcut_np._energy(self.eps, self.sig, self.rcut), 
+                                    self._box(), ilist=ilist)
+
+    def getEnergyPerAtom(self, coords):
+        """return the energy of each atom, each pair energy split equally between its atoms"""
+        return pair_energy_per_atom(coords, _ljcut_np._energy(self.eps, self.sig, self.rcut), 
+                                    self._box())
+
+    def getEnergyChange(self, coords_old, coords_new, moved_atoms):
+        """return the change in energy when only the atoms in moved_atoms have moved
+        
+        only the interactions of the moved atoms are computed
+        """
+        ilist = _moved_atom_pairs(len(coords_new) / 3, moved_atoms)
+        return (self.getEnergyList(coords_new, ilist) 
+                - self.getEnergyList(coords_old, ilist))
+
     def getEnergyGradientList(self, coords, ilist):
         #ilist = ilist_i.getNPilist()
         #ilist += 1 #fortran indexing
+        if self._threaded():
+            return self._run_list(_ljcut.energy_gradient_ilist, coords, ilist)
         nlist = len(ilist)
         natoms = len(coords) / 3
         E, grad = _ljcut.energy_gradient_ilist(
@@ -64,6 +152,70 @@ class LJCut(BasePotentialAtomistic):
         #ilist -= 1
         return E, grad 
 
+    def getHessianVectorProduct(self, coords, vec, eps=None):
+        """return the product of the Hessian with vec, computed analytically"""
+        natoms = len(coords) / 3
+        hv = _ljcut.hessian_vector_product(
+                coords, vec, self.eps, self.sig, self.periodic, self.boxl,
+                self.rcut, [natoms])
+        return hv
+
+    def getHessianVectorProductList(self, coords, vec, ilist):
+        """return the product of the Hessian with vec for the interactions in ilist"""
+        nlist = len(ilist)
+        natoms = len(coords) / 3
+        hv = _ljcut.hessian_vector_product_ilist(
+                coords, vec, self.eps, self.sig, ilist.reshape(-1), self.periodic, 
+                self.boxl, self.rcut, [natoms, nlist])
+        return hv
+
+    def getSparseHessianList(self, coords, ilist):
+        """return the analytic Hessian of the interactions in ilist as a scipy.sparse matrix"""
+        ilist = np.reshape(ilist, [-1,2])
+        x = np.reshape(coords, [-1,3])
+        dr = x[ilist[:,0],:] - x[ilist[:,1],:]
+        if self.periodic:
+            dr -= self.boxl * np.round(dr / self.boxl)
+        r2 = (dr**2).sum(1)
+        inside = r2 <= self.rcut**2
+        ilist = ilist[inside,:]
+        dr = dr[inside,:]
+        ir2 = 1. / r2[inside]
+        ir6 = ir2**3
+        ir12 = ir6**2
+        sig6 = self.sig**6
+        sig12 = sig6**2
+        rcut6 = self.rcut**6
+        B1 = (-3.*(sig6/rcut6) + 6.*(sig12/rcut6**2)) / self.rcut**2
+        # g = V'(r)/r,  h = (V''(r) - V'(r)/r) / r**2
+        g = -4. * self.eps * ((12. * sig12 * ir12 - 6. * sig6 * ir6) * ir2 - 2.*B1)
+        h = 4. * self.eps * (168. * sig12 * ir12 - 48. * sig6 * ir6) * ir2**2
+        return pair_hessian_sparse(len(x), ilist, dr, g, h)
+
+    def getSparseHessian(self, coords):
+        """return the analytic Hessian as a scipy.sparse matrix
+        
+        the interacting pairs are found using cell lists, so the cost is
+        linear in the number of atoms
+        """
+        from pygmin.utils.neighbor_list import _build_list_cells
+        natoms = len(coords) / 3
+        if self.periodic:
+            boxl = self.boxl
+        else:
+            boxl = None
+        ilist = _build_list_cells(coords, self.rcut**2, np.arange(natoms, dtype=np.int64),
+                                  boxl=boxl)
+        return self.getSparseHessianList(coords, ilist)
+
+    def getEnergyGradientHessian(self, coords):
+        e, g = self.getEnergyGradient(coords)
+        hess = self.getSparseHessian(coords).toarray()
+        return e, g, hess
+
+    def getHessian(self, coords):
+        return self.getSparseHessian(coords).toarray()
+
 
 import unittest
 class LJCutTest(unittest.TestCase):
@@ -94,6 +246,41 @@ class LJCutTest(unittest.TestCase):
         self.assertAlmostEqual(self.E, e, 7)
         gdiffmax = np.max(np.abs( g-self.grad )) / np.max(np.abs(self.grad))
         self.assertLess(gdiffmax, 1e-7)
+    def test_many(self):
+        coords_stack = np.array([self.coords, self.coords * 1.1, self.coords * 0.9])
+        energies, grads = self.pot.getEnergyGradientMany(coords_stack)
+        self.assertEqual(grads.shape, coords_stack.shape)
+        for x, e, g in zip(coords_stack, energies, grads):
+            e1, g1 = self.pot.getEnergyGradient(x)
+            self.assertAlmostEqual(e1, e, 7)
+            self.assertLess(np.max(np.abs(g1 - g)), 1e-7 * np.max(np.abs(g1)))
+    def test_hessian_vector_product(self):
+        vec = np.random.uniform(-1,1,self.coords.size)
+        hv = self.pot.getHessianVectorProduct(self.coords, vec)
+        hvlist = self.pot.getHessianVectorProductList(self.coords, vec, self.ilist)
+        self.assertLess(np.max(np.abs(hv - hvlist)), 1e-7 * np.max(np.abs(hv)))
+        # compare with a finite difference of the gradient
+        eps = 1e-6
+        gplus = self.pot.getEnergyGradient(self.coords + eps * vec)[1]
+        gminus = self.pot.getEnergyGradient(self.coords - eps * vec)[1]
+        hvnum = (gplus - gminus) / (2. * eps)
+        self.assertLess(np.max(np.abs(hv - hvnum)), 1e-5 * np.max(np.abs(hv)))
+    def test_sparse_hessian(self):
+        hess = self.pot.getSparseHessian(self.coords)
+        hesslist = self.pot.getSparseHessianList(self.coords, self.ilist)
+        self.assertLess(np.max(np.abs((hess - hesslist).toarray())), 1e-7 * np.max(np.abs(hess.toarray())))
+        vec = np.random.uniform(-1,1,self.coords.size)
+        hv = self.pot.getHessianVectorProduct(self.coords, vec)
+        self.assertLess(np.max(np.abs(hess.dot(vec) - hv)), 1e-7 * np.max(np.abs(hv)))
+    def test_threaded(self):
+        pot = LJCut(nthreads=3)
+        e, g = pot.getEnergyGradient(self.coords)
+        self.assertAlmostEqual(e / self.E, 1., 10)
+        self.assertAlmostEqual(pot.getEnergy(self.coords) / self.E, 1., 10)
+        self.assertLess(np.max(np.abs(g - self.grad)), 1e-10 * np.max(np.abs(self.grad)))
+        e, g = pot.getEnergyGradientList(self.coords, self.ilist)
+        self.assertAlmostEqual(e / self.E, 1., 10)
+        self.assertLess(np.max(np.abs(g - self.grad)), 1e-10 * np.max(np.abs(self.grad)))
 
 if __name__ == "__main__":
     unittest.main()
@@ -1,8 +1,13 @@
 from math import *
 import numpy as np #to access np.exp() not built int exp
-import fortran.ljpshiftfort as ljpshiftfort
+try:
+    import fortran.ljpshiftfort as ljpshiftfort
+except ImportError:
+    import numpy_kernels.ljpshiftfort as ljpshiftfort
 
 from pygmin.potentials import BasePotential
+from pygmin.potentials.potential import _moved_atom_pairs
+from pygmin.potentials.numpy_kernels._pairs import pair_energy_per_atom
 
 __all__ = ["LJpshift"]
 
@@ -69,6 +74,59 @@ class LJpshift(BasePotential):
                 [self.natoms])
         return E, V
 
+    def getEnergyList(self, coords, ilist):
+        """return the energy of the interactions in ilist
+        
+        This is done in numpy, so it is only efficient if ilist is not too long
+        """
+        ilist = np.reshape(ilist, [-1,2])
+        x = np.reshape(coords, [-1,3])
+        dr = x[ilist[:,0],:] - x[ilist[:,1],:]
+        if self.periodic:
+            dr -= self.boxl * np.round(dr / self.boxl)
+        r2 = (dr**2).sum(1)
+        # the number of type B atoms in each pair determines the interaction type
+        nB = (ilist[:,0] >= self.ntypeA).astype(int) + (ilist[:,1] >= self.ntypeA)
+        E = 0.
+        for T, n in [(self.AA, 0), (self.AB, 1), (self.BB, 2)]:
+            r2T = r2[(nB == n) & (r2 < T.rcut**2)]
+            ir6 = 1. / r2T**3
+            E += (4. * T.eps * (T.sig6 * ir6 * (T.sig6 * ir6 - 1.0) + T.rconst * r2T + T.const)).sum()
+        return E
+
+    def _pair_energies(self, r2, I, J):
+        """return the energies of the pairs I, J with squared separations r2"""
+        nB = (I >= self.ntypeA).astype(int) + (J >= self.ntypeA)
+        E = np.zeros(len(r2))
+        for T, n in [(self.AA, 0), (self.AB, 1), (self.BB, 2)]:
+            inside = (nB == n) & (r2 < T.rcut**2)
+            ir6 = 1. / r2[inside]**3
+            E[inside] = 4. * T.eps * (T.sig6 * ir6 * (T.sig6 * ir6 - 1.0) 
+                                      + T.rconst * r2[inside] + T.const)
+        return E
+
+    def _box(self):
+        if self.periodic:
+            return self.boxl
+        return None
+
+    def getEnergyPerAtomList(self, coords, ilist):
+        """return the energy of each atom from the interactions in ilist"""
+        return pair_energy_per_atom(coords, self._pair_energies, self._box(), ilist=ilist)
+
+    def getEnergyPerAtom(self, coords):
+        """return the energy of each atom, each pair energy split equally between its atoms"""
+        return pair_energy_per_atom(coords, self._pair_energies, self._box())
+
+    def getEnergyChange(self, coords_old, coords_new, moved_atoms):
+        """return the change in energy when only the atoms in moved_atoms have moved
+        
+        only the interactions of the moved atoms are computed
+        """
+        ilist = _moved_atom_pairs(self.natoms, moved_atoms)
+        return (self.getEnergyList(coords_new, ilist) 
+                - self.getEnergyList(coords_old, ilist))
+
 
 if __name__ == "__main__":
     import pygmin.potentials.ljpshift as ljpshift
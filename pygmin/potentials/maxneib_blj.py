@@ -4,8 +4,13 @@ lj potential with the number of near neighbors restricted.
 import numpy as np
 
 from pygmin.potentials import BasePotential
+from pygmin.potentials import _threaded
+from pygmin.potentials.numpy_kernels.maxneib_lj import fermi
 from pygmin.systems import BLJCluster
-import fortran.maxneib_blj as fortranpot
+try:
+    import fortran.maxneib_blj as fortranpot
+except ImportError:
+    import numpy_kernels.maxneib_blj as fortranpot
 from pygmin.mindist.periodic_exact_match import ExactMatchPeriodic, MeasurePeriodic
 
 __all__ = ["MaxNeibsBLJ", "MaxNeibsBLJSystem"]
@@ -64,6 +69,9 @@ class MaxNeibsBLJ(BasePotential):
         energy scale of the neighbor penalty function
     only_AB_neibs : bool
         if true, like particles are not considered neighbors in the energy penalty
+    nthreads : int
+        if greater than 1, the energy and gradient are computed by this many
+        threads.  It is ignored if the compiled fortran module is not available
     
     See Also
     --------
@@ -81,6 +89,7 @@ class MaxNeibsBLJ(BasePotential):
                  rneib_crossover=0.08,
                  epsneibs=5.,
                  only_AB_neibs=False,
+                 nthreads=1,
                  ):
         self.natoms = natoms
         self.ntypeA = ntypeA
@@ -110,6 +119,7 @@ class MaxNeibsBLJ(BasePotential):
         self.neib_crossover = neib_crossover
         self.epsneibs = epsneibs
         self.only_AB_neibs = only_AB_neibs
+        self.nthreads = nthreads
     
 #    def __str__(self):
 #        myname = "maxneib_blj_N%d_ntypeA%d_epsA%.2f, sigA=1.0, 
@@ -122,7 +132,42 @@ class MaxNeibsBLJ(BasePotential):
 #                 epsneibs=5.,
 #                 only_AB_neibs=False,
 
+    def _threaded(self):
+        return self.nthreads > 1 and hasattr(fortranpot, "maxneib_lj_rows")
+
+    def _getEnergyGradientThreaded(self, coords, gradt):
+        """compute the energy and gradient in two passes, each split between threads
+        
+        The neighbor penalty of a pair depends on the total number of neighbors
+        of both atoms, so the neighbor counts from all rows of the first pass
+        are summed before the second pass.
+        """
+        natoms = len(coords) / 3
+        ranges = _threaded.row_ranges(natoms, self.nthreads)
+        argslist = [(coords, self.ntypeA, 
+                     self.epsA, self.sigA, self.epsB, self.sigB, self.epsAB, self.sigAB,
+                     self.periodic, self.boxl, self.rneib, self.rneib_crossover, 
+                     self.only_AB_neibs, gradt, j1, j2)
+                    for j1, j2 in ranges]
+        E, grad, nneibs = _threaded.sum_results(
+                _threaded.run_threaded(fortranpot.maxneib_lj_rows, argslist, self.nthreads))
+        E += self.epsneibs * np.sum(fermi(nneibs, self.max_neibs, self.neib_crossover))
+        if not gradt:
+            return E, None
+        
+        argslist = [(coords, nneibs, self.ntypeA, self.sigA, self.sigB, self.sigAB,
+                     self.periodic, self.boxl, self.rneib, self.rneib_crossover, 
+                     self.max_neibs, self.neib_crossover, self.epsneibs, 
+                     self.only_AB_neibs, j1, j2)
+                    for j1, j2 in ranges]
+        grad += _threaded.sum_results(
+                _threaded.run_threaded(fortranpot.maxneib_neib_gradient_rows, argslist, 
+                                       self.nthreads))
+        return E, grad
+
     def getEnergy(self, coords):
+        if self._threaded():
+            return self._getEnergyGradientThreaded(coords, False)[0]
         E = fortranpot.maxneib_ljenergy(
                 coords, self.ntypeA,
                 self.epsA, self.sigA, 
@@ -135,6 +180,8 @@ class MaxNeibsBLJ(BasePotential):
     def getEnergyGradient(self, coords):
         if self.periodic:
             coords -= np.round(coords / self.boxl) * self.boxl
+        if self._threaded():
+            return self._getEnergyGradientThreaded(coords, True)
         E, grad = fortranpot.maxneib_ljenergy_gradient(
                 coords, self.ntypeA,
                 self.epsA, self.sigA, 
@@ -169,6 +216,38 @@ class MaxNeibsBLJSystem(BLJCluster):
             return BLJCluster.get_compare_exact(self, **kwargs)
 
 
+import unittest
+class TestMaxNeibsBLJThreaded(unittest.TestCase):
+    def setUp(self):
+        np.random.seed(0)
+        self.natoms = 40
+        self.ntypeA = 20
+        self.kwargs = dict(max_neibs=4.8, neib_crossover=.3, rneib=1.7, epsneibs=6.)
+
+    def compare(self, boxl, only_AB_neibs):
+        pot = MaxNeibsBLJ(self.natoms, self.ntypeA, boxl=boxl, only_AB_neibs=only_AB_neibs,
+                          **self.kwargs)
+        potthreaded = MaxNeibsBLJ(self.natoms, self.ntypeA, boxl=boxl, nthreads=3,
+                                  only_AB_neibs=only_AB_neibs, **self.kwargs)
+        if not potthreaded._threaded():
+            self.skipTest("the compiled fortran module maxneib_blj is not available")
+        coords = np.random.uniform(-1, 1, 3 * self.natoms) * 1.5
+        e, g = pot.getEnergyGradient(coords.copy())
+        et, gt = potthreaded.getEnergyGradient(coords.copy())
+        self.assertAlmostEqual(et / e, 1., 10)
+        self.assertAlmostEqual(potthreaded.getEnergy(coords.copy()) / e, 1., 10)
+        self.assertLess(np.max(np.abs(gt - g)), 1e-10 * np.max(np.abs(g)))
+
+    def test_threaded(self):
+        self.compare(None, False)
+
+    def test_threaded_periodic(self):
+        self.compare(4., False)
+
+    def test_threaded_only_AB(self):
+        self.compare(None, True)
+
+
 def run_gui(system):
     import pygmin.gui.run as gr
     gr.run_gui(system)
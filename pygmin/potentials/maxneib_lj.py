@@ -5,7 +5,10 @@ import numpy as np
 
 from pygmin.potentials import BasePotential
 from pygmin.systems import LJCluster
-import fortran.maxneib_lj as fortranpot
+try:
+    import fortran.maxneib_lj as fortranpot
+except ImportError:
+    import numpy_kernels.maxneib_lj as fortranpot
 
 __all__ = ["MaxNeibsLJ", "MaxNeibsLJSystem"]
 
@@ -0,0 +1,66 @@
+"""
+numpy version of the fortran module pygmin.potentials.fortran.AT
+
+The trailing argument dims of each function stands for the optional array
+dimensions of the f2py interface, e.g. [natoms].  It is ignored.
+"""
+import numpy as np
+
+__all__ = ["axt"]
+
+def _triangles(x, i, J, K, zstar, gradt, grad):
+    """the Axilrod-Teller energy of the triangles (i, J, K) with J, K arrays
+
+    With u = xi - xj, v = xj - xk, w = xk - xi and P = |u||v||w| the energy of
+    a triangle is
+
+        E = Z * ( P**-3 - 3 * (u.v) (v.w) (w.u) * P**-5 )
+
+    The gradient is accumulated into grad.
+    """
+    u = x[i,:] - x[J,:]
+    v = x[J,:] - x[K,:]
+    w = x[K,:] - x[i,:]
+    a2 = (u**2).sum(1)
+    b2 = (v**2).sum(1)
+    c2 = (w**2).sum(1)
+    uv = (u * v).sum(1)
+    vw = (v * w).sum(1)
+    wu = (w * u).sum(1)
+    D = uv * vw * wu
+    P2 = a2 * b2 * c2
+    iP3 = P2**-1.5
+    iP5 = iP3 / P2
+    e = zstar * (iP3 - 3. * D * iP5).sum()
+    if not gradt:
+        return e
+
+    # d/du of P**-n is -n P**-n u / |u|**2
+    s = (-3. * iP3 + 15. * D * iP5)
+    t = -3. * iP5
+    col = np.newaxis
+    dEdu = zstar * ((s / a2)[:,col] * u + t[:,col] * (v * (vw * wu)[:,col] + w * (uv * vw)[:,col]))
+    dEdv = zstar * ((s / b2)[:,col] * v + t[:,col] * (u * (vw * wu)[:,col] + w * (uv * wu)[:,col]))
+    dEdw = zstar * ((s / c2)[:,col] * w + t[:,col] * (v * (uv * wu)[:,col] + u * (uv * vw)[:,col]))
+
+    grad[i,:] += (dEdu - dEdw).sum(0)
+    natoms = x.shape[0]
+    for k in xrange(3):
+        grad[:,k] += np.bincount(J, dEdv[:,k] - dEdu[:,k], natoms)
+        grad[:,k] += np.bincount(K, dEdw[:,k] - dEdv[:,k], natoms)
+    return e
+
+def axt(coords, gradt, zstar, dims=None):
+    """return the gradient and energy of the Axilrod-Teller triple dipole term
+
+    The loop over i is done in python, the loop over the pairs j, k with
+    i < j < k is vectorized.
+    """
+    x = np.reshape(coords, [-1,3])
+    natoms = len(x)
+    grad = np.zeros(x.shape)
+    e = 0.
+    for i in xrange(natoms - 2):
+        J, K = np.triu_indices(natoms - i - 1, 1)
+        e += _triangles(x, i, J + i + 1, K + i + 1, zstar, gradt, grad)
+    return grad.reshape(-1), e
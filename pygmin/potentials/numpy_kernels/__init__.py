@@ -0,0 +1,33 @@
+"""
+.. currentmodule:: pygmin.potentials.numpy_kernels
+
+pure numpy versions of the fortran potentials
+=============================================
+
+The modules in this package have the same names and the same call signatures
+as the compiled f2py modules in pygmin.potentials.fortran.  They are imported
+automatically by the potentials when the compiled modules are not available,
+e.g. if pygmin was installed without a fortran compiler::
+
+    try:
+        import fortran.lj as ljf
+    except ImportError:
+        import numpy_kernels.lj as ljf
+
+The pair interactions are vectorized over blocks of atom pairs, so the memory
+needed is bounded independent of the number of atoms.  They are several times
+slower than the fortran, but much faster than pure python loops.
+
+.. autosummary::
+    :toctree: generated/
+
+    lj
+    lj_hess
+    ljcut
+    ljpshiftfort
+    soft_sphere_pot
+    maxneib_lj
+    maxneib_blj
+    AT
+    rmdrvt
+"""
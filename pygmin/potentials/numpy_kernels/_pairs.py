@@ -0,0 +1,159 @@
+"""
+vectorized loops over atom pairs
+
+All pairs (i, j) with i > j are processed in blocks of at most maxpairs pairs.
+For each block the separation vectors dr = x[i] - x[j] are computed at once
+and passed to a function of the squared distance which returns the pair
+energies and derivatives.  The gradients are accumulated with np.bincount.
+"""
+import numpy as np
+
+# the maximum number of pairs in a block.  The arrays for a block take about
+# 100 bytes per pair, so this bounds the memory to a few tens of Mb
+maxpairs = 1 << 18
+
+def pair_blocks(natoms, ilist=None):
+    """iterate over blocks of atom pairs
+
+    Parameters
+    ----------
+    natoms : int
+    ilist : array, optional
+        if given, iterate over the pairs in ilist, shape (npairs, 2) or
+        flattened.  Otherwise iterate over all pairs i > j.
+
+    Yields
+    ------
+    I, J : arrays
+        the atom indices of the pairs in the block
+    """
+    if ilist is not None:
+        ilist = np.reshape(ilist, [-1,2])
+        for start in xrange(0, len(ilist), maxpairs):
+            yield ilist[start:start+maxpairs,0], ilist[start:start+maxpairs,1]
+        return
+    # row i contains the pairs (i, j) for j < i.  npairs_before[i] is the
+    # number of pairs in the rows before row i
+    rows = np.arange(natoms + 1)
+    npairs_before = rows * (rows - 1) / 2
+    i1 = 1
+    while i1 < natoms:
+        i2 = np.searchsorted(npairs_before, npairs_before[i1] + maxpairs, side="right") - 1
+        i2 = min(max(i2, i1 + 1), natoms)
+        counts = np.arange(i1, i2)
+        I = np.repeat(counts, counts)
+        offsets = np.repeat(np.cumsum(counts) - counts, counts)
+        J = np.arange(len(I)) - offsets
+        yield I, J
+        i1 = i2
+
+def separations(x, I, J, boxl=None):
+    """return the separation vectors x[I] - x[J], using the minimum image convention if boxl is given"""
+    dr = x[I,:] - x[J,:]
+    if boxl is not None:
+        dr -= boxl * np.round(dr / boxl)
+    return dr
+
+def scatter_pairs(out, I, J, t):
+    """out[I] += t and out[J] -= t, correctly summing over repeated indices"""
+    natoms = out.shape[0]
+    for k in xrange(out.shape[1]):
+        out[:,k] += np.bincount(I, t[:,k], natoms)
+        out[:,k] -= np.bincount(J, t[:,k], natoms)
+
+def pair_energy(coords, func, boxl=None, ilist=None, dim=3):
+    """return the energy of a pair potential
+
+    Parameters
+    ----------
+    coords : array
+    func : callable
+        func(r2, I, J) returns the energies of the pairs with squared
+        separations r2 and indices I, J
+    boxl : float, optional
+        if given, use periodic boundary conditions in a cubic box
+    ilist : array, optional
+        if given, only the pairs in ilist are computed
+    dim : int
+        the dimension of space
+    """
+    x = np.reshape(coords, [-1,dim])
+    e = 0.
+    for I, J in pair_blocks(len(x), ilist):
+        dr = separations(x, I, J, boxl)
+        e += func((dr**2).sum(1), I, J).sum()
+    return e
+
+def pair_energy_per_atom(coords, func, boxl=None, ilist=None, dim=3):
+    """return the energy of each atom of a pair potential
+
+    Each pair energy is split equally between the two atoms, so the energies
+    sum to the total energy.  The parameters are the same as for pair_energy.
+    """
+    x = np.reshape(coords, [-1,dim])
+    energies = np.zeros(len(x))
+    for I, J in pair_blocks(len(x), ilist):
+        dr = separations(x, I, J, boxl)
+        v = 0.5 * func((dr**2).sum(1), I, J)
+        energies += np.bincount(I, v, len(x))
+        energies += np.bincount(J, v, len(x))
+    return energies
+
+def pair_energy_gradient(coords, func, boxl=None, ilist=None, dim=3):
+    """return the energy and gradient of a pair potential
+
+    func(r2, I, J) must return the pair energies and V'(r)/r.  The other
+    parameters are the same as for pair_energy.
+    """
+    x = np.reshape(coords, [-1,dim])
+    grad = np.zeros(x.shape)
+    e = 0.
+    for I, J in pair_blocks(len(x), ilist):
+        dr = separations(x, I, J, boxl)
+        v, g = func((dr**2).sum(1), I, J)
+        e += v.sum()
+        scatter_pairs(grad, I, J, g[:,np.newaxis] * dr)
+    return e, grad.reshape(-1)
+
+def pair_hessian_vector_product(coords, vec, func, boxl=None, ilist=None, dim=3):
+    """return the product of the Hessian of a pair potential with vec
+
+    func(r2, I, J) must return g = V'(r)/r and h = (V''(r) - V'(r)/r) / r**2.
+    The other parameters are the same as for pair_energy.
+    """
+    x = np.reshape(coords, [-1,dim])
+    v = np.reshape(vec, [-1,dim])
+    hv = np.zeros(x.shape)
+    for I, J in pair_blocks(len(x), ilist):
+        dr = separations(x, I, J, boxl)
+        g, h = func((dr**2).sum(1), I, J)
+        dv = v[I,:] - v[J,:]
+        t = (h * (dr * dv).sum(1))[:,np.newaxis] * dr + g[:,np.newaxis] * dv
+        scatter_pairs(hv, I, J, t)
+    return hv.reshape(-1)
+
+def pair_hessian(coords, func, boxl=None, ilist=None, dim=3):
+    """return the Hessian of a pair potential as a dense matrix
+
+    func has the same form as for pair_hessian_vector_product.
+    """
+    from pygmin.potentials.pair_hessian import pair_hessian_sparse
+    x = np.reshape(coords, [-1,dim])
+    hess = np.zeros([x.size, x.size])
+    for I, J in pair_blocks(len(x), ilist):
+        dr = separations(x, I, J, boxl)
+        g, h = func((dr**2).sum(1), I, J)
+        hess += pair_hessian_sparse(len(x), np.column_stack((I, J)), dr, g, h).toarray()
+    return hess
+
+def many(func, coords, *args):
+    """apply func to each column of coords, as is done by the fortran _many routines
+
+    func(coords, *args) must return (energy, grad)
+    """
+    nconf = coords.shape[1]
+    e = np.zeros(nconf)
+    grad = np.zeros(coords.shape, order="F")
+    for k in xrange(nconf):
+        e[k], grad[:,k] = func(coords[:,k], *args)
+    return e, grad
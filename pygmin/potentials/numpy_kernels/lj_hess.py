@@ -0,0 +1,27 @@
+"""
+numpy version of the fortran module pygmin.potentials.fortran.lj_hess
+
+The trailing argument dims stands for the optional array dimensions of the
+f2py interface.  It is ignored.
+"""
+import numpy as np
+
+from _pairs import pair_energy_gradient, pair_hessian
+from lj import _energy_gradient, _hessian, ljenergy
+
+__all__ = ["ljdiff"]
+
+def ljdiff(coords, gtest, stest, dims=None):
+    """return the gradient, energy and Hessian of the LJ potential with eps = sig = 1
+
+    the gradient is only computed if gtest is True, and the Hessian only if
+    both gtest and stest are True, otherwise they are returned as zeros.
+    """
+    ndof = len(coords)
+    hess = np.zeros([ndof, ndof])
+    if not gtest:
+        return np.zeros(ndof), ljenergy(coords, 1., 1., False, 0.), hess
+    energy, grad = pair_energy_gradient(coords, _energy_gradient(1., 1.))
+    if stest:
+        hess = pair_hessian(coords, _hessian(1., 1.))
+    return grad, energy, hess
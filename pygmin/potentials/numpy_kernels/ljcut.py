@@ -0,0 +1,88 @@
+"""
+numpy version of the fortran module pygmin.potentials.fortran.ljcut
+
+The trailing argument dims of each function stands for the optional array
+dimensions of the f2py interface, e.g. [natoms].  It is ignored.
+"""
+import numpy as np
+
+from _pairs import (pair_energy, pair_energy_gradient, pair_hessian_vector_product,
+                    many)
+from lj import _box
+
+__all__ = ["ljenergy", "ljenergy_gradient", "energy_ilist", "energy_gradient_ilist",
+           "ljenergy_gradient_many", "hessian_vector_product",
+           "hessian_vector_product_ilist"]
+
+def _constants(sig, rcut):
+    sig6 = sig**6
+    rcut6 = rcut**6
+    A1 = 4. * (sig6 / rcut6) - 7. * (sig6 / rcut6)**2
+    B1 = (-3. * (sig6 / rcut6) + 6. * (sig6 / rcut6)**2) / rcut**2
+    return A1, B1
+
+def _energy(eps, sig, rcut):
+    sig6 = sig**6
+    sig12 = sig6**2
+    A1, B1 = _constants(sig, rcut)
+    def func(r2, I, J):
+        # the same operations as in _energy_gradient, so that both give
+        # exactly the same energy
+        ir2 = 1. / r2
+        ir6 = ir2**3
+        ir12 = ir6**2
+        e = 4. * eps * (sig12 * ir12 - sig6 * ir6 + A1 + B1 * r2)
+        return np.where(r2 <= rcut**2, e, 0.)
+    return func
+
+def _energy_gradient(eps, sig, rcut):
+    sig6 = sig**6
+    sig12 = sig6**2
+    A1, B1 = _constants(sig, rcut)
+    def func(r2, I, J):
+        inside = r2 <= rcut**2
+        ir2 = 1. / r2
+        ir6 = ir2**3
+        ir12 = ir6**2
+        e = 4. * eps * (sig12 * ir12 - sig6 * ir6 + A1 + B1 * r2)
+        g = -4. * eps * ((12. * sig12 * ir12 - 6. * sig6 * ir6) * ir2 - 2. * B1)
+        return np.where(inside, e, 0.), np.where(inside, g, 0.)
+    return func
+
+def _hessian(eps, sig, rcut):
+    sig6 = sig**6
+    sig12 = sig6**2
+    A1, B1 = _constants(sig, rcut)
+    def func(r2, I, J):
+        inside = r2 <= rcut**2
+        ir2 = 1. / r2
+        ir6 = ir2**3
+        ir12 = ir6**2
+        g = -4. * eps * ((12. * sig12 * ir12 - 6. * sig6 * ir6) * ir2 - 2. * B1)
+        h = 4. * eps * (168. * sig12 * ir12 - 48. * sig6 * ir6) * ir2**2
+        return np.where(inside, g, 0.), np.where(inside, h, 0.)
+    return func
+
+def ljenergy(coords, eps, sig, periodic, boxl, rcut, dims=None):
+    return pair_energy(coords, _energy(eps, sig, rcut), _box(periodic, boxl))
+
+def ljenergy_gradient(coords, eps, sig, periodic, boxl, rcut, dims=None):
+    return pair_energy_gradient(coords, _energy_gradient(eps, sig, rcut), _box(periodic, boxl))
+
+def energy_ilist(coords, eps, sig, ilist, periodic, boxl, rcut, dims=None):
+    return pair_energy(coords, _energy(eps, sig, rcut), _box(periodic, boxl), ilist=ilist)
+
+def energy_gradient_ilist(coords, eps, sig, ilist, periodic, boxl, rcut, dims=None):
+    return pair_energy_gradient(coords, _energy_gradient(eps, sig, rcut), _box(periodic, boxl),
+                                ilist=ilist)
+
+def ljenergy_gradient_many(coords, eps, sig, periodic, boxl, rcut, dims=None):
+    return many(ljenergy_gradient, coords, eps, sig, periodic, boxl, rcut)
+
+def hessian_vector_product(coords, v, eps, sig, periodic, boxl, rcut, dims=None):
+    return pair_hessian_vector_product(coords, v, _hessian(eps, sig, rcut), 
+                                       _box(periodic, boxl))
+
+def hessian_vector_product_ilist(coords, v, eps, sig, ilist, periodic, boxl, rcut, dims=None):
+    return pair_hessian_vector_product(coords, v, _hessian(eps, sig, rcut), 
+                                       _box(periodic, boxl), ilist=ilist)
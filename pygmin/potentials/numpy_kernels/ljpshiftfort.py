@@ -0,0 +1,57 @@
+"""
+numpy version of the fortran module pygmin.potentials.fortran.ljpshiftfort
+
+The trailing argument dims stands for the optional array dimensions of the
+f2py interface.  It is ignored.
+"""
+import numpy as np
+
+from _pairs import pair_energy, pair_energy_gradient
+
+__all__ = ["ljpshift"]
+
+def _parameters(cutoff, epsab, epsbb, sigab, sigbb):
+    """return arrays of the parameters indexed by the number of B atoms in the pair"""
+    eps = np.array([1., epsab, epsbb])
+    sig = np.array([1., sigab, sigbb])
+    rcut = cutoff * sig
+    sig6 = sig**6
+    sigrc6 = sig6 / rcut**6
+    sigrc12 = sigrc6**2
+    const = 4. * sigrc6 - 7. * sigrc12
+    rconst = (6. * sigrc12 - 3. * sigrc6) / rcut**2
+    return eps, sig6, rcut**2, const, rconst
+
+def ljpshift(coords, gtest, stest, boxlx, boxly, boxlz, cutoff, periodic, ntypea, 
+             epsab, epsbb, sigab, sigbb, dims=None):
+    """return the gradient and energy of the binary lj potential
+
+    As in the fortran version, if periodic the atoms are put back in the box,
+    modifying coords in place.  stest is ignored
+    """
+    eps, sig6, rcut2, const, rconst = _parameters(cutoff, epsab, epsbb, sigab, sigbb)
+    if periodic:
+        x = np.reshape(coords, [-1,3])
+        x -= np.array([boxlx, boxly, boxlz]) * np.round(x / np.array([boxlx, boxly, boxlz]))
+        boxl = boxlx
+    else:
+        boxl = None
+
+    def func(r2, I, J):
+        nB = (I >= ntypea).astype(int) + (J >= ntypea)
+        inside = r2 < rcut2[nB]
+        ir6 = 1. / r2**3
+        s6 = sig6[nB]
+        e = 4. * eps[nB] * (s6 * ir6 * (s6 * ir6 - 1.) + rconst[nB] * r2 + const[nB])
+        e = np.where(inside, e, 0.)
+        if not (gtest or stest):
+            return e
+        g = 8. * eps[nB] * (3. * (2. * ir6**2 * s6**2 - ir6 * s6) / r2 - rconst[nB])
+        return e, np.where(inside, -g, 0.)
+
+    if gtest or stest:
+        e, grad = pair_energy_gradient(coords, func, boxl)
+    else:
+        e = pair_energy(coords, func, boxl)
+        grad = np.zeros(len(coords))
+    return grad, e
@@ -0,0 +1,40 @@
+"""
+numpy version of the fortran module pygmin.potentials.fortran.maxneib_blj
+
+The trailing argument dims of each function stands for the optional array
+dimensions of the f2py interface, e.g. [natoms].  It is ignored.
+"""
+import numpy as np
+
+from maxneib_lj import _maxneib
+from lj import _box
+
+__all__ = ["maxneib_ljenergy", "maxneib_ljenergy_gradient"]
+
+def _blj_params(ntypea, epsa, siga, epsb, sigb, epsab, sigab, only_AB_neibs):
+    # indexed by the number of B atoms in the pair
+    eps = np.array([epsa, epsab, epsb])
+    sig = np.array([siga, sigab, sigb])
+    def params(I, J):
+        nB = (I >= ntypea).astype(int) + (J >= ntypea)
+        if only_AB_neibs:
+            count = nB == 1
+        else:
+            count = np.ones(len(I), bool)
+        # the fortran counts neighbors by the distance in units of sig
+        return eps[nB], sig[nB], count, sig[nB]
+    return params
+
+def maxneib_ljenergy(coords, ntypea, epsa, siga, epsb, sigb, epsab, sigab, periodic, boxl,
+                     rneib, rneib_crossover, max_neibs, neib_crossover, epsneibs, 
+                     only_AB_neibs, dims=None):
+    params = _blj_params(ntypea, epsa, siga, epsb, sigb, epsab, sigab, only_AB_neibs)
+    return _maxneib(coords, _box(periodic, boxl), params, rneib, 
+                    rneib_crossover, max_neibs, neib_crossover, epsneibs, False)
+
+def maxneib_ljenergy_gradient(coords, ntypea, epsa, siga, epsb, sigb, epsab, sigab, periodic, 
+                              boxl, rneib, rneib_crossover, max_neibs, neib_crossover, 
+                              epsneibs, only_AB_neibs, dims=None):
+    params = _blj_params(ntypea, epsa, siga, epsb, sigb, epsab, sigab, only_AB_neibs)
+    return _maxneib(coords, _box(periodic, boxl), params, rneib, 
+                    rneib_crossover, max_neibs, neib_crossover, epsneibs, True)
@@ -0,0 +1,82 @@
+"""
+numpy version of the fortran module pygmin.potentials.fortran.maxneib_lj
+
+The trailing argument dims of each function stands for the optional array
+dimensions of the f2py interface, e.g. [natoms].  It is ignored.
+"""
+import numpy as np
+
+from _pairs import pair_blocks, separations, scatter_pairs
+from lj import _box
+
+__all__ = ["maxneib_ljenergy", "maxneib_ljenergy_gradient"]
+
+def fermi(x, mu, T):
+    return 1. / (np.exp(-(x - mu) / T) + 1.)
+
+def dfermi_dx(x, mu, T):
+    myexp = np.exp(-(x - mu) / T)
+    return myexp * (1. / T) / (myexp + 1.)**2
+
+def _maxneib(coords, boxl, params, rneib, rneib_crossover, max_neibs, neib_crossover, 
+             epsneibs, gradient):
+    """the energy and gradient of lj with a penalty for too many neighbors
+
+    params(I, J) returns eps and sig for the pairs, whether the pairs count
+    as neighbors, and the length by which the pair distance is divided in
+    the neighbor count.  This is 1 for lj and sig for blj, as in the
+    fortran modules.
+    """
+    x = np.reshape(coords, [-1,3])
+    natoms = len(x)
+    grad = np.zeros(x.shape)
+    nneibs = np.zeros(natoms)
+    e = 0.
+    # lj energy and gradient, and the number of neighbors of each atom
+    for I, J in pair_blocks(natoms):
+        dr = separations(x, I, J, boxl)
+        eps, sig, count, rscale = params(I, J)
+        r2 = (dr**2).sum(1)
+        ir2 = sig**2 / r2
+        ir6 = ir2**3
+        ir12 = ir6**2
+        e += (4. * eps * (ir12 - ir6)).sum()
+        areneibs = np.where(count, 1. - fermi(np.sqrt(r2) / rscale, rneib, rneib_crossover), 0.)
+        nneibs += np.bincount(I, areneibs, natoms) + np.bincount(J, areneibs, natoms)
+        if gradient:
+            g = -4. * eps * (12. * ir12 - 6. * ir6) / r2
+            scatter_pairs(grad, I, J, g[:,np.newaxis] * dr)
+    
+    e += epsneibs * fermi(nneibs, max_neibs, neib_crossover).sum()
+    if not gradient:
+        return e
+
+    # the gradient of the neighbor penalty
+    dfn = dfermi_dx(nneibs, max_neibs, neib_crossover)
+    for I, J in pair_blocks(natoms):
+        eps, sig, count, rscale = params(I, J)
+        I = I[count]
+        J = J[count]
+        rscale = (rscale * np.ones(len(count)))[count]
+        dr = separations(x, I, J, boxl)
+        r = np.sqrt((dr**2).sum(1)) / rscale
+        dfr = dfermi_dx(r, rneib, rneib_crossover)
+        g = -epsneibs * dfr * (dfn[I] + dfn[J]) / r / rscale**2
+        scatter_pairs(grad, I, J, g[:,np.newaxis] * dr)
+    return e, grad.reshape(-1)
+
+def _lj_params(eps, sig):
+    def params(I, J):
+        # the fortran counts neighbors by the unscaled distance
+        return eps, sig, np.ones(len(I), bool), 1.
+    return params
+
+def maxneib_ljenergy(coords, eps, sig, periodic, boxl, rneib, rneib_crossover, 
+                     max_neibs, neib_crossover, epsneibs, dims=None):
+    return _maxneib(coords, _box(periodic, boxl), _lj_params(eps, sig), rneib, 
+                    rneib_crossover, max_neibs, neib_crossover, epsneibs, False)
+
+def maxneib_ljenergy_gradient(coords, eps, sig, periodic, boxl, rneib, rneib_crossover, 
+                              max_neibs, neib_crossover, epsneibs, dims=None):
+    return _maxneib(coords, _box(periodic, boxl), _lj_params(eps, sig), rneib, 
+                    rneib_crossover, max_neibs, neib_crossover, epsneibs, True)
@@ -0,0 +1,54 @@
+"""
+numpy version of the fortran module pygmin.potentials.fortran.rmdrvt
+"""
+import numpy as np
+
+__all__ = ["rmdrvt"]
+
+def _skew(p):
+    return np.array([[0., -p[2], p[1]],
+                     [p[2], 0., -p[0]],
+                     [-p[1], p[0], 0.]])
+
+def rmdrvt(p, gtest):
+    """return the rotation matrix of the angle axis vector p and its derivatives
+
+    Returns
+    -------
+    rm, drm1, drm2, drm3 : arrays, shape (3,3)
+        the rotation matrix and its derivatives with respect to p[0], p[1]
+        and p[2].  The derivatives are zero if gtest is False.
+    """
+    p = np.asarray(p, dtype=float)
+    drm = [np.zeros([3,3]) for k in xrange(3)]
+    theta2 = np.dot(p, p)
+    if theta2 < 1e-12:
+        # small angle expansion
+        rm = np.eye(3) + _skew(p)
+        if not gtest:
+            return rm, drm[0], drm[1], drm[2]
+        for k in xrange(3):
+            # d/dp_k of I + E + E^2/2 to first order in p
+            ek = np.zeros(3)
+            ek[k] = 1.
+            drm[k] = _skew(ek) + 0.5 * (np.outer(p, ek) + np.outer(ek, p)) - p[k] * np.eye(3)
+        return rm, drm[0], drm[1], drm[2]
+
+    theta = np.sqrt(theta2)
+    ct = np.cos(theta)
+    st = np.sin(theta)
+    pn = p / theta
+    E = _skew(pn)
+    ESQ = np.dot(E, E)
+    rm = np.eye(3) + (1. - ct) * ESQ + st * E
+    if not gtest:
+        return rm, drm[0], drm[1], drm[2]
+
+    for k in xrange(3):
+        # derivative of the unit vector pn with respect to p[k]
+        dpn = -pn[k] * pn / theta
+        dpn[k] += 1. / theta
+        DE = _skew(dpn)
+        drm[k] = (st * pn[k] * ESQ + (1. - ct) * (np.dot(DE, E) + np.dot(E, DE))
+                  + ct * pn[k] * E + st * DE)
+    return rm, drm[0], drm[1], drm[2]
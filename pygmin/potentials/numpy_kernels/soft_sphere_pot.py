@@ -0,0 +1,27 @@
+"""
+numpy version of the fortran module pygmin.potentials.fortran.soft_sphere_pot
+
+The trailing argument dims of each function stands for the optional array
+dimensions of the f2py interface, e.g. [natoms].  It is ignored.
+"""
+import numpy as np
+
+from _pairs import pair_energy_gradient, many
+
+__all__ = ["soft_sphere_pot", "soft_sphere_pot_many"]
+
+def soft_sphere_pot(dimen, coords, diams, dims=None):
+    """return the energy and gradient of soft spheres in the periodic unit box"""
+    diams = np.asarray(diams)
+    def func(r2, I, J):
+        r = np.sqrt(r2)
+        dij = 0.5 * (diams[I] + diams[J])
+        inside = r < dij
+        overlap = 1. - r / dij
+        e = 0.5 * overlap**2
+        g = -overlap / (dij * r)
+        return np.where(inside, e, 0.), np.where(inside, g, 0.)
+    return pair_energy_gradient(coords, func, 1., dim=dimen)
+
+def soft_sphere_pot_many(dimen, coords, diams, dims=None):
+    return many(lambda x: soft_sphere_pot(dimen, x, diams), coords)
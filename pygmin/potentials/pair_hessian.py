@@ -0,0 +1,68 @@
+"""
+tools for building the Hessian of a pair potential as a sparse matrix
+
+The Hessian of a pair potential V(r_ij) is made up of one 3x3 block for each
+interacting pair
+
+    M_ij = h_ij * outer(dr_ij, dr_ij) + g_ij * I
+
+where dr_ij = x_i - x_j, g_ij = V'(r)/r and h_ij = (V''(r) - V'(r)/r) / r**2.
+M_ij is added to the diagonal blocks (i,i) and (j,j) and subtracted from the
+off diagonal blocks (i,j) and (j,i).  For short ranged potentials the number of
+pairs is linear in the number of atoms, so the Hessian is very sparse.
+"""
+import numpy as np
+import scipy.sparse
+
+__all__ = ["pair_hessian_sparse"]
+
+def pair_hessian_sparse(natoms, ilist, dr, g, h):
+    """return the sparse Hessian of a pair potential in CSR format
+
+    Parameters
+    ----------
+    natoms : int
+        the number of atoms
+    ilist : array, shape (npairs, 2)
+        the indices of the interacting atoms
+    dr : array, shape (npairs, dim)
+        the separation vector x_i - x_j of each pair
+    g : array, shape (npairs,)
+        V'(r)/r for each pair
+    h : array, shape (npairs,)
+        (V''(r) - V'(r)/r) / r**2 for each pair
+
+    Returns
+    -------
+    hess : scipy.sparse.csr_matrix, shape (natoms*dim, natoms*dim)
+    """
+    ilist = np.asarray(ilist).reshape(-1,2)
+    dr = np.asarray(dr)
+    npairs, dim = dr.shape
+    ndof = natoms * dim
+    if npairs == 0:
+        return scipy.sparse.csr_matrix((ndof, ndof))
+
+    # the 3x3 blocks, shape (npairs, dim, dim)
+    blocks = h[:,np.newaxis,np.newaxis] * dr[:,:,np.newaxis] * dr[:,np.newaxis,:]
+    blocks += g[:,np.newaxis,np.newaxis] * np.eye(dim)[np.newaxis,:,:]
+
+    # row and column indices of each element of each block
+    k = np.arange(dim)
+    i = ilist[:,0]
+    j = ilist[:,1]
+    irows = (dim * i)[:,np.newaxis,np.newaxis] + k[np.newaxis,:,np.newaxis]
+    jrows = (dim * j)[:,np.newaxis,np.newaxis] + k[np.newaxis,:,np.newaxis]
+    icols = (dim * i)[:,np.newaxis,np.newaxis] + k[np.newaxis,np.newaxis,:]
+    jcols = (dim * j)[:,np.newaxis,np.newaxis] + k[np.newaxis,np.newaxis,:]
+    shape = blocks.shape
+    irows, jrows, icols, jcols = [np.broadcast_to(a, shape).ravel()
+                                  for a in (irows, jrows, icols, jcols)]
+
+    blocks = blocks.ravel()
+    data = np.concatenate((blocks, blocks, -blocks, -blocks))
+    rows = np.concatenate((irows, jrows, irows, jrows))
+    cols = np.concatenate((icols, jcols, jcols, icols))
+    # duplicate entries are summed when converting to csr
+    hess = scipy.sparse.coo_matrix((data, (rows, cols)), shape=(ndof, ndof))
+    return hess.tocsr()
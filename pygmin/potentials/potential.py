@@ -15,6 +15,20 @@ class BasePotential(object):
     will be calculated numerically  
     
         getEnergyGradient()
+    
+    Pair potentials can optionally implement
+    
+        getEnergyChange(coords_old, coords_new, moved_atoms)
+    
+    which returns the change in energy when only the atoms in moved_atoms
+    have moved.  This only needs the interactions of the moved atoms, and is
+    used by MonteCarlo when the takestep reports which atoms it moved.
+    They can also implement
+    
+        getEnergyPerAtom(coords)
+    
+    which splits the energy between the atoms, e.g. for takesteps which
+    favour moving high energy atoms.
     '''
     def getEnergy(self, coords):
         """return the energy at the given coordinates"""
@@ -27,41 +41,101 @@ class BasePotential(object):
     def getEnergyGradientNumerical(self, coords):
         return self.getEnergy(coords), self.NumericalDerivative(coords, 1e-8)
             
-    def NumericalDerivative(self, coords, eps=1e-6):
-        """return the gradient calculated numerically"""
-        g = np.zeros(coords.size)
-        x = coords.copy()
-        for i in xrange(coords.size):
-            x[i] += eps
-            g[i] = self.getEnergy(x)
-            x[i] -= 2. * eps
-            g[i] -= self.getEnergy(x)
-            g[i] /= 2. * eps
-            x[i] += eps
-        return g
+    def NumericalDerivative(self, coords, eps=1e-6, stencil="central", pool=None):
+        """return the gradient calculated numerically
+        
+        See Also
+        --------
+        pygmin.potentials.finite_difference.numerical_gradient
+        """
+        from pygmin.potentials.finite_difference import numerical_gradient
+        return numerical_gradient(self, coords, eps=eps, stencil=stencil, pool=pool)
     
     def getGradient(self, coords):
         """return the gradient at the given coordinates"""
         e, g = self.getEnergyGradient(coords)
-        return g     
+        return g
+
+    def getEnergyPerAtom(self, coords):
+        """return the energy of each atom
+        
+        For pair potentials each pair energy is split equally between its
+        two atoms, so the energies sum to the total energy.  This is
+        optional.  Potentials which implement it do so at the cost of about
+        one gradient evaluation.
+        
+        Returns
+        -------
+        energies : array, shape (natoms,)
+        """
+        raise NotImplementedError
+
+    def getEnergyGradientMany(self, coords_stack):
+        """return the energies and gradients of many configurations at once
+
+        Parameters
+        ----------
+        coords_stack : array, shape (nconf, ndof)
+            each row is a separate configuration
+
+        Returns
+        -------
+        energies : array, shape (nconf,)
+        grads : array, shape (nconf, ndof)
+
+        Notes
+        -----
+        The default implementation simply loops over the configurations.
+        Potentials with compiled kernels should overload this so that all
+        configurations are evaluated in a single call.
+        """
+        coords_stack = np.asarray(coords_stack)
+        nconf = coords_stack.shape[0]
+        energies = np.zeros(nconf)
+        grads = np.zeros(coords_stack.shape)
+        for i in xrange(nconf):
+            energies[i], grads[i,:] = self.getEnergyGradient(coords_stack[i,:])
+        return energies, grads
 
-    def NumericalHessian(self, coords, eps=1e-6):
+    def NumericalHessian(self, coords, eps=1e-6, stencil="central", symmetric=True, pool=None):
         """return the Hessian matrix of second derivatives computed numerically
         
-        this takes 2*len(coords) calls to getGradient
+        with the default central stencil this takes 2*len(coords) gradient 
+        evaluations.  They are done through getEnergyGradientMany, or in
+        parallel if a multiprocessing pool is passed.
+        
+        See Also
+        --------
+        pygmin.potentials.finite_difference.numerical_hessian
+        """
+        from pygmin.potentials.finite_difference import numerical_hessian
+        return numerical_hessian(self, coords, eps=eps, stencil=stencil, 
+                                 symmetric=symmetric, pool=pool)
+
+    def getHessianVectorProduct(self, coords, vec, eps=1e-6):
+        """return the product of the Hessian with the vector vec
+        
+        The default implementation uses a central finite difference of the
+        gradient along vec, which costs two gradient evaluations.  Potentials
+        which can compute the product analytically should overload this.
+        
+        Parameters
+        ----------
+        coords : array
+            the point at which the Hessian is evaluated
+        vec : array
+            the vector to multiply the Hessian by
+        eps : float
+            the finite difference step size.  This is ignored by analytic
+            implementations
         """
-        x = coords.copy()
-        ndof = len(x)
-        hess = np.zeros([ndof, ndof])
-        for i in xrange(ndof):
-            xbkup = x[i]
-            x[i] += eps
-            g1 = self.getGradient(x)
-            x[i] = xbkup - eps
-            g2 = self.getGradient(x)            
-            hess[i,:] = (g1 - g2) / (2. * eps)
-            x[i] = xbkup
-        return hess
+        vnorm = np.linalg.norm(vec)
+        if vnorm == 0.:
+            return np.zeros(vec.shape)
+        dx = eps * vec / vnorm
+        gplus = self.getGradient(coords + dx)
+        gminus = self.getGradient(coords - dx)
+        return (gplus - gminus) * (vnorm / (2. * eps))
 
     def getEnergyGradientHessian(self, coords):
         """return the energy, gradient, and Hessian at the given coordinates"""
@@ -74,6 +148,16 @@ class BasePotential(object):
         e, g, h = self.getEnergyGradientHessian(coords)
         return h
     
+    def getSparseHessian(self, coords):
+        """return the hessian as a scipy.sparse matrix in CSR format
+        
+        Potentials with short ranged interactions should overload this to
+        build the sparse matrix directly.  The default simply converts the
+        dense Hessian.
+        """
+        import scipy.sparse
+        return scipy.sparse.csr_matrix(self.getHessian(coords))
+    
     def test_potential(self, coords, eps=1e-6):
         """print some information testing whether the analytical gradients are correct"""
         E1 = self.getEnergy(coords)
@@ -90,6 +174,32 @@ class BasePotential(object):
         print "maximum difference between analytical and numerical gradient", np.max(np.abs(grad-gradnum))
         print "normalized by the maximum gradient", np.max(np.abs(grad-gradnum)) / np.max(np.abs(grad))
 
+def _moved_atom_pairs(natoms, moved_atoms):
+    """return all pairs of atoms (i,j) where at least one of i,j is in moved_atoms
+    
+    each pair is listed only once.  This is used to compute the change in
+    energy of a pair potential when only a few atoms move, see getEnergyChange
+    """
+    moved = np.unique(np.asarray(moved_atoms, dtype=np.int64))
+    ismoved = np.zeros(natoms, bool)
+    ismoved[moved] = True
+    others = np.where(~ismoved)[0]
+    nmoved = len(moved)
+    i, j = np.triu_indices(nmoved, 1)
+    ilist = np.zeros([nmoved * len(others) + len(i), 2], np.int64)
+    ilist[:nmoved * len(others),0] = np.repeat(moved, len(others))
+    ilist[:nmoved * len(others),1] = np.tile(others, nmoved)
+    ilist[nmoved * len(others):,0] = moved[i]
+    ilist[nmoved * len(others):,1] = moved[j]
+    return ilist
+
+def _select_moved_pairs(ilist, natoms, moved_atoms):
+    """return the pairs in ilist which contain at least one atom in moved_atoms"""
+    ismoved = np.zeros(natoms, bool)
+    ismoved[moved_atoms] = True
+    return ilist[ismoved[ilist[:,0]] | ismoved[ilist[:,1]],:]
+
+
 class potential(BasePotential):
     """
     for backward compatibility
@@ -126,5 +236,12 @@ class BasePotentialAtomistic(object):
             a numpy array containing pairs of atoms (ilist[i,:]).  
         """
         return NotImplementedError
+
+    def getEnergyPerAtomList(self, coords, ilist):
+        """return the energy of each atom from the interactions in ilist
+
+        each pair energy is split equally between its two atoms
+        """
+        raise NotImplementedError
     
 
@@ -1,7 +1,13 @@
 import numpy as np
 
 from pygmin.potentials import BasePotential
-from fortran.soft_sphere_pot import soft_sphere_pot
+from pygmin.potentials.potential import _moved_atom_pairs
+from pygmin.potentials.pair_hessian import pair_hessian_sparse
+from pygmin.potentials.numpy_kernels._pairs import pair_energy_per_atom
+try:
+    from fortran.soft_sphere_pot import soft_sphere_pot, soft_sphere_pot_many
+except ImportError:
+    from numpy_kernels.soft_sphere_pot import soft_sphere_pot, soft_sphere_pot_many
 
 __all__ = ["SoftSphere"]
 
@@ -28,9 +34,123 @@ class SoftSphere(BasePotential):
         energy, force = soft_sphere_pot(self.dimen, coords, self.diams, [natoms])
         return energy, force
 
+    def getEnergyGradientMany(self, coords_stack):
+        """return the energies and gradients of a stack of configurations
 
+        All configurations are evaluated in a single call to the fortran code
+        """
+        coords_stack = np.asarray(coords_stack)
+        nconf = coords_stack.shape[0]
+        natoms = coords_stack.shape[1]/self.dimen
+        # the transpose is fortran ordered, so no copy is made
+        energy, force = soft_sphere_pot_many(self.dimen, coords_stack.T,
+                                             self.diams, [natoms, nconf])
+        return energy, force.T
+
+    def getEnergyList(self, coords, ilist):
+        """return the energy of the interactions in ilist"""
+        ilist = np.reshape(ilist, [-1,2])
+        x = np.reshape(coords, [-1,self.dimen])
+        dr = x[ilist[:,0],:] - x[ilist[:,1],:]
+        dr -= np.round(dr)
+        r = np.sqrt((dr**2).sum(1))
+        dij = 0.5 * (self.diams[ilist[:,0]] + self.diams[ilist[:,1]])
+        overlap = (1. - r/dij)[r < dij]
+        return 0.5 * (overlap**2).sum()
+
+    def _pair_energies(self, r2, I, J):
+        """return the energies of the pairs I, J with squared separations r2"""
+        dij = 0.5 * (self.diams[I] + self.diams[J])
+        overlap = np.maximum(1. - np.sqrt(r2) / dij, 0.)
+        return 0.5 * overlap**2
+
+    def getEnergyPerAtom(self, coords):
+        """return the energy of each atom, each pair energy split equally between its atoms
+        
+        the atoms are in the periodic unit box, as for the energy
+        """
+        return pair_energy_per_atom(coords, self._pair_energies, 1., dim=self.dimen)
+
+    def getEnergyPerAtomList(self, coords, ilist):
+        """return the energy of each atom from the interactions in ilist"""
+        return pair_energy_per_atom(coords, self._pair_energies, 1., ilist=ilist, 
+                                    dim=self.dimen)
+
+    def getEnergyChange(self, coords_old, coords_new, moved_atoms):
+        """return the change in energy when only the atoms in moved_atoms have moved
         
+        only the interactions of the moved atoms are computed
+        """
+        ilist = _moved_atom_pairs(len(coords_new)/self.dimen, moved_atoms)
+        return (self.getEnergyList(coords_new, ilist) 
+                - self.getEnergyList(coords_old, ilist))
+
+    def getSparseHessian(self, coords):
+        """return the analytic Hessian as a scipy.sparse matrix
         
+        the interacting pairs are found using cell lists in the periodic
+        unit box
+        """
+        from pygmin.utils.neighbor_list import _build_list_cells
+        natoms = len(coords)/self.dimen
+        x = np.reshape(coords, [-1,self.dimen])
+        # the cell lists are three dimensional
+        x3 = np.zeros([natoms, 3])
+        x3[:,:self.dimen] = x
+        ilist = _build_list_cells(x3.reshape(-1), np.max(self.diams)**2, 
+                                  np.arange(natoms, dtype=np.int64), boxl=1.)
+        i = ilist[:,0]
+        j = ilist[:,1]
+        dr = x[i,:] - x[j,:]
+        dr -= np.round(dr)
+        r = np.sqrt((dr**2).sum(1))
+        dij = 0.5 * (self.diams[i] + self.diams[j])
+        inside = r < dij
+        ilist = ilist[inside,:]
+        dr = dr[inside,:]
+        r = r[inside]
+        dij = dij[inside]
+        # V(r) = (1 - r/d)**2 / 2
+        dV = -(1. - r/dij) / dij
+        ddV = 1. / dij**2
+        g = dV / r
+        h = (ddV - g) / r**2
+        return pair_hessian_sparse(natoms, ilist, dr, g, h)
+
+    def getEnergyGradientHessian(self, coords):
+        e, g = self.getEnergyGradient(coords)
+        hess = self.getSparseHessian(coords).toarray()
+        return e, g, hess
+
+
+import unittest
+class TestSoftSphere(unittest.TestCase):
+    def setUp(self):
+        np.random.seed(0)
+        self.natoms = 20
+        rho = 1.6
+        meandiam = 1. / (float(self.natoms) / rho)**(1./3)
+        self.diams = np.random.uniform(0.9, 1.1, self.natoms) * meandiam
+        self.pot = SoftSphere(self.diams)
+        self.coords = np.random.uniform(0, 1, 3 * self.natoms)
+
+    def test_sparse_hessian(self):
+        hess = self.pot.getSparseHessian(self.coords).toarray()
+        self.assertGreater(np.count_nonzero(hess), 0)
+        hessnum = self.pot.NumericalHessian(self.coords)
+        self.assertLess(np.max(np.abs(hess - hessnum)), 1e-4 * np.max(np.abs(hess)))
+
+    def test_many(self):
+        coords_stack = np.array([self.coords, self.coords * 1.1, self.coords * 0.9])
+        energies, grads = self.pot.getEnergyGradientMany(coords_stack)
+        self.assertEqual(grads.shape, coords_stack.shape)
+        for x, e, g in zip(coords_stack, energies, grads):
+            e1, g1 = self.pot.getEnergyGradient(x)
+            self.assertGreater(e1, 0.)
+            self.assertAlmostEqual(e1, e, 7)
+            self.assertLess(np.max(np.abs(g1 - g)), 1e-7 * np.max(np.abs(g1)))
+
+
 
 def putInBox(coords, boxl):
     natoms = len(coords)/3
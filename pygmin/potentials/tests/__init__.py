@@ -0,0 +1,3 @@
+from test_numpy_kernels import *
+from test_spin_models import *
+from test_energy_per_atom import *
@@ -0,0 +1,51 @@
+"""
+check that the energies from getEnergyPerAtom sum to the total energy
+"""
+import unittest
+import numpy as np
+
+from pygmin.potentials.tests.test_numpy_kernels import lattice
+
+class TestEnergyPerAtom(unittest.TestCase):
+    def setUp(self):
+        np.random.seed(0)
+        self.natoms = 40
+        self.x = lattice(self.natoms)
+
+    def check(self, pot, x):
+        energies = pot.getEnergyPerAtom(x)
+        self.assertEqual(energies.shape, (len(x) / 3,))
+        self.assertAlmostEqual(energies.sum(), pot.getEnergy(x), 8)
+
+    def test_lj(self):
+        from pygmin.potentials import LJ
+        self.check(LJ(), self.x)
+        self.check(LJ(boxl=4.4), self.x)
+
+    def test_ljcut(self):
+        from pygmin.potentials import LJCut
+        self.check(LJCut(rcut=2.), self.x)
+        self.check(LJCut(rcut=2., boxl=4.4), self.x)
+
+    def test_blj(self):
+        from pygmin.potentials import LJpshift
+        self.check(LJpshift(self.natoms, 32, rcut=2.), self.x)
+
+    def test_blj_neighbor_list(self):
+        from pygmin.utils.neighbor_list import makeBLJNeighborListPot
+        pot = makeBLJNeighborListPot(self.natoms, ntypeA=32, rcut=2.5)
+        self.check(pot, self.x)
+
+    def test_lj_periodic(self):
+        from pygmin.potentials import LJPeriodic
+        self.check(LJPeriodic([4.4, 4.4, 5.5], rcut=2.), self.x)
+
+    def test_soft_sphere(self):
+        from pygmin.potentials import SoftSphere
+        natoms = 20
+        diams = np.random.uniform(0.3, 0.4, natoms)
+        x = np.random.uniform(0, 1, 3 * natoms)
+        self.check(SoftSphere(diams), x)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,149 @@
+"""
+check that the numpy kernels agree with the compiled fortran modules
+"""
+import unittest
+import importlib
+import numpy as np
+
+def lattice(natoms, spacing=1.1, noise=0.05, dim=3):
+    """return slightly perturbed simple cubic lattice coordinates, so no two atoms overlap"""
+    n = int(np.ceil(natoms**(1./dim)))
+    grid = np.array(np.meshgrid(*[np.arange(n)] * dim)).reshape(dim, -1).T[:natoms]
+    x = spacing * grid + np.random.uniform(-noise, noise, grid.shape)
+    return x.reshape(-1)
+
+class _ParityTest(unittest.TestCase):
+    module = None
+    natoms = 20
+
+    def setUp(self):
+        try:
+            self.f = importlib.import_module("pygmin.potentials.fortran." + self.module)
+        except ImportError:
+            self.skipTest("fortran module %s is not compiled" % self.module)
+        self.n = importlib.import_module("pygmin.potentials.numpy_kernels." + self.module)
+        np.random.seed(0)
+        self.x = lattice(self.natoms)
+
+    def compare(self, name, *args):
+        rf = getattr(self.f, name)(*args)
+        rn = getattr(self.n, name)(*args)
+        if not isinstance(rf, tuple):
+            rf, rn = (rf,), (rn,)
+        self.assertEqual(len(rf), len(rn))
+        for a, b in zip(rf, rn):
+            self.assertTrue(np.allclose(a, b, rtol=1e-8, atol=1e-8),
+                            "%s differs: %s %s" % (name, a, b))
+
+class TestLJKernels(_ParityTest):
+    module = "lj"
+    extra = ()
+
+    def args(self, periodic):
+        boxl = 3.7
+        return (1., 1.), (periodic, boxl) + self.extra
+
+    def test_energy_gradient(self):
+        for periodic in [False, True]:
+            p, b = self.args(periodic)
+            self.compare("ljenergy", self.x, *(p + b))
+            self.compare("ljenergy_gradient", self.x, *(p + b))
+
+    def test_ilist(self):
+        ilist = np.array([(i, j) for i in xrange(self.natoms) for j in xrange(i)
+                          if (i + j) % 3 != 0], dtype=np.int32)
+        for periodic in [False, True]:
+            p, b = self.args(periodic)
+            self.compare("energy_ilist", self.x, *(p + (ilist.reshape(-1),) + b))
+            self.compare("energy_gradient_ilist", self.x, *(p + (ilist.reshape(-1),) + b))
+            v = np.random.uniform(-1, 1, self.x.size)
+            self.compare("hessian_vector_product_ilist", self.x, v, *(p + (ilist.reshape(-1),) + b))
+
+    def test_hvp(self):
+        v = np.random.uniform(-1, 1, self.x.size)
+        for periodic in [False, True]:
+            p, b = self.args(periodic)
+            self.compare("hessian_vector_product", self.x, v, *(p + b))
+
+    def test_many(self):
+        stack = np.array([lattice(self.natoms) for i in xrange(3)])
+        p, b = self.args(False)
+        self.compare("ljenergy_gradient_many", np.asfortranarray(stack.T), *(p + b))
+
+class TestLJCutKernels(TestLJKernels):
+    module = "ljcut"
+    extra = (1.8,)
+
+class TestLJHessKernel(_ParityTest):
+    module = "lj_hess"
+    natoms = 6
+
+    def test_ljdiff(self):
+        self.compare("ljdiff", self.x, True, True)
+
+class TestLJpshiftKernel(_ParityTest):
+    module = "ljpshiftfort"
+
+    def test_ljpshift(self):
+        for periodic in [False, True]:
+            boxl = 3.5
+            # the fortran wraps the coordinates into the box in place
+            args = (True, False, boxl, boxl, boxl, 2.5, periodic, 14, 1.5, 0.5, 0.8, 0.88)
+            rf = self.f.ljpshift(self.x.copy(), *args)
+            rn = self.n.ljpshift(self.x.copy(), *args)
+            for a, b in zip(rf, rn):
+                self.assertTrue(np.allclose(a, b, rtol=1e-8, atol=1e-8))
+
+class TestSoftSphereKernel(_ParityTest):
+    module = "soft_sphere_pot"
+
+    def test_soft_sphere(self):
+        x = np.random.uniform(0, 1, 3 * self.natoms)
+        diams = np.random.uniform(0.2, 0.3, self.natoms)
+        self.compare("soft_sphere_pot", 3, x, diams)
+        stack = np.random.uniform(0, 1, [3 * self.natoms, 3])
+        self.compare("soft_sphere_pot_many", 3, np.asfortranarray(stack), diams)
+
+class TestMaxneibLJKernel(_ParityTest):
+    module = "maxneib_lj"
+
+    def test_maxneib(self):
+        for periodic in [False, True]:
+            args = (1., 1., periodic, 3.7, 1.7, 0.1, 5., 0.2, 1.)
+            self.compare("maxneib_ljenergy", self.x, *args)
+            self.compare("maxneib_ljenergy_gradient", self.x, *args)
+
+    def test_maxneib_sig(self):
+        # the neighbor count uses the unscaled distance, so sig != 1 matters
+        for periodic in [False, True]:
+            args = (1.3, 0.9, periodic, 3.7, 1.4, 0.1, 5., 0.2, 1.)
+            self.compare("maxneib_ljenergy", self.x, *args)
+            self.compare("maxneib_ljenergy_gradient", self.x, *args)
+
+class TestMaxneibBLJKernel(_ParityTest):
+    module = "maxneib_blj"
+
+    def test_maxneib(self):
+        for periodic in [False, True]:
+            for only_AB in [False, True]:
+                args = (14, 1., 1., 0.5, 0.88, 1.5, 0.8, periodic, 3.7,
+                        1.7, 0.1, 5., 0.2, 1., only_AB)
+                self.compare("maxneib_ljenergy", self.x, *args)
+                self.compare("maxneib_ljenergy_gradient", self.x, *args)
+
+class TestATKernel(_ParityTest):
+    module = "AT"
+    natoms = 10
+
+    def test_axt(self):
+        self.compare("axt", self.x, True, 1.3)
+
+class TestRmdrvtKernel(_ParityTest):
+    module = "rmdrvt"
+
+    def test_rmdrvt(self):
+        for p in [np.random.uniform(-1, 1, 3), 1e-7 * np.random.uniform(-1, 1, 3)]:
+            self.compare("rmdrvt", p, True)
+
+if __name__ == "__main__":
+    unittest.main()
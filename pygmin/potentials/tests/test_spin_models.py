@@ -0,0 +1,74 @@
+"""
+check the edge array spin models against a plain loop over the lattice edges
+"""
+import unittest
+import numpy as np
+
+from pygmin.potentials.xyspin import XYModel
+from pygmin.potentials import xyspin1d
+from pygmin.potentials.heisenberg_spin import HeisenbergModel, coords2ToCoords3
+from pygmin.potentials.heisenberg_spin_RA import HeisenbergModelRA
+
+def exchange_loop(pot, coords3):
+    E = 0.
+    for edge in pot.G.edges():
+        E -= np.dot(coords3[pot.indices[edge[0]]], coords3[pot.indices[edge[1]]])
+    return E
+
+class _SpinTest(unittest.TestCase):
+    def check_gradient(self, pot, x):
+        e, g = pot.getEnergyGradient(x)
+        self.assertAlmostEqual(e, pot.getEnergy(x), 10)
+        gnum = pot.NumericalDerivative(x, 1e-6)
+        self.assertLess(np.max(np.abs(g - gnum)), 1e-5)
+
+class TestXYModel(_SpinTest):
+    def setUp(self):
+        np.random.seed(0)
+        self.pot = XYModel(dim=[4, 5], phi=np.pi)
+        self.angles = np.random.uniform(-np.pi, np.pi, self.pot.nspins)
+
+    def test_energy(self):
+        E = 0.
+        for edge in self.pot.G.edges():
+            u = self.pot.indices[edge[0]]
+            v = self.pot.indices[edge[1]]
+            E -= np.cos(-self.angles[u] + self.angles[v] + self.pot.phases[edge])
+        self.assertAlmostEqual(self.pot.getEnergy(self.angles), E, 10)
+
+    def test_gradient(self):
+        self.check_gradient(self.pot, self.angles)
+
+class TestXYModel1d(_SpinTest):
+    def test_gradient(self):
+        np.random.seed(0)
+        for periodic in [True, False]:
+            pot = xyspin1d.XYModel(7, periodic=periodic)
+            angles = np.random.uniform(-np.pi, np.pi, pot.nspins)
+            self.check_gradient(pot, angles)
+
+class TestHeisenbergModel(_SpinTest):
+    pottype = HeisenbergModel
+
+    def setUp(self):
+        np.random.seed(0)
+        self.pot = self.pottype(dim=[4, 3], field_disorder=1.)
+        self.coords = np.random.uniform(0.2, np.pi - 0.2, 2 * self.pot.nspins)
+
+    def test_energy(self):
+        coords3 = coords2ToCoords3(self.coords)
+        e = self.pot.getEnergy(self.coords)
+        if self.pottype is HeisenbergModel:
+            efields = -np.sum(self.pot.fields * coords3)
+        else:
+            efields = -np.sum(np.sum(self.pot.fields * coords3, axis=1)**2)
+        self.assertAlmostEqual(e, exchange_loop(self.pot, coords3) + efields, 10)
+
+    def test_gradient(self):
+        self.check_gradient(self.pot, self.coords)
+
+class TestHeisenbergModelRA(TestHeisenbergModel):
+    pottype = HeisenbergModelRA
+
+if __name__ == "__main__":
+    unittest.main()
@@ -33,7 +33,26 @@ class RectangularLattice(object):
         i = x + y * self.Lx
         return i
         
+def lattice_edges(G, indices):
+    """
+    return the edges of the graph G as two arrays of spin indices
+    
+    Parameters
+    ----------
+    G : networkx.Graph
+        the lattice
+    indices : dict
+        maps the nodes of G to the spin indices
     
+    Returns
+    -------
+    edge_u, edge_v : integer arrays
+        the spin indices of the two ends of each edge, in the order of G.edges()
+    """
+    edges = G.edges()
+    edge_u = np.array([indices[edge[0]] for edge in edges], dtype=np.intp)
+    edge_v = np.array([indices[edge[1]] for edge in edges], dtype=np.intp)
+    return edge_u, edge_v
     
 
 class XYModel(BasePotential):
@@ -63,36 +82,27 @@ class XYModel(BasePotential):
             i += 1 
         
         self.num_edges = self.G.number_of_edges()
-
         
+        # the lattice as contiguous arrays, in the order of G.edges()
+        self.edge_u, self.edge_v = lattice_edges(self.G, self.indices)
+        self.edge_phases = np.array([self.phases[edge] for edge in self.G.edges()])
+
+    def _edgeAngles(self, angles):
+        angles = np.asarray(angles)
+        return angles[self.edge_v] - angles[self.edge_u] + self.edge_phases
         
     def getEnergy(self, angles):
-        #do internal energies first
-        E = 0.
-        for edge in self.G.edges():
-            phase = self.phases[edge]
-            u = self.indices[edge[0]]
-            v = self.indices[edge[1]]
-            E += np.cos( -angles[u] + angles[v] + phase )
+        E = np.sum(np.cos(self._edgeAngles(angles)))
         #E = self.num_edges - E
         E = - E
         return E
         
     def getEnergyGradient(self, angles):
-        #do internal energies first
-        E = 0.
-        grad = np.zeros(self.nspins)
-        for edge in self.G.edges():
-            phase = self.phases[edge]
-            u = self.indices[edge[0]]
-            v = self.indices[edge[1]]
-            E += np.cos( -angles[u] + angles[v] + phase )
-            
-            g = -np.sin( -angles[u] + angles[v] + phase )
-            grad[u] += g
-            grad[v] += -g
-        #E = self.num_edges - E
-        E =  - E
+        a = self._edgeAngles(angles)
+        E = - np.sum(np.cos(a))
+        g = -np.sin(a)
+        grad = np.bincount(self.edge_u, g, minlength=self.nspins)
+        grad -= np.bincount(self.edge_v, g, minlength=self.nspins)
         return E, grad
 
 
@@ -6,7 +6,7 @@ class XYModel(BasePotential):
     """
     1d xymodel
     """
-    def __init__(self, nspins, phi=1.0, phases=None):
+    def __init__(self, nspins, phi=1.0, phases=None, periodic=True):
         self.nspins = nspins
         
         if phases == None:
@@ -14,43 +14,31 @@ class XYModel(BasePotential):
         else:
             self.phases = phases
         
-        self.periodic = True
+        self.periodic = periodic
         
-    def getEnergy(self, angles):
-        #do internal energies first
-        E = np.sum( np.cos( -angles[0:-1] + angles[1:] + self.phases[0:-1] ) )
-        
-        #now do boundary condition
-        if self.periodic:
-            E += np.cos( -angles[-1] + angles[0] + self.phases[-1] )
+        # edge k connects spin k to spin k+1 and has phase self.phases[k]
+        nedges = self.nspins if self.periodic else self.nspins - 1
+        self.edge_u = np.arange(nedges)
+        self.edge_v = (self.edge_u + 1) % self.nspins
+        self.edge_phases = np.asarray(self.phases)[:nedges]
+    
+    def _edgeAngles(self, angles):
+        angles = np.asarray(angles)
+        return angles[self.edge_v] - angles[self.edge_u] + self.edge_phases
         
+    def getEnergy(self, angles):
+        E = np.sum( np.cos( self._edgeAngles(angles) ) )
         E = self.nspins - E #/ self.nspins
         return E
 
     def getEnergyGradient(self, angles):
-        from numpy import cos, sin
-        
-        grad = np.zeros(self.nspins)
+        anglediff = self._edgeAngles(angles)
         
-        anglediff = np.zeros(self.nspins)
-        anglediff[0:-1] = -angles[0:-1] + angles[1:] + self.phases[0:-1]
-        if self.periodic:
-            anglediff[-1] = -angles[-1] + angles[0] + self.phases[-1]
+        s = np.sin( anglediff )
+        grad = np.bincount(self.edge_v, s, minlength=self.nspins)
+        grad -= np.bincount(self.edge_u, s, minlength=self.nspins)
         
-        #first do interior spins
-        grad[1:-1]= sin( anglediff[0:-2] ) - sin( anglediff[1:-1] ) 
-        
-        #now do spins on the boundaries
-        grad[0] =  sin( anglediff[-1] ) - sin( anglediff[0] )
-        grad[-1] = sin( anglediff[-2] ) - sin( anglediff[-1] )
-        
-        E = np.sum( cos( anglediff[0:-1] ) )
-        E += cos( anglediff[-1] )
-        E = self.nspins - E# / self.nspins
-
-
-
-        #grad /= self.nspins
+        E = self.nspins - np.sum( np.cos( anglediff ) )# / self.nspins
         return E, grad
 
 #    def getEnergyGradient(self, angles):
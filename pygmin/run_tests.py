@@ -7,12 +7,25 @@ from pygmin.mindist.tests import *
 from pygmin.potentials.ATLJ import TestATLJ
 from pygmin.potentials.lj import LJTest
 from pygmin.potentials.ljcut import LJCutTest
+from pygmin.potentials.lj_periodic import TestLJPeriodic
+from pygmin.potentials.maxneib_blj import TestMaxNeibsBLJThreaded
+from pygmin.potentials.soft_sphere import TestSoftSphere
+from pygmin.potentials.finite_difference import TestFiniteDifference
+from pygmin.potentials.cached_potential import TestCachedPotential
+from pygmin.potentials.instrumented_potential import TestInstrumentedPotential
+from pygmin.potentials.tests import *
 from pygmin.landscape._graph import TestGraph
 from pygmin.landscape._distance_graph import TestDistanceGraph
 from pygmin.transition_states._orthogopt import TestOrthogopt
 from pygmin.utils.hessian import TestEig
+from pygmin.thermodynamics._normalmodes import TestLogproductSparse, TestNormalmodesSparse
+from pygmin.optimize._preconditioners import TestPreconditioners
+from pygmin.utils.rotations import TestRotationsMany
+from pygmin.utils.neighbor_list import TestCellList, TestNeighborListTyped, TestNeighborListHessian
+from pygmin.utils.frozen_atoms import TestFrozenPotWrapper
 from pygmin.accept_tests.tests import *
 from pygmin.storage.tests import *
 from pygmin._test_basinhopping import TestBasinhopping
+from pygmin.mc import TestMCEnergyChange
 
 unittest.main()
\ No newline at end of file
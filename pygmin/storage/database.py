@@ -372,6 +372,10 @@ class Database(object):
         candidates = self.session.query(Minimum).order_by(Minimum.energy.desc()).limit(1).all()
         return candidates[0]
     
+    def lowest_energy_minimum(self):
+        """return the minimum with the lowest energy, or None if there are no minima"""
+        return self.session.query(Minimum).order_by(Minimum.energy).first()
+    
     def addMinimum(self, E, coords, commit=True, max_n_minima=-1):
         """add a new minimum to database
         
@@ -1,4 +1,5 @@
 import tempfile
+import functools
 
 from pygmin.landscape import DoubleEndedConnect, DoubleEndedConnectPar
 from pygmin import basinhopping
@@ -9,6 +10,7 @@ from pygmin.optimize import mylbfgs
 from pygmin.transition_states._nebdriver import NEBDriver
 from pygmin.transition_states import FindTransitionState
 from pygmin.thermodynamics import logproduct_freq2, normalmodes
+from pygmin.potentials import CachedPotential, InstrumentedPotential
 
 __all__ = ["BaseParameters", "Parameters", "dict_copy_update", "BaseSystem"]
 
@@ -51,6 +53,9 @@ class Parameters(BaseParameters):
         self["takestep"] = BaseParameters()
         self.structural_quench_params = BaseParameters()
         self.gui = BaseParameters()
+        self.potential_cache = BaseParameters(enabled=True, maxsize=8)
+        self.potential_instrumentation = BaseParameters(enabled=False)
+        self.staged_quench = BaseParameters(enabled=False, loose_tol=1e-2, window=1.)
         
         
         self.double_ended_connect = BaseParameters()
@@ -73,6 +78,46 @@ def dict_copy_update(dict1, dict2):
     newdict.update(dict2)
     return newdict
 
+def _cached_get_potential(get_potential):
+    """wrap a get_potential method so that the potential is returned in a CachedPotential
+    
+    This is controlled by system.params.potential_cache.  If
+    system.params.potential_instrumentation.enabled is True the result is
+    further wrapped in an InstrumentedPotential.
+    """
+    @functools.wraps(get_potential)
+    def wrapper(self, *args, **kwargs):
+        pot = get_potential(self, *args, **kwargs)
+        try:
+            params = self.params.potential_cache
+        except AttributeError:
+            params = BaseParameters()
+        try:
+            instrument = self.params.potential_instrumentation.get("enabled", False)
+        except AttributeError:
+            instrument = False
+        if pot is None or isinstance(pot, InstrumentedPotential):
+            return pot
+        if not isinstance(pot, CachedPotential) and params.get("enabled", True):
+            pot = CachedPotential(pot, maxsize=params.get("maxsize", 8))
+        if instrument:
+            # all potentials of a system record into the same table
+            stats = self.__dict__.setdefault("_potential_stats", dict())
+            pot = InstrumentedPotential(pot, stats=stats)
+        return pot
+    return wrapper
+
+class _SystemMeta(type):
+    """metaclass which wraps get_potential of every system with _cached_get_potential
+    
+    This way the caching is applied to all systems without the derived classes
+    having to do anything.
+    """
+    def __new__(mcs, name, bases, dct):
+        if "get_potential" in dct:
+            dct["get_potential"] = _cached_get_potential(dct["get_potential"])
+        return type.__new__(mcs, name, bases, dct)
+
 class BaseSystem(object):
     """
     this class defines a base class for a System object
@@ -111,9 +156,25 @@ class BaseSystem(object):
     additionally, it's a very good idea to specify the accuracy in the 
     database using self.params.database.accuracy
     
+    The potential returned by get_potential is automatically wrapped in a
+    CachedPotential, so repeated evaluations at the same coordinates are
+    free.  This can be turned off with self.params.potential_cache.enabled = False
+    
+    Setting self.params.potential_instrumentation.enabled = True wraps it
+    further in an InstrumentedPotential, which records the potential calls by
+    caller.  BasinHopping.run and DoubleEndedConnect.connect then report a
+    summary at the end.
+    
+    Setting self.params.staged_quench.enabled = True makes get_basinhopping
+    converge each quench to loose_tol first, and to the tolerance of
+    structural_quench_params only if the minimum is within window of the
+    Markov energy or the lowest minimum, or is kept.  See StagedQuench.
+    
     See the method documentation for more information and relevant links
     
     """
+    __metaclass__ = _SystemMeta
+
     def __init__(self, *args, **kwargs):
         self.params = Parameters()
         
@@ -129,9 +190,16 @@ class BaseSystem(object):
     def get_potential(self):
         """return the potential object
         
+        Notes
+        -----
+        derived classes should return the bare potential.  It is wrapped in a
+        CachedPotential automatically unless params.potential_cache.enabled
+        is False.
+        
         See Also
         --------
         pygmin.potentials
+        pygmin.potentials.CachedPotential
         """
         raise NotImplementedError
 
@@ -145,10 +213,14 @@ class BaseSystem(object):
         return quencher(coords)
     
     def get_minimizer(self, **kwargs):
-        """return a function to minimize the structure"""
+        """return a function to minimize the structure
+        
+        keyword arguments of the returned function, e.g. abort_criterion,
+        are passed on to the minimizer
+        """
         pot = self.get_potential()
         kwargs = dict_copy_update(self.params["structural_quench_params"], kwargs)        
-        return lambda coords: mylbfgs(coords, pot, **kwargs)
+        return lambda coords, **kw: mylbfgs(coords, pot, **dict_copy_update(kwargs, kw))
     
     def get_compare_exact(self):
         """object that returns True if two structures are exact.
@@ -221,6 +293,10 @@ class BaseSystem(object):
         """return the basinhopping object with takestep
         and accept step already implemented
         
+        if abort_quench is given, e.g. in params.basinhopping, BasinHopping
+        passes it to the minimizer as abort_criterion.  If
+        params.staged_quench.enabled is True the quench is a StagedQuench.
+        
         See Also
         --------
         pygmin.basinhopping
@@ -235,7 +311,18 @@ class BaseSystem(object):
             if database is None:
                 database = self.create_database()
             add_minimum = database.minimum_adder()
-        bh = basinhopping.BasinHopping(coords, pot, takestep, quench=self.get_minimizer(),
+        
+        staged = self.params.staged_quench
+        if staged.get("enabled", False):
+            if database is None:
+                database = getattr(add_minimum, "db", None)
+            loose_quench = self.get_minimizer(tol=staged.get("loose_tol", 1e-2))
+            quench = basinhopping.StagedQuench(loose_quench, self.get_minimizer(), 
+                                               window=staged.get("window", 1.),
+                                               database=database)
+        else:
+            quench = self.get_minimizer()
+        bh = basinhopping.BasinHopping(coords, pot, takestep, quench=quench,
                                        storage=add_minimum,
                                        **kwargs)
         return bh
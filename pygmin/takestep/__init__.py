@@ -58,6 +58,7 @@ Building blocks to design custom takestep routines
     uniform_displace
     rotate
     reduced_coordinates_displace
+    energy_weighted_choice
     
 
 The takestep interface
@@ -50,6 +50,10 @@ class AdaptiveStepsize(TakestepInterface):
     def takeStep(self, coords, **kwargs):
         self.nsteps_tot += 1
         self.stepclass.takeStep(coords)
+
+    @property
+    def moved_atoms(self):
+        return getattr(self.stepclass, "moved_atoms", None)
         
     def updateStep(self, accepted, **kwargs):
         """tell us whether a step was accepted or rejected"""
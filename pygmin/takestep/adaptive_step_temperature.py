@@ -77,6 +77,10 @@ class AdaptiveStepsizeTemperature(TakestepInterface):
         basinhopping calls this to take a step
         """
         self.stepclass.takeStep(*args, **kwargs)
+
+    @property
+    def moved_atoms(self):
+        return getattr(self.stepclass, "moved_atoms", None)
     
     def updateStep(self, accepted, driver=None):
         """
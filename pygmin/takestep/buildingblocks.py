@@ -2,7 +2,8 @@ import numpy as np
 from pygmin.utils import rotations
 from pygmin.utils import vec3
 
-__all__ = ["uniform_displace", "rotate", "reduced_coordinates_displace"]
+__all__ = ["uniform_displace", "rotate", "reduced_coordinates_displace",
+           "energy_weighted_choice"]
 
 def uniform_displace(stepsize, coords, indices=None):
     '''uniform random displacement
@@ -34,12 +35,13 @@ def rotate(stepsize, coords, indices=None):
     
     '''
     if(indices):
-        for i in indices:
-            rotations.takestep_aa( coords[i], stepsize )
+        indices = np.asarray(indices)
+        coords[indices] = rotations.rotate_aa_many(
+                coords[indices], rotations.small_random_aa_many(len(indices), stepsize))
         return
     
-    for x in coords:
-        rotations.takestep_aa( x, stepsize )
+    coords[:] = rotations.rotate_aa_many(
+            coords, rotations.small_random_aa_many(len(coords), stepsize))
         
 def reduced_coordinates_displace(stepsize, lattice_matrix, coords, indices=None):
     '''uniform random displacement of reduced coordinates
@@ -61,4 +63,28 @@ def reduced_coordinates_displace(stepsize, lattice_matrix, coords, indices=None)
     for x in coords:
         x += np.dot(ilattice, stepsize * rotations.vector_random_uniform_hypersphere(3))
    
-    
\ No newline at end of file
+    
+
+def energy_weighted_choice(energies, temperature, atoms=None):
+    '''choose an atom with probability proportional to exp(E_i / temperature)
+    
+    This favours atoms with a high energy, e.g. from getEnergyPerAtom
+    
+    Parameters
+    ----------
+    energies : array
+        the energies of the atoms
+    temperature : float
+        the larger the temperature the weaker the bias
+    atoms : array, optional
+        if given, choose only from these atoms
+    '''
+    energies = np.asarray(energies)
+    if atoms is None:
+        atoms = np.arange(len(energies))
+    else:
+        atoms = np.asarray(atoms)
+        energies = energies[atoms]
+    w = np.exp((energies - energies.max()) / temperature)
+    cumw = np.cumsum(w)
+    return atoms[np.searchsorted(cumw, np.random.uniform(0, cumw[-1]), side="right")]
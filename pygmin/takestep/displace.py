@@ -11,6 +11,12 @@ from pygmin.utils import rotations
 __all__ = ["RandomDisplacement", "UniformDisplacement", 
            "RotationalDisplacement", "RandomCluster"]
 
+def _atoms_in_slice(coords, srange):
+    """return the indices of the atoms touched by the slice srange, or None for all atoms"""
+    if srange is None:
+        return None
+    return np.unique(np.arange(len(coords))[srange] / 3)
+
 class RandomDisplacement(TakestepSlice):
     '''Random displacement on each individual coordinate
     
@@ -28,6 +34,7 @@ class RandomDisplacement(TakestepSlice):
         TakestepSlice.__init__(self, stepsize=stepsize)
     def takeStep(self, coords, **kwargs):
         coords[self.srange] += np.random.uniform(low=-self.stepsize, high=self.stepsize, size=coords[self.srange].shape)
+        self.moved_atoms = _atoms_in_slice(coords, self.srange)
             
 class UniformDisplacement(TakestepSlice):        
     '''Displace each atom be a uniform random vector
@@ -39,6 +46,7 @@ class UniformDisplacement(TakestepSlice):
         c = coords[self.srange]        
         for x in c.reshape(c.size/3,3):
             x += self.stepsize * rotations.vector_random_uniform_hypersphere(3)
+        self.moved_atoms = _atoms_in_slice(coords, self.srange)
 
 class RotationalDisplacement(TakestepSlice):
     '''Random rotation for angle axis vector
@@ -1,7 +1,17 @@
 __all__ = ["TakestepInterface", "Takestep", "TakestepSlice"]
 
 class TakestepInterface(object):
-    '''Interface for step taking classes'''
+    '''Interface for step taking classes
+    
+    Attributes
+    ----------
+    moved_atoms : array or None
+        after takeStep, the indices of the atoms which were moved, or None if
+        this is not known.  If it is known, MonteCarlo computes only the change
+        in energy due to the moved atoms, see BasePotential.  Atoms are
+        assumed to have 3 coordinates.
+    '''
+    moved_atoms = None
     
     def takeStep(self, coords, **kwargs):
         '''take a step
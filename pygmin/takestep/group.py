@@ -4,6 +4,8 @@ Created on Jun 7, 2012
 @author: vr274
 '''
 
+import numpy as np
+
 from .generic import TakestepInterface
 
 __all__ = ["GroupSteps", "BlockMoves", "Reseeding"]
@@ -25,6 +27,14 @@ class GroupSteps(TakestepInterface):
     def takeStep(self, coords, **kwargs):
         for step in self._steptakers:
             step.takeStep(coords, **kwargs)
+
+    @property
+    def moved_atoms(self):
+        """the union of the atoms moved by all steptakers, None if any is unknown"""
+        moved = [getattr(step, "moved_atoms", None) for step in self._steptakers]
+        if any(m is None for m in moved):
+            return None
+        return np.unique(np.concatenate(moved))
        
     def updateStep(self, accepted, **kwargs):
         for step in self._steptakers:
@@ -75,6 +85,12 @@ class BlockMoves(TakestepInterface):
             if(self._current >= len(self._steptakers)):
                 self._current = 0
         self._steptakers[self._current][1].takeStep(coords, **kwargs)
+
+    @property
+    def moved_atoms(self):
+        if not self._steptakers:
+            return None
+        return getattr(self._steptakers[self._current][1], "moved_atoms", None)
        
     def updateStep(self, accepted, **kwargs):
         self._steptakers[self._current][1].updateStep(accepted, **kwargs)
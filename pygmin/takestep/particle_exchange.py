@@ -2,6 +2,7 @@ import numpy as np
 import random
 
 from pygmin.takestep.generic import Takestep
+from pygmin.takestep.buildingblocks import energy_weighted_choice
 
 __all__ = ["ParticleExchange"]
 
@@ -17,18 +18,34 @@ class ParticleExchange(Takestep):
         the indices of the atoms in each of the groups
     verbose : bool
         print debugging info
+    pot : potential, optional
+        if given, the atoms are not chosen uniformly but with probability
+        proportional to exp(E_i / bias_temperature), where E_i is the energy
+        of atom i from pot.getEnergyPerAtom.  This favours swapping atoms
+        which are in unfavourable environments, at the cost of one
+        getEnergyPerAtom call per step.
+    bias_temperature : float
+        the strength of the bias.  Smaller values favour high energy atoms
+        more strongly
     """
-    def __init__(self, Alist, Blist, verbose=False):
+    def __init__(self, Alist, Blist, verbose=False, pot=None, bias_temperature=1.):
         self.Alist = np.array(Alist)
         self.Blist = np.array(Blist)
         self.verbose = verbose
+        self.pot = pot
+        self.bias_temperature = bias_temperature
         
         self.naccept = 0
         self.ntry = 0
 
     def takeStep(self, coords, **kwargs):
-        iA = random.choice(self.Alist)
-        iB = random.choice(self.Blist)
+        if self.pot is None:
+            iA = random.choice(self.Alist)
+            iB = random.choice(self.Blist)
+        else:
+            energies = self.pot.getEnergyPerAtom(coords)
+            iA = energy_weighted_choice(energies, self.bias_temperature, self.Alist)
+            iB = energy_weighted_choice(energies, self.bias_temperature, self.Blist)
         if self.verbose:
             print "exchange atoms", iA, iB, "accepted", self.naccept, "out of", self.ntry
         
@@ -36,6 +53,7 @@ class ParticleExchange(Takestep):
         temp = coords[iA,:].copy()
         coords[iA,:] = coords[iB,:]
         coords[iB,:] = temp
+        self.moved_atoms = np.array([iA, iB])
         self.ntry += 1
         return coords
     
@@ -68,6 +86,15 @@ class TestParticleExchange(unittest.TestCase):
         sB = x[self.step.Blist,:].sum()
         self.assertEqual(sB, 3)
 
+    def test_biased(self):
+        class Pot(object):
+            """atom 3 and atom 4 have by far the highest energies"""
+            def getEnergyPerAtom(self, coords):
+                return np.array([0., 0., 0., 100., 100., 0.])
+        step = ParticleExchange(self.step.Alist, self.step.Blist, pot=Pot())
+        step.takeStep(self.x.astype(float))
+        self.assertEqual(sorted(step.moved_atoms), [3, 4])
+
 if __name__ == "__main__":
     unittest.main()
         
\ No newline at end of file
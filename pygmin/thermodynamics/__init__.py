@@ -15,7 +15,9 @@ normal mode analysis
    :toctree: generated/
 
     normalmode_frequencies
+    normalmodes
     logproduct_freq2
+    logproduct_freq2_sparse
 
 Heat Capacity
 +++++++++++++
@@ -1,24 +1,48 @@
 import numpy as np
+import scipy.sparse
 
 from pygmin.utils.hessian import sort_eigs
 
-__all__ = ["normalmode_frequencies", "normalmodes", "logproduct_freq2"]
+__all__ = ["normalmode_frequencies", "normalmodes", "logproduct_freq2",
+           "logproduct_freq2_sparse"]
 
-def normalmode_frequencies(hessian, metric=None, eps=1e-4):
+def _lowest_modes_sparse(hessian, metric, nmodes, return_eigenvectors):
+    """return the nmodes lowest (squared) frequencies of a sparse hessian with eigsh
+    
+    with a metric tensor this solves the generalized problem H v = f G v,
+    which has the same eigenvalues as G^-1 H
+    """
+    import scipy.sparse.linalg
+    res = scipy.sparse.linalg.eigsh(scipy.sparse.csc_matrix(hessian), k=nmodes, M=metric, 
+                                    which="SA", return_eigenvectors=return_eigenvectors)
+    if not return_eigenvectors:
+        return np.sort(res)
+    return sort_eigs(*res)
+
+def normalmode_frequencies(hessian, metric=None, eps=1e-4, nmodes=None):
     '''calculate (squared) normal mode frequencies
     
     Parameters
     ----------
-    hessian: 2d array
+    hessian: 2d array or scipy.sparse matrix
         hessian matrix
     metric: 2d array
         mass weighted metric tensor
+    nmodes: int, optional
+        if given and the hessian is sparse, only the nmodes lowest
+        frequencies are computed with a sparse eigensolver and the hessian
+        is never converted to a dense matrix.  The full spectrum needs the
+        dense matrix.
         
     Returns
     -------
     sorted array of normal mode frequencies
     
     '''
+    if scipy.sparse.issparse(hessian):
+        if nmodes is not None and nmodes < hessian.shape[0] - 1:
+            return _lowest_modes_sparse(hessian, metric, nmodes, False)
+        hessian = hessian.toarray()
     A = hessian
     if metric is not None:
         A = np.dot(np.linalg.pinv(metric), hessian)
@@ -32,12 +56,12 @@ def normalmode_frequencies(hessian, metric=None, eps=1e-4):
     
     return np.sort(np.real(frq))
 
-def normalmodes(hessian, metric=None, eps=1e-4, symmetric=False):
+def normalmodes(hessian, metric=None, eps=1e-4, symmetric=False, nmodes=None):
     '''calculate (squared) normal mode frequencies and normal mode vectors
     
     Parameters
     ----------
-    hessian: array
+    hessian: array or scipy.sparse matrix
         hessian marix
     metric: array
         mass weighted metric tensor
@@ -45,12 +69,22 @@ def normalmodes(hessian, metric=None, eps=1e-4, symmetric=False):
         If true, the Hessian times the metric tensor is assumed to be symmetric.  This is
         not usually the case, even if the metric tensor is symmetric.  It is
         true if the metric tensor is the identity.  
+    nmodes: int, optional
+        if given and the hessian is sparse, only the nmodes lowest modes are
+        computed with a sparse eigensolver and the hessian is never
+        converted to a dense matrix.  All the modes together are a dense
+        matrix of the size of the hessian, so the full calculation converts
+        it.
         
     Returns
     -------
     freq, evecs tuple array of squared frequencies and normal modes
     
     '''
+    if scipy.sparse.issparse(hessian):
+        if nmodes is not None and nmodes < hessian.shape[0] - 1:
+            return _lowest_modes_sparse(hessian, metric, nmodes, True)
+        hessian = hessian.toarray()
     if metric is None:
         A = hessian
         symmetric = True
@@ -114,3 +148,139 @@ def logproduct_freq2(freqs, nzero, nnegative=0, eps=1e-4):
                          "number (not a minimum / transition state?)")
 
     return n, lnf
+
+
+def logproduct_freq2_sparse(hessian, zero_modes, nnegative=0, eps=1e-4):
+    ''' calculate the log product of positive (squared) frequencies without diagonalizing the hessian
+    
+    For large systems with a sparse hessian this is much cheaper than
+    normalmode_frequencies followed by logproduct_freq2.  If the zero modes
+    are the orthonormal columns of Z, and S is a set of len(zero_modes)
+    coordinates, the determinant of the hessian with the rows and columns of
+    S removed is the product of the nonzero eigenvalues times det(Z_S)**2.
+    The reduced matrix is factorized with a sparse LU decomposition, and S is
+    chosen by a pivoted QR decomposition of Z so that det(Z_S) is not small.
+    The few lowest eigenvalues are computed with a sparse eigensolver to
+    check the number of negative and zero eigenvalues, as in logproduct_freq2.
+    
+    The metric tensor is taken to be the identity, i.e. the coordinates must
+    be (mass weighted) cartesian.
+    
+    Parameters
+    ----------
+    hessian: array or scipy.sparse matrix
+        hessian matrix
+    zero_modes: list of arrays
+        vectors which span the zero eigenvalue modes, e.g. from
+        pygmin.transition_states.zeroev.zeroEV_cluster.  They need not be
+        orthonormal.
+    nnegative: int, optional
+        expected number of negative frequencies, 0 for minimum, 1 for transition states
+    eps: float, optional
+        cutoff to determine if eigenvalue is no zero
+        
+    Returns
+    -------
+    tuple of number of considered frequencies and log product of frequencies
+    
+    See Also
+    --------
+    logproduct_freq2
+    '''
+    import scipy.linalg
+    import scipy.sparse.linalg
+    hessian = scipy.sparse.csc_matrix(hessian)
+    ndof = hessian.shape[0]
+    nzero = len(zero_modes)
+    
+    if nzero > 0:
+        Z = np.linalg.qr(np.array(zero_modes, dtype=float).reshape(nzero, ndof).T)[0]
+        R, piv = scipy.linalg.qr(Z.T, mode="r", pivoting=True)
+        S = np.sort(piv[:nzero])
+        logdetZS = 2. * np.log(np.abs(np.linalg.det(Z[S,:])))
+    else:
+        S = np.zeros(0, dtype=int)
+        logdetZS = 0.
+    keep = np.setdiff1d(np.arange(ndof), S)
+    reduced = hessian[keep,:][:,keep].tocsc()
+    lu = scipy.sparse.linalg.splu(reduced)
+    logdet = np.sum(np.log(np.abs(lu.U.diagonal())))
+    
+    # the lowest eigenvalues should be nnegative negative ones, then nzero zeros
+    evals = scipy.sparse.linalg.eigsh(hessian, k=nnegative + nzero + 1, which="SA",
+                                      return_eigenvectors=False)
+    evals = np.sort(evals)
+    negative = evals[:nnegative]
+    if np.any(np.abs(evals[nnegative:nnegative + nzero]) > eps) or evals[-1] < eps:
+        raise ValueError("the number of zero eigenvalues differs from the expected value (%d)" % nzero)
+    if np.any(negative > -eps):
+        raise ValueError("the number of negative eigenvalues differs from the expected "
+                         "number (not a minimum / transition state?)")
+    
+    lnf = logdet - logdetZS - np.sum(np.log(-negative))
+    return ndof - nzero - nnegative, lnf
+
+
+#
+# only testing stuff below here
+#
+
+import unittest
+class TestLogproductSparse(unittest.TestCase):
+    def setUp(self):
+        np.random.seed(0)
+        self.ndof = 15
+        self.Q = np.linalg.qr(np.random.normal(size=[self.ndof, self.ndof]))[0]
+
+    def make_hessian(self, evals):
+        return scipy.sparse.csr_matrix(np.dot(self.Q * evals, self.Q.T))
+
+    def test_minimum(self):
+        evals = np.concatenate([np.zeros(3), np.random.uniform(0.5, 3., self.ndof - 3)])
+        hess = self.make_hessian(evals)
+        # the zero modes need not be orthonormal
+        zero_modes = list(np.dot(self.Q[:,:3], np.random.normal(size=[3,3])).T)
+        n, lnf = logproduct_freq2_sparse(hess, zero_modes)
+        n0, lnf0 = logproduct_freq2(evals, 3)
+        self.assertEqual(n, n0)
+        self.assertAlmostEqual(lnf, lnf0, 8)
+
+    def test_transition_state(self):
+        evals = np.concatenate([[-0.7], np.zeros(2), np.random.uniform(0.5, 3., self.ndof - 3)])
+        hess = self.make_hessian(evals)
+        n, lnf = logproduct_freq2_sparse(hess, list(self.Q[:,1:3].T), nnegative=1)
+        n0, lnf0 = logproduct_freq2(evals, 2, nnegative=1)
+        self.assertEqual(n, n0)
+        self.assertAlmostEqual(lnf, lnf0, 8)
+        self.assertRaises(ValueError, logproduct_freq2_sparse, hess, list(self.Q[:,1:3].T))
+
+class TestNormalmodesSparse(unittest.TestCase):
+    def setUp(self):
+        np.random.seed(0)
+        self.ndof = 30
+        # a sparse, banded hessian
+        d = np.random.uniform(1., 2., self.ndof)
+        off = np.random.uniform(-0.4, 0.4, self.ndof - 1)
+        self.hess = scipy.sparse.diags([off, d, off], [-1, 0, 1]).tocsr()
+        self.metric = np.diag(np.random.uniform(0.5, 2., self.ndof))
+
+    def test_frequencies(self):
+        freqs = normalmode_frequencies(self.hess, nmodes=5)
+        freqs0 = normalmode_frequencies(self.hess.toarray())
+        self.assertEqual(len(freqs), 5)
+        self.assertTrue(np.allclose(freqs, freqs0[:5]))
+
+    def test_metric(self):
+        freqs = normalmode_frequencies(self.hess, metric=self.metric, nmodes=5)
+        freqs0 = normalmode_frequencies(self.hess.toarray(), metric=self.metric)
+        self.assertTrue(np.allclose(freqs, freqs0[:5]))
+
+    def test_modes(self):
+        freqs, evecs = normalmodes(self.hess, nmodes=4)
+        freqs0, evecs0 = normalmodes(self.hess.toarray())
+        self.assertTrue(np.allclose(freqs, freqs0[:4]))
+        for i in xrange(4):
+            self.assertAlmostEqual(np.abs(np.dot(evecs[:,i], evecs0[:,i])), 1., 6)
+
+if __name__ == "__main__":
+    unittest.main()
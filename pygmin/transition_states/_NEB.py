@@ -219,6 +219,11 @@ class NEB(object):
             for i in xrange(1, self.nimages-1):
                 pot = self.potential_list[i]
                 self.energies[i], realgrad[i,:] = pot.getEnergyGradient(coordsall[i,:])
+        elif hasattr(self.potential, "getEnergyGradientMany"):
+            # evaluate all the images in one call
+            energies, grads = self.potential.getEnergyGradientMany(coordsall[1:self.nimages-1,:])
+            self.energies[1:self.nimages-1] = energies
+            realgrad[1:self.nimages-1,:] = grads
         else:
             for i in xrange(1, self.nimages-1):
                 self.energies[i], realgrad[i,:] = self.potential.getEnergyGradient(coordsall[i,:])
@@ -34,7 +34,9 @@ class LowestEigPot(basepot):
         eigenvectors with zero eigenvalues.  The default assumes global
         translational and rotational symmetry
     dx : float
-        the local curvature is approximated using 3 points separated by dx
+        the local curvature is approximated using 3 points separated by dx.
+        This is only used if the potential can't compute the product of the
+        Hessian with a vector analytically
     """
     def __init__(self, coords, pot, orthogZeroEigs=0, dx=1e-3):
         self.coords = np.copy(coords)
@@ -62,15 +64,21 @@ class LowestEigPot(basepot):
 
         #now normalize
         vec = vec_in / np.linalg.norm(vec_in)
-        coordsnew = self.coords - self.diff * vec
-        Eminus, Gminus = self.pot.getEnergyGradient(coordsnew)
-        
-        coordsnew = self.coords + self.diff * vec
-        Eplus, Gplus = self.pot.getEnergyGradient(coordsnew)
-        
-        #diag = (Eplus + Eminus -2.0 * self.E) / (self.diff**2, vecl)
+        if hasattr(self.pot, "getHessianVectorProduct"):
+            # this is exact if the potential implements it analytically, 
+            # otherwise it is the same finite difference as below
+            hv = self.pot.getHessianVectorProduct(self.coords, vec, eps=self.diff)
+        else:
+            coordsnew = self.coords - self.diff * vec
+            Eminus, Gminus = self.pot.getEnergyGradient(coordsnew)
+            
+            coordsnew = self.coords + self.diff * vec
+            Eplus, Gplus = self.pot.getEnergyGradient(coordsnew)
+            
+            #diag = (Eplus + Eminus -2.0 * self.E) / (self.diff**2, vecl)
+            hv = (Gplus - Gminus) / (2.0 * self.diff)
         
-        diag2 = np.sum((Gplus - Gminus) * vec) / (2.0 * self.diff)
+        diag2 = np.sum(hv * vec)
         
         """
         DIAG3=2*(DIAG-DIAG2/2)
@@ -79,7 +87,7 @@ class LowestEigPot(basepot):
         """
         
         #GL(J1)=(GRAD1(J1)-GRAD2(J1))/(ZETA*VECL**2)-2.0D0*DIAG2*LOCALV(J1)/VECL**2
-        grad = (Gplus - Gminus) / (self.diff * vecl**2) - 2.0 * diag2 * vec / vecl**2
+        grad = 2.0 * hv / vecl**2 - 2.0 * diag2 * vec / vecl**2
         if self.orthogZeroEigs is not None:
             grad = self.orthogZeroEigs(grad, self.coords)
         """
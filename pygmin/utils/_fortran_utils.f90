@@ -142,3 +142,256 @@ subroutine check_neighbor_lists(coordsold, coords, natoms, atomlist, natomlist,
       endif
    enddo
 end subroutine check_neighbor_lists
+
+!
+! cell list (linked cell) neighbor list builders.
+!
+! The atoms are binned into cells of side at least rlist, so that all
+! neighbors of an atom are in the same or an adjacent cell.  The cost of
+! building the list is then linear in the number of atoms rather than
+! quadratic.  The list is written to list as in the routines above.  nlist
+! returns the total number of pairs found, even if that is more than fit in
+! list, so the caller can check nlist*2 > nlistmax and try again with a
+! larger list.
+!
+
+subroutine setup_cell_grid(coords, natoms, atomlist, natomlist, rlist, periodic, boxl, ncell, xmin, cellsize)
+! determine the number of cells in each dimension, the cell size and the
+! origin of the grid.  For periodic systems the grid spans the box.  For
+! open boundaries the grid spans the bounding box of the atoms in atomlist
+implicit none
+integer(kind=8), intent(in) :: natoms, natomlist, atomlist(natomlist)
+double precision, intent(in) :: coords(3*natoms), rlist, boxl
+logical, intent(in) :: periodic
+integer(kind=8), intent(out) :: ncell(3)
+double precision, intent(out) :: xmin(3), cellsize(3)
+double precision xmax(3), boxlen(3)
+integer(kind=8) k, j, maxcells, i
+
+if (periodic) then
+   xmin(:) = 0.d0
+   boxlen(:) = boxl
+else
+   j = atomlist(1)
+   xmin(:) = coords(3*j+1 : 3*j+3)
+   xmax(:) = xmin(:)
+   do k=2,natomlist
+      j = atomlist(k)
+      xmin(:) = min(xmin(:), coords(3*j+1 : 3*j+3))
+      xmax(:) = max(xmax(:), coords(3*j+1 : 3*j+3))
+   enddo
+   boxlen(:) = xmax(:) - xmin(:)
+endif
+
+do i=1,3
+   ncell(i) = max(1_8, int(boxlen(i) / rlist, 8))
+enddo
+
+if (.not. periodic) then
+   ! don't let a few far flung atoms blow up the number of empty cells
+   maxcells = 8*natomlist + 27
+   do while (ncell(1)*ncell(2)*ncell(3) .gt. maxcells)
+      i = maxloc(ncell, 1)
+      ncell(i) = max(1_8, ncell(i) / 2)
+   enddo
+endif
+
+do i=1,3
+   if (boxlen(i) .gt. 0.d0) then
+      cellsize(i) = boxlen(i) / ncell(i)
+   else
+      cellsize(i) = rlist
+   endif
+enddo
+end subroutine setup_cell_grid
+
+subroutine get_cell_index(x, ncell, xmin, cellsize, periodic, boxl, icell)
+! return the 0 based index of the cell containing position x
+implicit none
+double precision, intent(in) :: x(3), xmin(3), cellsize(3), boxl
+integer(kind=8), intent(in) :: ncell(3)
+logical, intent(in) :: periodic
+integer(kind=8), intent(out) :: icell
+integer(kind=8) ic(3)
+double precision xwrap(3)
+
+if (periodic) then
+   xwrap(:) = x(:) - boxl * floor(x(:) / boxl)
+else
+   xwrap(:) = x(:)
+endif
+ic(:) = int((xwrap(:) - xmin(:)) / cellsize(:), 8)
+ic(:) = max(0_8, min(ic(:), ncell(:) - 1))
+icell = ic(1) + ncell(1) * (ic(2) + ncell(2) * ic(3))
+end subroutine get_cell_index
+
+subroutine get_neighbor_cells(icell, ncell, periodic, neibcells, nneibcells)
+! return the cells adjacent to icell (including icell itself).  Each cell is
+! listed only once, even for periodic systems with fewer than three cells in
+! a dimension
+implicit none
+integer(kind=8), intent(in) :: icell, ncell(3)
+logical, intent(in) :: periodic
+integer(kind=8), intent(out) :: neibcells(27), nneibcells
+integer(kind=8) ic(3), lo(3), hi(3), jc(3), d1, d2, d3, i
+
+ic(1) = mod(icell, ncell(1))
+ic(2) = mod(icell / ncell(1), ncell(2))
+ic(3) = icell / (ncell(1) * ncell(2))
+do i=1,3
+   if (periodic .and. ncell(i) .lt. 3) then
+      lo(i) = 0
+      hi(i) = ncell(i) - 1
+   else
+      lo(i) = -1
+      hi(i) = 1
+   endif
+enddo
+
+nneibcells = 0
+do d1 = lo(1),hi(1)
+   do d2 = lo(2),hi(2)
+      do d3 = lo(3),hi(3)
+         if (periodic .and. ncell(1) .lt. 3) then
+            jc(1) = d1
+         else
+            jc(1) = ic(1) + d1
+         endif
+         if (periodic .and. ncell(2) .lt. 3) then
+            jc(2) = d2
+         else
+            jc(2) = ic(2) + d2
+         endif
+         if (periodic .and. ncell(3) .lt. 3) then
+            jc(3) = d3
+         else
+            jc(3) = ic(3) + d3
+         endif
+         if (periodic) then
+            jc(:) = modulo(jc(:), ncell(:))
+         else if (any(jc(:) .lt. 0) .or. any(jc(:) .ge. ncell(:))) then
+            cycle
+         endif
+         nneibcells = nneibcells + 1
+         neibcells(nneibcells) = jc(1) + ncell(1) * (jc(2) + ncell(2) * jc(3))
+      enddo
+   enddo
+enddo
+end subroutine get_neighbor_cells
+
+subroutine build_neighbor_list1_cells(coords, natoms, atomlist, natomlist, list, nlistmax, nlist, &
+                                      rlist2, periodic, boxl)
+! cell list version of build_neighbor_list1 and build_neighbor_list1_periodic
+implicit none
+integer(kind=8), intent(in) :: natoms, natomlist, atomlist(natomlist), nlistmax
+double precision, intent(in) :: coords(3*natoms), rlist2, boxl
+logical, intent(in) :: periodic
+integer(kind=8), intent(out) :: list(nlistmax)
+integer(kind=8), intent(out) :: nlist
+integer(kind=8) k1, k2, j1, j2, ncell(3), icell, neibcells(27), nneibcells, n
+integer(kind=8), allocatable :: head(:), next(:), cellof(:)
+double precision xmin(3), cellsize(3), r2, dr(3), iboxl
+
+nlist = 0
+if (natomlist .lt. 2) return
+if (periodic) iboxl = 1.d0/boxl
+
+call setup_cell_grid(coords, natoms, atomlist, natomlist, sqrt(rlist2), periodic, boxl, &
+                     ncell, xmin, cellsize)
+allocate(head(0:ncell(1)*ncell(2)*ncell(3)-1), next(natomlist), cellof(natomlist))
+head(:) = 0
+do k1=1,natomlist
+   j1 = atomlist(k1)
+   call get_cell_index(coords(3*j1+1 : 3*j1+3), ncell, xmin, cellsize, periodic, boxl, icell)
+   cellof(k1) = icell
+   next(k1) = head(icell)
+   head(icell) = k1
+enddo
+
+!note that atomlist is indexed as in python, e.g. 0,1,2,
+do k1=1,natomlist
+   j1 = atomlist(k1)
+   call get_neighbor_cells(cellof(k1), ncell, periodic, neibcells, nneibcells)
+   do n=1,nneibcells
+      k2 = head(neibcells(n))
+      do while (k2 .gt. 0)
+         if (k2 .lt. k1) then
+            j2 = atomlist(k2)
+            dr = (coords(3*(j1)+1 : 3*(j1)+3) - coords(3*(j2)+1 : 3*(j2)+3))
+            if (periodic) dr = dr - boxl * nint( dr * iboxl )
+            r2 = sum( dr**2 )
+            if (r2 .le. rlist2) then
+               if (nlist*2+2 .le. nlistmax) then
+                  list(nlist*2+1) = j1
+                  list(nlist*2+2) = j2
+               endif
+               nlist = nlist + 1
+            endif
+         endif
+         k2 = next(k2)
+      enddo
+   enddo
+enddo
+deallocate(head, next, cellof)
+end subroutine build_neighbor_list1_cells
+
+subroutine build_neighbor_list2_cells(coords, natoms, Alist, nAlist, Blist, nBlist, list, nlistmax, nlist, &
+                                      rlist2, periodic, boxl)
+! cell list version of build_neighbor_list2 and build_neighbor_list2_periodic
+implicit none
+integer(kind=8), intent(in) :: natoms, nAlist, Alist(nAlist), nBlist, Blist(nBlist), nlistmax
+double precision, intent(in) :: coords(3*natoms), rlist2, boxl
+logical, intent(in) :: periodic
+integer(kind=8), intent(out) :: list(nlistmax)
+integer(kind=8), intent(out) :: nlist
+integer(kind=8) k1, k2, j1, j2, ncell(3), icell, neibcells(27), nneibcells, n
+integer(kind=8), allocatable :: head(:), next(:), ABlist(:)
+double precision xmin(3), cellsize(3), r2, dr(3), iboxl
+
+nlist = 0
+if (nAlist .lt. 1 .or. nBlist .lt. 1) return
+if (periodic) iboxl = 1.d0/boxl
+
+! the grid must cover both sets of atoms
+allocate(ABlist(nAlist + nBlist))
+ABlist(1:nAlist) = Alist(:)
+ABlist(nAlist+1:) = Blist(:)
+call setup_cell_grid(coords, natoms, ABlist, nAlist + nBlist, sqrt(rlist2), periodic, boxl, &
+                     ncell, xmin, cellsize)
+deallocate(ABlist)
+
+! bin the B atoms
+allocate(head(0:ncell(1)*ncell(2)*ncell(3)-1), next(nBlist))
+head(:) = 0
+do k2=1,nBlist
+   j2 = Blist(k2)
+   call get_cell_index(coords(3*j2+1 : 3*j2+3), ncell, xmin, cellsize, periodic, boxl, icell)
+   next(k2) = head(icell)
+   head(icell) = k2
+enddo
+
+!note that Alist is indexed as in python, e.g. 0,1,2,
+do k1=1,nAlist
+   j1 = Alist(k1)
+   call get_cell_index(coords(3*j1+1 : 3*j1+3), ncell, xmin, cellsize, periodic, boxl, icell)
+   call get_neighbor_cells(icell, ncell, periodic, neibcells, nneibcells)
+   do n=1,nneibcells
+      k2 = head(neibcells(n))
+      do while (k2 .gt. 0)
+         j2 = Blist(k2)
+         dr = (coords(3*(j1)+1 : 3*(j1)+3) - coords(3*(j2)+1 : 3*(j2)+3))
+         if (periodic) dr = dr - boxl * nint( dr * iboxl )
+         r2 = sum( dr**2 )
+         if (r2 .le. rlist2) then
+            if (nlist*2+2 .le. nlistmax) then
+               list(nlist*2+1) = j1
+               list(nlist*2+2) = j2
+            endif
+            nlist = nlist + 1
+         endif
+         k2 = next(k2)
+      enddo
+   enddo
+enddo
+deallocate(head, next)
+end subroutine build_neighbor_list2_cells
@@ -7,6 +7,7 @@ tools for dealing with frozen atoms.  Especially in relation to neighbor lists
     :toctree: generated/
     
     FreezePot
+    FrozenPotWrapper
     makeBLJNeighborListPotFreeze
     
 """
@@ -18,9 +19,15 @@ from pygmin.potentials.ljcut import LJCut
 from pygmin.utils.neighbor_list import NeighborListSubsetBuild, NeighborListPotentialBuild
 from pygmin.utils.neighbor_list import NeighborListPotentialMulti
 
-__all__ = ["makeBLJNeighborListPotFreeze", "FreezePot"]
+__all__ = ["makeBLJNeighborListPotFreeze", "FreezePot", "FrozenPotWrapper"]
 
 
+def _get_1d_indices(atomlist):
+    """return the sorted indices of the x, y, z coordinates of the atoms in atomlist"""
+    atomlist = np.asarray(atomlist, dtype=int).reshape(-1)
+    indices = 3 * atomlist[:,np.newaxis] + np.arange(3)[np.newaxis,:]
+    return np.sort(indices.reshape(-1))
+
 class MultiComponentSystemFreeze(basepot):
     """
     a potential wrapper for multiple potentials with frozen particles
@@ -34,11 +41,18 @@ class MultiComponentSystemFreeze(basepot):
         a list of potential objects that include mobile atoms
     potentials_frozen :
         a list of potentials including only frozen atoms
+    reference_coords : array, optional
+        if given, the frozen-frozen energy is computed from these coordinates
+        immediately.  Otherwise it is computed at the first call.
     """
-    def __init__(self, potentials_mobile, potentials_frozen):
+    def __init__(self, potentials_mobile, potentials_frozen, reference_coords=None):
         self.potentials = potentials_mobile
         self.potentials_frozen = potentials_frozen
         self.count = 0
+        self.Eff = None
+        self.Eff_per_atom = None
+        if reference_coords is not None:
+            self._setup(reference_coords)
 
     def _setup(self, coords):
         """
@@ -51,7 +65,7 @@ class MultiComponentSystemFreeze(basepot):
             self.Eff += pot.getEnergy(coords)
 
     def getEnergy(self, coords):
-        if self.count == 0:
+        if self.Eff is None:
             self._setup(coords)
         self.count += 1
         E = self.Eff
@@ -60,7 +74,7 @@ class MultiComponentSystemFreeze(basepot):
         return E
 
     def getEnergyGradient(self, coords):
-        if self.count == 0:
+        if self.Eff is None:
             self._setup(coords)
         self.count += 1
         Etot = self.Eff
@@ -71,9 +85,24 @@ class MultiComponentSystemFreeze(basepot):
             gradtot += grad
         return Etot, gradtot
 
+    def getEnergyPerAtom(self, coords):
+        if self.Eff is None:
+            self._setup(coords)
+        if self.Eff_per_atom is None:
+            # computed only here, so the frozen potentials need
+            # getEnergyPerAtom only if it is actually used
+            self.Eff_per_atom = np.zeros(len(coords) / 3)
+            for pot in self.potentials_frozen:
+                self.Eff_per_atom += pot.getEnergyPerAtom(coords)
+        energies = self.Eff_per_atom.copy()
+        for pot in self.potentials:
+            energies += pot.getEnergyPerAtom(coords)
+        return energies
+
 
 
-def makeBLJNeighborListPotFreeze(natoms, frozenlist, ntypeA=None, rcut=2.5, boxl=None):
+def makeBLJNeighborListPotFreeze(natoms, frozenlist, ntypeA=None, rcut=2.5, boxl=None,
+                                 reference_coords=None):
     """
     create the potential object for the kob andersen binary lennard jones with frozeen particles
     
@@ -89,6 +118,13 @@ def makeBLJNeighborListPotFreeze(natoms, frozenlist, ntypeA=None, rcut=2.5, boxl
         the cutoff for the lj potential in units of sigA
     boxl : 
         the box length for periodic box.  None for no periodic boundary conditions
+    reference_coords : array, optional
+        the full coordinates, which fix the positions of the frozen atoms.
+        If given, the returned potential is a FrozenPotWrapper which takes
+        only the coordinates of the mobile atoms, the frozen-frozen energy is
+        computed once here and the frozen atoms are left out of the neighbor
+        list displacement checks.  Otherwise a FreezePot of the full
+        coordinates is returned.
     """
     print "making BLJ neighborlist potential", natoms, ntypeA, rcut, boxl
     #rcut = 2.5
@@ -154,11 +190,21 @@ def makeBLJNeighborListPotFreeze(natoms, frozenlist, ntypeA=None, rcut=2.5, boxl
     
     #wrap the mobile potentials so the check for whether coords needs to be updated
     #can be done all at once
-    mobile_pot = NeighborListPotentialMulti(potlist_mobile, natoms, rcut, boxl=boxl)
+    if reference_coords is not None:
+        # the frozen atoms can't move, so don't check them
+        check_atoms = np.union1d(mobileA, mobileB).astype(np.int64)
+    else:
+        check_atoms = None
+    mobile_pot = NeighborListPotentialMulti(potlist_mobile, natoms, rcut, boxl=boxl,
+                                            check_atoms=check_atoms)
 
     #wrap the mobile and frozen potentials together
-    mcpot = MultiComponentSystemFreeze([mobile_pot], potlist_frozen)
+    mcpot = MultiComponentSystemFreeze([mobile_pot], potlist_frozen,
+                                       reference_coords=reference_coords)
     
+    if reference_coords is not None:
+        return FrozenPotWrapper(mcpot, reference_coords, frozenlist)
+
     #finally, wrap it once more in a class that will zero the gradients of the frozen atoms
     frozenpot = FreezePot(mcpot, frozenlist, natoms)
     return frozenpot
@@ -194,9 +240,7 @@ class FreezePot(basepot):
         self.mobile1d = self.get_1d_indices(self.mobile_atoms)
 
     def get_1d_indices(self, atomlist):
-        indices = np.array([range(3*i,3*i+3) for i in atomlist])
-        indices = np.sort(indices.flatten())
-        return indices
+        return _get_1d_indices(atomlist)
 
 
     def getEnergy(self, coords):
@@ -251,10 +295,129 @@ class FreezePot(basepot):
 
 
 
+class FrozenPotWrapper(basepot):
+    """
+    potential wrapper which removes the frozen degrees of freedom
+    
+    Unlike FreezePot, which only zeros the gradient of the frozen atoms, this
+    wrapper takes and returns only the coordinates of the mobile atoms (the
+    reduced coordinates).  They are expanded to the full coordinates only
+    inside the potential call.  Optimizers, takesteps and NEB which are
+    given this potential and reduced coordinates therefore carry only the
+    mobile degrees of freedom.
+    
+    Parameters
+    ----------
+    pot : 
+        the potential object of the full system
+    reference_coords : array
+        the full coordinates.  The frozen atoms stay at these positions.
+    frozen : 
+        a list of frozen particles
+    
+    Examples
+    --------
+    >>> frozenpot = FrozenPotWrapper(pot, coords, frozen)
+    >>> ret = mylbfgs(frozenpot.getReducedCoords(coords), frozenpot)
+    >>> coords = frozenpot.getFullCoords(ret.coords)
+    """
+    def __init__(self, pot, reference_coords, frozen):
+        self.pot = pot
+        self.reference_coords = np.array(reference_coords, dtype=float).reshape(-1)
+        self.natoms = len(self.reference_coords) / 3
+        frozenset_ = set(frozen)
+        self.frozen_atoms = np.array(sorted(frozenset_), dtype=int)
+        self.mobile_atoms = np.array([i for i in range(self.natoms) if i not in frozenset_], dtype=int)
+        self.frozen1d = _get_1d_indices(self.frozen_atoms)
+        self.mobile1d = _get_1d_indices(self.mobile_atoms)
+        self.ndof = len(self.mobile1d)
+
+    def getFullCoords(self, reduced_coords):
+        """return the full coordinates for the coordinates of the mobile atoms"""
+        coords = self.reference_coords.copy()
+        coords[self.mobile1d] = reduced_coords
+        return coords
+
+    def getReducedCoords(self, full_coords):
+        """return the coordinates of the mobile atoms"""
+        return np.asarray(full_coords).reshape(-1)[self.mobile1d]
+
+    def getEnergy(self, reduced_coords):
+        assert len(reduced_coords) == self.ndof
+        return self.pot.getEnergy(self.getFullCoords(reduced_coords))
+
+    def getEnergyGradient(self, reduced_coords):
+        assert len(reduced_coords) == self.ndof
+        e, grad = self.pot.getEnergyGradient(self.getFullCoords(reduced_coords))
+        return e, grad[self.mobile1d]
+
+    def getEnergyPerAtom(self, reduced_coords):
+        """return the energies of the mobile atoms, in the order of the reduced coordinates"""
+        assert len(reduced_coords) == self.ndof
+        return self.pot.getEnergyPerAtom(self.getFullCoords(reduced_coords))[self.mobile_atoms]
+
+
+
 #########################################################
 #testing stuff below here
 #########################################################
 
+import unittest
+class TestFrozenPotWrapper(unittest.TestCase):
+    def setUp(self):
+        import pygmin.potentials.ljpshiftfast as ljpshift
+        np.random.seed(0)
+        self.natoms = 40
+        ntypeA = 32
+        boxl = 4.
+        self.frozen = range(0, 24) + range(32, 36)
+        self.coords = np.random.uniform(0, boxl, self.natoms*3)
+        self.blj = ljpshift.LJpshift(self.natoms, ntypeA, rcut=2.5, boxl=boxl)
+        self.pot = makeBLJNeighborListPotFreeze(self.natoms, self.frozen, ntypeA=ntypeA, boxl=boxl,
+                                                reference_coords=self.coords)
+
+    def test_reduced(self):
+        reduced = self.pot.getReducedCoords(self.coords)
+        self.assertEqual(len(reduced), 3 * (self.natoms - len(self.frozen)))
+        self.assertTrue(np.all(self.pot.getFullCoords(reduced) == self.coords))
+        
+        e, g = self.pot.getEnergyGradient(reduced)
+        eblj, gblj = self.blj.getEnergyGradient(self.coords)
+        self.assertAlmostEqual(e, eblj, 6)
+        self.assertLess(np.max(np.abs(g - gblj[self.pot.mobile1d])), 1e-6)
+
+    def test_move(self):
+        reduced = self.pot.getReducedCoords(self.coords)
+        reduced += np.random.uniform(-.5, .5, reduced.shape)
+        e = self.pot.getEnergy(reduced)
+        self.assertAlmostEqual(e, self.blj.getEnergy(self.pot.getFullCoords(reduced)), 6)
+
+    def test_energy_per_atom(self):
+        reduced = self.pot.getReducedCoords(self.coords)
+        reduced += np.random.uniform(-.5, .5, reduced.shape)
+        e = self.pot.getEnergy(reduced)
+        # the per atom energies of the full system include the frozen-frozen part
+        eatoms = self.pot.pot.getEnergyPerAtom(self.pot.getFullCoords(reduced))
+        self.assertEqual(len(eatoms), self.natoms)
+        self.assertAlmostEqual(eatoms.sum(), e, 6)
+        emobile = self.pot.getEnergyPerAtom(reduced)
+        self.assertEqual(len(emobile), self.natoms - len(self.frozen))
+        self.assertTrue(np.allclose(emobile, eatoms[self.pot.mobile_atoms]))
+
+    def test_no_energy_per_atom(self):
+        """the frozen potentials need no getEnergyPerAtom for the energy"""
+        from pygmin.potentials import BasePotential, LJ
+        class Harmonic(BasePotential):
+            def getEnergy(self, coords):
+                return 0.5 * np.dot(coords, coords)
+        pot = MultiComponentSystemFreeze([LJ()], [Harmonic()])
+        e = pot.getEnergy(self.coords)
+        self.assertAlmostEqual(e, LJ().getEnergy(self.coords) + 0.5 * np.dot(self.coords, self.coords), 6)
+        e, g = pot.getEnergyGradient(self.coords)
+        self.assertAlmostEqual(e, pot.getEnergy(self.coords), 10)
+        self.assertRaises(NotImplementedError, pot.getEnergyPerAtom, self.coords)
+
+
 def test(natoms = 40, boxl=4.):
     import pygmin.potentials.ljpshiftfast as ljpshift
     from pygmin.optimize import mylbfgs
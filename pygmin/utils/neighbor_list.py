@@ -12,6 +12,8 @@ classes to build and maintain neighborlists
     NeighborListSubsetBuild
     NeighborListPotentialBuild
     NeighborListPotentialMulti
+    NeighborListTyped
+    NeighborListSubsetTyped
     makeBLJNeighborListPot
 
     
@@ -19,7 +21,7 @@ classes to build and maintain neighborlists
 
 import numpy as np
 
-from pygmin.potentials.potential import potential as basepot
+from pygmin.potentials.potential import potential as basepot, _select_moved_pairs
 import _fortran_utils
 from pygmin.potentials.ljcut import LJCut as LJ
 import pygmin.potentials.ljpshift as ljpshift
@@ -27,7 +29,61 @@ import pygmin.potentials.ljpshift as ljpshift
 
 __all__ = ["NeighborList", "NeighborListSubset", "NeighborListPotential", "MultiComponentSystem", 
            "makeBLJNeighborListPot", "NeighborListSubsetBuild", "NeighborListPotentialBuild", 
-           "NeighborListPotentialMulti"]
+           "NeighborListPotentialMulti", "NeighborListTyped", "NeighborListSubsetTyped"]
+
+def _build_list_cells(coords, rlist2, Alist, Blist=None, boxl=None, nlistbuf=None):
+    """build a neighbor list using cell lists
+    
+    The atoms are binned into cells of side at least rlist, so the cost is
+    linear in the number of atoms.  
+    
+    Parameters
+    ----------
+    coords : array
+    rlist2 : float
+        atoms closer than sqrt(rlist2) are neighbors
+    Alist : array of np.int64
+        the atoms in the list
+    Blist : array of np.int64, optional
+        if not None only pairs between Alist and Blist are returned
+    boxl : float, optional
+        the box length for periodic systems
+    nlistbuf : int, optional
+        the initial guess for the number of pairs.  If it is too small the
+        list will be built a second time with the correct size
+    
+    Returns
+    -------
+    neib_list : array, shape (nlist, 2)
+    """
+    periodic = boxl is not None
+    if nlistbuf is None:
+        nB = len(Alist) if Blist is None else len(Blist)
+        if periodic:
+            # assume a uniform density
+            vlist = 4. / 3. * np.pi * rlist2**1.5
+            nlistbuf = int(1.2 * len(Alist) * nB * min(vlist / boxl**3, 1.))
+            if Blist is None:
+                nlistbuf /= 2
+        else:
+            nlistbuf = 64 * len(Alist)
+    if not periodic:
+        boxl = 1.
+    nlistbuf = max(nlistbuf, 1)
+    while True:
+        if Blist is None:
+            neib_list, nlist = _fortran_utils.build_neighbor_list1_cells(
+                    coords, Alist, nlistbuf*2, rlist2, periodic, boxl)
+        else:
+            neib_list, nlist = _fortran_utils.build_neighbor_list2_cells(
+                    coords, Alist, Blist, nlistbuf*2, rlist2, periodic, boxl)
+        if nlist <= nlistbuf:
+            break
+        # the list was too small.  do it again with the correct size 
+        nlistbuf = nlist
+    neib_list = np.reshape(neib_list, [-1,2])
+    return neib_list[:nlist,:]
+
 
 class NeighborList(object):
     """
@@ -54,9 +110,12 @@ class NeighborList(object):
         self.redo_displacement = self.rskin / 2.
         self.rlist = self.rcut + self.rskin
         self.rlist2 = self.rlist**2
+        self.boxl = boxl
         
-        #natoms = len(coords) / 3
-        self.neib_list = np.array(natoms*(natoms-1), 2)
+        self.atomlist = np.arange(natoms, dtype=np.int64)
+        self.neib_list = np.zeros([0, 2], np.int64)
+        self.nlist = 0
+        self.nlistbuf = None
         
         #self.buildList(coords)
     
@@ -65,22 +124,18 @@ class NeighborList(object):
         return a list of neighbor pairs
         """
         self.buildcount += 1
-        coords = np.reshape(coords, [-1,3])
-        self.oldcoords = np.copy(coords)
-        natoms = len(coords)/3
-        nlist = 0
-        for i in range(natoms):
-            for j in range(i):
-                R2 = sum((coords[i,:] - coords[j,:])**2)
-                if R2 <= self.rlist2:
-                    self.neib_list[nlist,0] = i 
-                    self.neib_list[nlist,1] = j
-                    nlist += 1
-        self.nlist = nlist
+        self.oldcoords = np.copy(np.reshape(coords, [-1,3]))
+        self.neib_list = _build_list_cells(coords, self.rlist2, self.atomlist,
+                                           boxl=self.boxl, nlistbuf=self.nlistbuf)
+        self.nlist = len(self.neib_list)
+        self.nlistbuf = int(1.1 * self.nlist) + 1
     
     def needNewList(self, coords):
         coords = np.reshape(coords, [-1,3])
-        maxR2 = np.max( ((coords - self.oldcoords)**2).sum(1) )
+        dr = coords - self.oldcoords
+        if self.boxl is not None:
+            dr -= self.boxl * np.round(dr / self.boxl)
+        maxR2 = np.max( (dr**2).sum(1) )
         return maxR2 > self.redo_displacement**2
 
     def getList(self, coords):
@@ -143,9 +198,10 @@ class NeighborListSubset(object):
             listmaxlen = len(self.Alist)*(len(self.Alist)-1)/2
         else:
             listmaxlen = len(self.Alist)*len(self.Blist)
-        self.neib_list = np.zeros([listmaxlen, 2], np.integer)
+        self.neib_list = np.zeros([0, 2], np.int64)
         self.nlistmax = listmaxlen
         self.nlist = 0
+        self.nlistbuf = None
         #print "shape neib_list", np.shape(self.neib_list)
         
         self.oldcoords = np.zeros([natoms,3])            
@@ -165,6 +221,17 @@ class NeighborListSubset(object):
             self.Blist = np.array(self.Blist, np.int64)
     
     def buildList(self, coords):
+        self.buildcount += 1
+        self.oldcoords = np.copy(np.reshape(coords,[-1,3]))
+        self.neib_list = _build_list_cells(coords, self.rlist2, self.Alist, self.Blist,
+                                           boxl=self.boxl, nlistbuf=self.nlistbuf)
+        self.nlist = len(self.neib_list)
+        self.nlistbuf = min(int(1.1 * self.nlist) + 1, self.nlistmax)
+    
+    def buildListN2(self, coords):
+        """
+        build the list by checking every pair of atoms
+        """
         #neib_list = np.reshape(self.neib_list, -1)
         self.buildcount += 1
         self.oldcoords = np.copy(np.reshape(coords,[-1,3]))
@@ -195,12 +262,10 @@ class NeighborListSubset(object):
         return a list of neighbor pairs
         """
         self.buildcount += 1
-        if not self.periodic:
-            self.buildListFortran(coords)
-            #return
         #print "rebuilding Neighbor List", self.buildcount
         coords = np.reshape(coords, [-1,3])
         self.oldcoords = np.copy(coords)
+        self.neib_list = np.zeros([self.nlistmax, 2], np.int64)
         nlist = 0
         if self.onelist:
             for k1 in range(len(self.Alist)):
@@ -301,6 +366,36 @@ class NeighborListPotential(basepot):
     def getEnergyGradient(self, coords):
         list = self.neighborList.getList(coords)
         return self.pot.getEnergyGradientList(coords, list)
+    def getEnergyPerAtom(self, coords):
+        list = self.neighborList.getList(coords)
+        return self.pot.getEnergyPerAtomList(coords, list)
+    def getHessianVectorProduct(self, coords, vec, eps=1e-6):
+        if not hasattr(self.pot, "getHessianVectorProductList"):
+            return basepot.getHessianVectorProduct(self, coords, vec, eps=eps)
+        list = self.neighborList.getList(coords)
+        return self.pot.getHessianVectorProductList(coords, vec, list)
+    def getSparseHessian(self, coords):
+        if not hasattr(self.pot, "getSparseHessianList"):
+            return basepot.getSparseHessian(self, coords)
+        list = self.neighborList.getList(coords)
+        return self.pot.getSparseHessianList(coords, list)
+    def getEnergyGradientHessian(self, coords):
+        if not hasattr(self.pot, "getSparseHessianList"):
+            return basepot.getEnergyGradientHessian(self, coords)
+        e, g = self.getEnergyGradient(coords)
+        return e, g, self.getSparseHessian(coords).toarray()
+    def getEnergyChange(self, coords_old, coords_new, moved_atoms):
+        """return the change in energy when only the atoms in moved_atoms have moved
+        
+        if the neighbor list is valid for both sets of coordinates only the
+        listed interactions of the moved atoms are computed
+        """
+        nl = self.neighborList
+        if nl.needNewList(coords_old) or nl.needNewList(coords_new):
+            return self.getEnergy(coords_new) - self.getEnergy(coords_old)
+        list = _select_moved_pairs(nl.getList(coords_new), len(coords_new) / 3, moved_atoms)
+        return (self.pot.getEnergyList(coords_new, list) 
+                - self.pot.getEnergyList(coords_old, list))
 
 
 class NeighborListSubsetBuild(basepot):
@@ -364,6 +459,7 @@ class NeighborListSubsetBuild(basepot):
             listmaxlen = len(self.Alist)*len(self.Blist)
         #self.neib_list = np.zeros([listmaxlen, 2], np.integer)
         self.nlistmax = listmaxlen
+        self.nlistbuf = None
         #self.nlist = 0
         #print "shape neib_list", np.shape(self.neib_list)
 
@@ -375,6 +471,16 @@ class NeighborListSubsetBuild(basepot):
 
 
     def buildList(self, coords):
+        self.buildcount += 1
+        neib_list = _build_list_cells(coords, self.rlist2, self.Alist, self.Blist,
+                                      boxl=self.boxl, nlistbuf=self.nlistbuf)
+        self.nlistbuf = min(int(1.1 * len(neib_list)) + 1, self.nlistmax)
+        return neib_list
+
+    def buildListN2(self, coords):
+        """
+        build the list by checking every pair of atoms
+        """
         #neib_list = np.reshape(self.neib_list, -1)
         self.buildcount += 1
         if self.onelist:
@@ -398,6 +504,128 @@ class NeighborListSubsetBuild(basepot):
         return neib_list[:nlist,:]
 
 
+class NeighborListTyped(object):
+    """
+    a single neighbor list for a system with several types of atoms
+
+    All pairs are found in one cell list build and then split by the types of
+    the two atoms.  This replaces one NeighborListSubset per
+    pair of types, e.g. AA, AB and BB for a binary mixture, which each do
+    their own displacement check and build.
+
+    Parameters
+    ----------
+    natoms :
+        number of atoms
+    rcut :
+        the cutoff distance for the potential
+    atomtypes : list of int
+        the type of each atom, from 0 to ntypes-1
+    rskin :
+        the skin distance.  atoms are listed as
+        neighbors if they are closer then rlist = rcut + rskin.
+    boxl :
+        if not None, then the system is in a periodic box of size boxl
+
+    See Also
+    --------
+    NeighborListSubsetTyped : the list of pairs between two types
+    """
+    def __init__(self, natoms, rcut, atomtypes, rskin=0.5, boxl=None):
+        self.buildcount = 0
+        self.rcut = rcut
+        self.rskin = rskin
+        self.redo_displacement = self.rskin / 2.
+        self.rlist = self.rcut + self.rskin
+        self.rlist2 = self.rlist**2
+        self.boxl = boxl
+
+        self.atomtypes = np.array(atomtypes, np.int64)
+        assert len(self.atomtypes) == natoms
+        self.ntypes = self.atomtypes.max() + 1
+        self.atomlist = np.arange(natoms, dtype=np.int64)
+        self.oldcoords = np.zeros([natoms,3])
+        self.nlist = 0
+        # the pairs for each pair of types, keyed by _key(typeA, typeB)
+        self.typed_lists = dict()
+        self.nlistbuf = None
+        self._needs_build = True
+        # _keytable[typeA * ntypes + typeB] is the key for the pair of types
+        self._keytable = np.array([self._key(a, b) for a in xrange(self.ntypes) 
+                                   for b in xrange(self.ntypes)], np.int64)
+
+    def _key(self, typeA, typeB):
+        return min(typeA, typeB) * self.ntypes + max(typeA, typeB)
+
+    def buildList(self, coords):
+        """build the list and split the pairs by type"""
+        self.buildcount += 1
+        self._needs_build = False
+        self.oldcoords = np.copy(np.reshape(coords, [-1,3]))
+        neib_list = _build_list_cells(coords, self.rlist2, self.atomlist,
+                                      boxl=self.boxl, nlistbuf=self.nlistbuf)
+        self.nlistbuf = int(1.1 * len(neib_list)) + 1
+
+        self.nlist = len(neib_list)
+
+        types = self.atomtypes.take(neib_list.ravel()).reshape(-1,2)
+        keys = self._keytable.take(types[:,0] * self.ntypes + types[:,1])
+        self.typed_lists = dict()
+        for k in np.unique(self._keytable):
+            self.typed_lists[k] = neib_list[keys == k,:]
+
+    def needNewList(self, coords):
+        """
+        check if any atom has moved far enough that we need to redo the neighbor list
+        """
+        if self._needs_build:
+            return True
+        boxl = self.boxl
+        if boxl is None:
+            boxl = 1.
+        rebuild = _fortran_utils.check_neighbor_lists(self.oldcoords.reshape(-1), coords, 
+                                                      self.atomlist, self.redo_displacement, 
+                                                      self.boxl is not None, boxl)
+        return bool(rebuild)
+
+    def getPairs(self, typeA, typeB):
+        """return the pairs between atoms of typeA and typeB from the current list
+
+        The order of the two atoms within a pair is not specified.
+        """
+        if self._needs_build:
+            return np.zeros([0,2], np.int64)
+        return self.typed_lists[self._key(typeA, typeB)]
+
+
+class NeighborListSubsetTyped(object):
+    """
+    the pairs between two types of atoms in a shared NeighborListTyped
+
+    This has the same buildList interface as NeighborListSubsetBuild, so it
+    can be used with NeighborListPotentialBuild.  buildList does not do any
+    building, it only returns the current slice of the shared list.  The shared
+    list must be updated first, which NeighborListPotentialMulti does if it is
+    passed the shared list.
+
+    Parameters
+    ----------
+    neighborList : NeighborListTyped
+        the shared neighbor list
+    typeA, typeB : int
+        the types of the two atoms in the pairs
+    """
+    def __init__(self, neighborList, typeA, typeB):
+        self.neighborList = neighborList
+        self.typeA = typeA
+        self.typeB = typeB
+        self.redo_displacement = neighborList.redo_displacement
+        self.boxl = neighborList.boxl
+
+    def buildList(self, coords):
+        return self.neighborList.getPairs(self.typeA, self.typeB)
+
+
 class NeighborListPotentialBuild(basepot):
     """
     a potential wrapper for a neighbor list, but only rebuild when told to
@@ -412,12 +640,24 @@ class NeighborListPotentialBuild(basepot):
     def __init__(self, neighborList, pot):
         self.neighborList = neighborList
         self.pot = pot
+        self.oldcoords = None
     
     def buildList(self, coords):
         """
         instruct the neighbor list object to rebuild it's list
         """
         self.list = self.neighborList.buildList(coords)
+        self.oldcoords = np.copy(coords).reshape([-1,3])
+
+    def _listValid(self, coords):
+        """return True if no atom has moved too far since the list was built"""
+        if self.oldcoords is None:
+            return False
+        dr = np.reshape(coords, [-1,3]) - self.oldcoords
+        boxl = self.neighborList.boxl
+        if boxl is not None:
+            dr -= boxl * np.round(dr / boxl)
+        return not np.any((dr**2).sum(1) > self.neighborList.redo_displacement**2)
 
     def getEnergy(self, coords):
         return self.pot.getEnergyList(coords, self.list)
@@ -425,6 +665,41 @@ class NeighborListPotentialBuild(basepot):
     def getEnergyGradient(self, coords):
         return self.pot.getEnergyGradientList(coords, self.list)
 
+    def getEnergyPerAtom(self, coords):
+        return self.pot.getEnergyPerAtomList(coords, self.list)
+
+    def getHessianVectorProduct(self, coords, vec, eps=1e-6):
+        if not hasattr(self.pot, "getHessianVectorProductList"):
+            return basepot.getHessianVectorProduct(self, coords, vec, eps=eps)
+        return self.pot.getHessianVectorProductList(coords, vec, self.list)
+
+    def getSparseHessian(self, coords):
+        if not hasattr(self.pot, "getSparseHessianList"):
+            return basepot.getSparseHessian(self, coords)
+        return self.pot.getSparseHessianList(coords, self.list)
+
+    def getEnergyGradientHessian(self, coords):
+        if not hasattr(self.pot, "getSparseHessianList"):
+            return basepot.getEnergyGradientHessian(self, coords)
+        e, g = self.getEnergyGradient(coords)
+        return e, g, self.getSparseHessian(coords).toarray()
+
+    def getEnergyChange(self, coords_old, coords_new, moved_atoms):
+        """return the change in energy when only the atoms in moved_atoms have moved
+        
+        if the current list is not valid for both sets of coordinates the
+        list is rebuilt and the full energies are computed.  The list is
+        left built for coords_new
+        """
+        if not self._listValid(coords_old) or not self._listValid(coords_new):
+            self.buildList(coords_old)
+            eold = self.getEnergy(coords_old)
+            self.buildList(coords_new)
+            return self.getEnergy(coords_new) - eold
+        list = _select_moved_pairs(self.list, len(coords_new) / 3, moved_atoms)
+        return (self.pot.getEnergyList(coords_new, list) 
+                - self.pot.getEnergyList(coords_old, list))
+
 
 class NeighborListPotentialMulti(basepot):
     """
@@ -450,10 +725,25 @@ class NeighborListPotentialMulti(basepot):
         frequently
     boxl : 
         if not None, then the system is in a periodic box of size boxl
+    neighborList : NeighborListTyped, optional
+        a neighbor list shared by the potentials, e.g. through
+        NeighborListSubsetTyped.  If given, it does the check for whether the
+        lists need rebuilding and it is built once before the potentials
+        are asked for their lists.
+    check_atoms : list of int, optional
+        if given, only these atoms are checked when deciding whether the
+        lists need rebuilding.  This is for atoms which cannot move, e.g.
+        frozen atoms, so they are skipped in every displacement check.
         
     """
-    def __init__(self, potentials, natoms, rcut, rskin=0.5, boxl = None):
+    def __init__(self, potentials, natoms, rcut, rskin=0.5, boxl = None, neighborList=None,
+                 check_atoms=None):
         self.potentials = potentials
+        self.neighborList = neighborList
+        if check_atoms is not None:
+            check_atoms = np.array(check_atoms, dtype=np.int64)
+            natoms = len(check_atoms)
+        self.check_atoms = check_atoms
         self.oldcoords = np.zeros([natoms,3])
         self.rcut = rcut
         self.rskin = rskin
@@ -472,7 +762,11 @@ class NeighborListPotentialMulti(basepot):
         self.count = 0
 
     def needNewList(self, coords):
+        if self.neighborList is not None:
+            return self.neighborList.needNewList(coords)
         coords = np.reshape(coords, [-1,3])
+        if self.check_atoms is not None:
+            coords = coords[self.check_atoms]
         if self.periodic:
             #only check periodic boundary conditions for the atoms that fail the normal test
             indices = np.where( ((coords - self.oldcoords)**2).sum(1) > self.redo_displacement**2 )[0]
@@ -489,6 +783,10 @@ class NeighborListPotentialMulti(basepot):
         if self.needNewList(coords):
             self.buildcount += 1
             self.oldcoords = np.copy(coords).reshape([-1,3])
+            if self.check_atoms is not None:
+                self.oldcoords = self.oldcoords[self.check_atoms]
+            if self.neighborList is not None:
+                self.neighborList.buildList(coords)
             for pot in self.potentials:
                 pot.buildList(coords)
     
@@ -509,6 +807,44 @@ class NeighborListPotentialMulti(basepot):
             gradtot += grad
         return Etot, gradtot
 
+    def getEnergyPerAtom(self, coords):
+        self.update(coords)
+        energies = 0.
+        for pot in self.potentials:
+            energies = energies + pot.getEnergyPerAtom(coords)
+        return energies
+
+    def getHessianVectorProduct(self, coords, vec, eps=1e-6):
+        self.update(coords)
+        hv = np.zeros(np.shape(coords))
+        for pot in self.potentials:
+            hv += pot.getHessianVectorProduct(coords, vec, eps=eps)
+        return hv
+
+    def getSparseHessian(self, coords):
+        self.update(coords)
+        hess = self.potentials[0].getSparseHessian(coords)
+        for pot in self.potentials[1:]:
+            hess = hess + pot.getSparseHessian(coords)
+        return hess
+
+    def getEnergyGradientHessian(self, coords):
+        e, g = self.getEnergyGradient(coords)
+        return e, g, self.getSparseHessian(coords).toarray()
+
+    def getEnergyChange(self, coords_old, coords_new, moved_atoms):
+        """return the change in energy when only the atoms in moved_atoms have moved
+        
+        if the neighbor lists are valid for both sets of coordinates only the
+        listed interactions of the moved atoms are computed
+        """
+        if self.needNewList(coords_old) or self.needNewList(coords_new):
+            return self.getEnergy(coords_new) - self.getEnergy(coords_old)
+        dE = 0.
+        for pot in self.potentials:
+            dE += pot.getEnergyChange(coords_old, coords_new, moved_atoms)
+        return dE
+
     
 class MultiComponentSystem(basepot):
     """
@@ -535,9 +871,44 @@ class MultiComponentSystem(basepot):
             gradtot += grad
         return Etot, gradtot
 
+    def getEnergyPerAtom(self, coords):
+        energies = 0.
+        for pot in self.potentials:
+            energies = energies + pot.getEnergyPerAtom(coords)
+        return energies
+
+    def getHessianVectorProduct(self, coords, vec, eps=1e-6):
+        hv = np.zeros(np.shape(coords))
+        for pot in self.potentials:
+            hv += pot.getHessianVectorProduct(coords, vec, eps=eps)
+        return hv
+
+    def getSparseHessian(self, coords):
+        hess = self.potentials[0].getSparseHessian(coords)
+        for pot in self.potentials[1:]:
+            hess = hess + pot.getSparseHessian(coords)
+        return hess
+
+    def getEnergyGradientHessian(self, coords):
+        e, g = self.getEnergyGradient(coords)
+        return e, g, self.getSparseHessian(coords).toarray()
+
+    def getEnergyChange(self, coords_old, coords_new, moved_atoms):
+        """return the change in energy when only the atoms in moved_atoms have moved"""
+        dE = 0.
+        for pot in self.potentials:
+            if hasattr(pot, "getEnergyChange"):
+                dE += pot.getEnergyChange(coords_old, coords_new, moved_atoms)
+            else:
+                dE += pot.getEnergy(coords_new) - pot.getEnergy(coords_old)
+        return dE
+
 def makeBLJNeighborListPot(natoms, ntypeA = None, rcut = 2.5, boxl=None):
     """
     recreate the binary lj with atom typea A,B from 3 interaction lists AA, BB, AB
+    
+    The three lists are slices of a single NeighborListTyped, so there is only
+    one displacement check and one build per update.
     """
     print "making BLJ neighborlist potential", natoms, ntypeA, rcut, boxl
     #rcut = 2.5
@@ -555,20 +926,114 @@ def makeBLJNeighborListPot(natoms, ntypeA = None, rcut = 2.5, boxl=None):
     ljBB = LJ(eps=blj.BB.eps, sig=blj.BB.sig, rcut=rcut*blj.BB.sig, boxl=boxl)
     ljAB = LJ(eps=blj.AB.eps, sig=blj.AB.sig, rcut=rcut*blj.AB.sig, boxl=boxl)
     
-    nlAA = NeighborListSubset(natoms, rcut, Alist, boxl=boxl )
-    nlBB = NeighborListSubset(natoms, rcut, Blist, boxl=boxl )
-    nlAB = NeighborListSubset(natoms, rcut, Alist, Blist, boxl=boxl)
+    atomtypes = [0] * len(Alist) + [1] * len(Blist)
+    nl = NeighborListTyped(natoms, rcut, atomtypes, boxl=boxl)
+    nlAA = NeighborListSubsetTyped(nl, 0, 0)
+    nlBB = NeighborListSubsetTyped(nl, 1, 1)
+    nlAB = NeighborListSubsetTyped(nl, 0, 1)
     
     potlist = [ 
-               NeighborListPotential(nlAA, ljAA),
-               NeighborListPotential(nlBB, ljBB),
-               NeighborListPotential(nlAB, ljAB)
+               NeighborListPotentialBuild(nlAA, ljAA),
+               NeighborListPotentialBuild(nlBB, ljBB),
+               NeighborListPotentialBuild(nlAB, ljAB)
                 ]
-    mcpot = MultiComponentSystem(potlist)
+    mcpot = NeighborListPotentialMulti(potlist, natoms, rcut, boxl=boxl, neighborList=nl)
     return mcpot
 
 
 
+import unittest
+class TestCellList(unittest.TestCase):
+    """check the cell list builder against the build which checks every pair"""
+    def compare(self, natoms, boxl, Blist):
+        if boxl is None:
+            coords = np.random.uniform(-1,1,natoms*3)*(natoms)**(1./3)
+        else:
+            coords = np.random.uniform(-2,2,natoms*3)*boxl
+        Alist = range(int(natoms*0.8))
+        if Blist:
+            Blist = range(int(natoms*0.8), natoms)
+        else:
+            Blist = None
+        nl = NeighborListSubset(natoms, 1.5, Alist, Blist, boxl=boxl)
+        nl.buildList(coords)
+        fast = sorted(tuple(sorted(p)) for p in nl.getList(coords))
+        nl.buildListN2(coords)
+        slow = sorted(tuple(sorted(p)) for p in nl.getList(coords))
+        self.assertEqual(fast, slow)
+        
+    def test_open(self):
+        self.compare(200, None, False)
+    def test_open_AB(self):
+        self.compare(200, None, True)
+    def test_periodic(self):
+        self.compare(200, 6., False)
+    def test_periodic_AB(self):
+        self.compare(200, 6., True)
+    def test_periodic_small_box(self):
+        self.compare(50, 3.5, False)
+
+class TestNeighborListTyped(unittest.TestCase):
+    """check the shared BLJ neighbor list potential against LJpshift"""
+    def compare(self, boxl):
+        import pygmin.potentials.ljpshiftfast as ljpshiftfast
+        natoms = 100
+        ntypeA = 80
+        # a slightly perturbed lattice so no atoms overlap
+        n = int(np.ceil(natoms**(1./3)))
+        x = np.array(np.meshgrid(range(n), range(n), range(n))).reshape(3,-1).T[:natoms]
+        coords = (1.1 * x + np.random.uniform(-0.05, 0.05, x.shape)).reshape(-1)
+        blj = ljpshiftfast.LJpshift(natoms, ntypeA, rcut=2.5, boxl=boxl)
+        pot = makeBLJNeighborListPot(natoms, ntypeA=ntypeA, rcut=2.5, boxl=boxl)
+        for i in xrange(3):
+            e1, g1 = blj.getEnergyGradient(coords)
+            e2, g2 = pot.getEnergyGradient(coords)
+            self.assertAlmostEqual(e1, e2, 6)
+            self.assertLess(np.max(np.abs(g1 - g2)), 1e-6)
+            coords = coords + np.random.uniform(-0.1, 0.1, coords.shape)
+        nl = pot.neighborList
+        self.assertEqual(pot.count, 3)
+        self.assertEqual(nl.buildcount, pot.buildcount)
+        # every pair appears in exactly one of the typed slices
+        npairs = sum(len(nl.getPairs(a, b)) for a, b in [(0,0), (0,1), (1,1)])
+        self.assertEqual(npairs, nl.nlist)
+        types = nl.atomtypes[nl.getPairs(1, 0)]
+        self.assertTrue(np.all(types.sum(1) == 1))
+
+    def test_open(self):
+        self.compare(None)
+    def test_periodic(self):
+        self.compare(8.)
+
+class TestNeighborListHessian(unittest.TestCase):
+    """potentials without the *List hessians fall back to the numerical hessian"""
+    def setUp(self):
+        from pygmin.potentials import LJ
+        from pygmin.optimize import mylbfgs
+        np.random.seed(0)
+        self.natoms = 8
+        self.lj = LJ()
+        x = np.random.uniform(-1, 1, 3 * self.natoms)
+        self.coords = mylbfgs(x, self.lj).coords
+        self.hess = self.lj.getHessian(self.coords)
+
+    def check(self, pot):
+        e, g, hess = pot.getEnergyGradientHessian(self.coords)
+        self.assertAlmostEqual(e, self.lj.getEnergy(self.coords), 8)
+        self.assertLess(np.max(np.abs(hess - self.hess)), 1e-4 * np.max(np.abs(self.hess)))
+        hess = pot.getSparseHessian(self.coords).toarray()
+        self.assertLess(np.max(np.abs(hess - self.hess)), 1e-4 * np.max(np.abs(self.hess)))
+
+    def test_neighbor_list_potential(self):
+        self.check(NeighborListPotential(NeighborList(self.natoms, 3.), self.lj))
+
+    def test_neighbor_list_potential_build(self):
+        nl = NeighborListSubsetBuild(self.natoms, 3., range(self.natoms))
+        pot = NeighborListPotentialBuild(nl, self.lj)
+        pot.buildList(self.coords)
+        self.check(pot)
+
+
 def test(natoms = 40, boxl=None):
     import pygmin.potentials.ljpshiftfast as ljpshift
     from pygmin.optimize import mylbfgs
@@ -607,9 +1072,7 @@ def test(natoms = 40, boxl=None):
     print "rms gradients", np.linalg.norm(g1)/np.sqrt(len(g1)), np.linalg.norm(g2)/np.sqrt(len(g1))
 
     
-    for subpot in pot.potentials:
-        nl = subpot.neighborList
-        print "number of times neighbor list was remade", nl.buildcount, "out of", nl.count
+    print "number of times neighbor list was remade", pot.buildcount, "out of", pot.count
     
     if False:
         try: 
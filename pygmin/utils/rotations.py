@@ -19,6 +19,16 @@ Warning, they have not all been tested in this format.
     mx2aa
     rot_q2mx
     aa2mx
+    q_multiply_many
+    aa2q_many
+    q2aa_many
+    q2mx_many
+    aa2mx_many
+    rot_mat_deriv_many
+    random_q_many
+    random_aa_many
+    small_random_aa_many
+    rotate_aa_many
     random_q
     random_aa
     takestep_aa
@@ -29,6 +39,12 @@ Warning, they have not all been tested in this format.
     vector_random_uniform_hypersphere
     q_slerp
 
+The functions ending in _many are the vectorized versions for stacks of
+rotations.  They take arrays of shape (n,3) (angle axis) or (n,4)
+(quaternions) and return the corresponding stacks, e.g. (n,3,3) for
+rotation matrices.  They follow the same formulas, including the small
+angle expansions, as the single rotation functions.
+
 """
 import numpy as np
 
@@ -171,6 +187,150 @@ def rot_q2mx(qin):
 def aa2mx( p ):
     return q2mx( aa2q( p ) )
 
+def q_multiply_many(q0, q1):
+    """ multiply two stacks of quaternions, shape (n,4) """
+    q0 = np.asarray(q0, dtype=np.float64)
+    q1 = np.asarray(q1, dtype=np.float64)
+    q3 = np.empty(np.broadcast(q0, q1).shape)
+    q3[...,0] = q0[...,0]*q1[...,0]-q0[...,1]*q1[...,1]-q0[...,2]*q1[...,2]-q0[...,3]*q1[...,3]
+    q3[...,1] = q0[...,0]*q1[...,1]+q0[...,1]*q1[...,0]+q0[...,2]*q1[...,3]-q0[...,3]*q1[...,2]
+    q3[...,2] = q0[...,0]*q1[...,2]-q0[...,1]*q1[...,3]+q0[...,2]*q1[...,0]+q0[...,3]*q1[...,1]
+    q3[...,3] = q0[...,0]*q1[...,3]+q0[...,1]*q1[...,2]-q0[...,2]*q1[...,1]+q0[...,3]*q1[...,0]
+    return q3
+
+def aa2q_many(P):
+    """ convert a stack of angle axis vectors, shape (n,3), to quaternions, shape (n,4) """
+    P = np.asarray(P, dtype=np.float64).reshape(-1,3)
+    q = np.empty([len(P), 4])
+    thetah = 0.5 * np.sqrt((P**2).sum(1))
+    q[:,0] = np.cos(thetah)
+    # do linear expansion for small epsilon
+    small = thetah < rot_epsilon
+    scale = np.empty(len(P))
+    scale[small] = 0.5
+    scale[~small] = 0.5 * np.sin(thetah[~small]) / thetah[~small]
+    q[:,1:] = scale[:,np.newaxis] * P
+    # make sure to have normal form
+    q[q[:,0] < 0.] *= -1.
+    return q
+
+def q2aa_many(Q):
+    """ convert a stack of quaternions, shape (n,4), to angle axis vectors, shape (n,3) """
+    q = np.array(Q, dtype=np.float64).reshape(-1,4)
+    q[q[:,0] < 0.] *= -1.
+    big = q[:,0] > 1.
+    q[big] /= np.sqrt((q[big]**2).sum(1))[:,np.newaxis]
+    theta = 2. * np.arccos(q[:,0])
+    s = np.sqrt(1. - q[:,0] * q[:,0])
+    small = s < rot_epsilon
+    scale = np.empty(len(q))
+    scale[small] = 2.
+    scale[~small] = theta[~small] / s[~small]
+    return scale[:,np.newaxis] * q[:,1:4]
+
+def q2mx_many(Q):
+    """ convert a stack of quaternions, shape (n,4), to rotation matrices, shape (n,3,3) """
+    Q = np.asarray(Q, dtype=np.float64).reshape(-1,4)
+    Q = Q / np.sqrt((Q**2).sum(1))[:,np.newaxis]
+    RMX = np.empty([len(Q),3,3])
+    Q2Q3 = Q[:,1]*Q[:,2]
+    Q1Q4 = Q[:,0]*Q[:,3]
+    Q2Q4 = Q[:,1]*Q[:,3]
+    Q1Q3 = Q[:,0]*Q[:,2]
+    Q3Q4 = Q[:,2]*Q[:,3]
+    Q1Q2 = Q[:,0]*Q[:,1]
+
+    RMX[:,0,0] = 2.*(0.5 - Q[:,2]*Q[:,2] - Q[:,3]*Q[:,3])
+    RMX[:,1,1] = 2.*(0.5 - Q[:,1]*Q[:,1] - Q[:,3]*Q[:,3])
+    RMX[:,2,2] = 2.*(0.5 - Q[:,1]*Q[:,1] - Q[:,2]*Q[:,2])
+    RMX[:,0,1] = 2.*(Q2Q3 - Q1Q4)
+    RMX[:,1,0] = 2.*(Q2Q3 + Q1Q4)
+    RMX[:,0,2] = 2.*(Q2Q4 + Q1Q3)
+    RMX[:,2,0] = 2.*(Q2Q4 - Q1Q3)
+    RMX[:,1,2] = 2.*(Q3Q4 - Q1Q2)
+    RMX[:,2,1] = 2.*(Q3Q4 + Q1Q2)
+    return RMX
+
+def aa2mx_many(P):
+    """ convert a stack of angle axis vectors, shape (n,3), to rotation matrices, shape (n,3,3) """
+    return q2mx_many(aa2q_many(P))
+
+def _skew_many(v):
+    """return the skew symmetric matrices E with E x = v cross x for a stack of vectors"""
+    E = np.zeros(v.shape[:-1] + (3,3))
+    E[...,0,1] = -v[...,2]
+    E[...,0,2] = v[...,1]
+    E[...,1,2] = -v[...,0]
+    E[...,1,0] = v[...,2]
+    E[...,2,0] = -v[...,1]
+    E[...,2,1] = v[...,0]
+    return E
+
+def rot_mat_deriv_many(P, with_grad=True):
+    """
+    rotation matrices and their derivatives for a stack of angle axis vectors
+    
+    This is the vectorized version of rmdrvt (aatopology.rotMatDeriv), with
+    the same first order expansion for very small rotations.
+    
+    Parameters
+    ----------
+    P : array, shape (n,3)
+        the angle axis vectors
+    with_grad : bool
+        if False only the rotation matrices are computed
+    
+    Returns
+    -------
+    R : array, shape (n,3,3)
+        the rotation matrices
+    dR : array, shape (n,3,3,3), or None
+        dR[i,k] is the derivative of R[i] with respect to P[i,k]
+    """
+    P = np.asarray(P, dtype=np.float64).reshape(-1,3)
+    n = len(P)
+    theta2 = (P**2).sum(1)
+    small = theta2 < 1e-12
+    large = ~small
+    
+    R = np.empty([n,3,3])
+    dR = np.empty([n,3,3,3]) if with_grad else None
+    
+    if np.any(small):
+        Ps = P[small]
+        R[small] = np.eye(3) + _skew_many(Ps)
+        if with_grad:
+            # first order in p: dR/dp_k = E(e_k) + (p e_k^T + e_k p^T) / 2 - p_k I
+            eye = np.eye(3)
+            dRs = (_skew_many(eye)[np.newaxis,:,:,:]
+                   + 0.5 * (Ps[:,np.newaxis,:,np.newaxis] * eye[np.newaxis,:,np.newaxis,:]
+                            + eye[np.newaxis,:,:,np.newaxis] * Ps[:,np.newaxis,np.newaxis,:])
+                   - Ps[:,:,np.newaxis,np.newaxis] * eye[np.newaxis,np.newaxis,:,:])
+            dR[small] = dRs
+    
+    if np.any(large):
+        Pl = P[large]
+        theta = np.sqrt(theta2[large])
+        ct = np.cos(theta)[:,np.newaxis,np.newaxis]
+        st = np.sin(theta)[:,np.newaxis,np.newaxis]
+        pn = Pl / theta[:,np.newaxis]
+        E = _skew_many(pn)
+        ESQ = np.matmul(E, E)
+        R[large] = np.eye(3) + (1. - ct) * ESQ + st * E
+        if with_grad:
+            # the derivative of the unit vector pn with respect to p_k
+            dpn = (np.eye(3)[np.newaxis,:,:] - pn[:,:,np.newaxis] * pn[:,np.newaxis,:]) / theta[:,np.newaxis,np.newaxis]
+            DE = _skew_many(dpn)
+            # dR_k = pn_k (st ESQ + ct E) + (1 - ct) (DE_k E + E DE_k) + st DE_k
+            dRl = np.matmul(DE, E[:,np.newaxis])
+            dRl += np.matmul(E[:,np.newaxis], DE)
+            dRl *= (1. - ct)[:,np.newaxis]
+            DE *= st[:,np.newaxis]
+            dRl += DE
+            dRl += pn[:,:,np.newaxis,np.newaxis] * (st * ESQ + ct * E)[:,np.newaxis]
+            dR[large] = dRl
+    return R, dR
+
 def random_q():
     """
     uniform random rotation in angle axis formulation
@@ -193,6 +353,24 @@ def random_q():
 def random_aa():
     return q2aa( random_q() )
 
+def random_q_many(n):
+    """ n uniform random rotations as quaternions, shape (n,4)
+    
+    This uses the random numbers in the same order as n calls to random_q
+    """
+    from numpy import sqrt, sin, cos, pi
+    u = np.random.uniform(0,1,[n,3])
+    q = np.empty([n,4])
+    q[:,0] = sqrt(1.-u[:,0]) * sin(2.*pi*u[:,1])
+    q[:,1] = sqrt(1.-u[:,0]) * cos(2.*pi*u[:,1])
+    q[:,2] = sqrt(u[:,0]) * sin(2.*pi*u[:,2])
+    q[:,3] = sqrt(u[:,0]) * cos(2.*pi*u[:,2])
+    return q
+
+def random_aa_many(n):
+    """ n uniform random rotations as angle axis vectors, shape (n,3) """
+    return q2aa_many(random_q_many(n))
+
 def takestep_aa(p, maxtheta):
     """ change an angle axis vector by a small rotation"""
     p[:] = rotate_aa(p, small_random_aa(maxtheta))
@@ -226,6 +404,38 @@ def small_random_aa(maxtheta):
     return p
 
 
+def small_random_aa_many(n, maxtheta):
+    """ n small random rotations, distributed like small_random_aa, shape (n,3) """
+    # random unit vectors
+    u1 = np.random.rand(n)
+    u2 = np.random.rand(n)
+    z = 2*u1 - 1.
+    p = np.empty([n,3])
+    p[:,0] = np.sqrt(1-z*z) * np.cos(2. * np.pi * u2)
+    p[:,1] = np.sqrt(1-z*z) * np.sin(2. * np.pi * u2)
+    p[:,2] = z
+
+    # linear for too small steps
+    if maxtheta < rot_epsilon:
+        return p * (np.random.rand(n) * maxtheta)[:,np.newaxis]
+
+    # choose the angles in range 0:maxtheta with distribution sin(0.5*theta)**2
+    # by rejection, redrawing only the rejected ones
+    s = 1. / (np.sin(0.5*maxtheta)**2)
+    theta = np.random.rand(n) * maxtheta
+    reject = np.random.rand(n) > s * np.sin(0.5 * theta)**2
+    while np.any(reject):
+        nrej = np.count_nonzero(reject)
+        theta[reject] = np.random.rand(nrej) * maxtheta
+        reject[reject] = np.random.rand(nrej) > s * np.sin(0.5 * theta[reject])**2
+    return p * theta[:,np.newaxis]
+
+def rotate_aa_many(p1, p2):
+    """
+    change the angle axis rotations p1 by the rotations p2, both shape (n,3)
+    """
+    return q2aa_many(q_multiply_many(aa2q_many(p2), aa2q_many(p1)))
+
 def vec_random():
     """ uniform random unit vector """
     p = np.zeros(3)
@@ -298,6 +508,49 @@ def test_vector_random_uniform_hypersphere():
     ax.scatter(r[:,0], r[:,1], r[:,2])
     plt.show()
     
-    
+
+import unittest
+class TestRotationsMany(unittest.TestCase):
+    """compare the vectorized rotation functions with the single rotation versions"""
+    def setUp(self):
+        np.random.seed(0)
+        # include rotations which use the small angle expansions
+        self.P = np.vstack([np.random.uniform(-3, 3, [20,3]), 1e-9 * np.ones([1,3]),
+                            np.zeros([1,3])])
+
+    def assertSame(self, a, b):
+        self.assertLess(np.max(np.abs(np.asarray(a) - np.asarray(b))), 1e-13)
+
+    def test_conversions(self):
+        Q = aa2q_many(self.P)
+        self.assertSame(Q, [aa2q(p) for p in self.P])
+        self.assertSame(q2aa_many(Q), [q2aa(q) for q in Q])
+        self.assertSame(q2mx_many(Q), [q2mx(q) for q in Q])
+        self.assertSame(aa2mx_many(self.P), [aa2mx(p) for p in self.P])
+        Q2 = aa2q_many(self.P[::-1])
+        self.assertSame(q_multiply_many(Q, Q2), [q_multiply(q, q2) for q, q2 in zip(Q, Q2)])
+        self.assertSame(rotate_aa_many(self.P, self.P[::-1]),
+                        [rotate_aa(p, p2) for p, p2 in zip(self.P, self.P[::-1])])
+
+    def test_rot_mat_deriv(self):
+        try:
+            from pygmin.potentials.fortran.rmdrvt import rmdrvt
+        except ImportError:
+            from pygmin.potentials.numpy_kernels.rmdrvt import rmdrvt
+        R, dR = rot_mat_deriv_many(self.P)
+        for p, r, dr in zip(self.P, R, dR):
+            ret = rmdrvt(p, True)
+            self.assertSame(r, ret[0])
+            self.assertSame(dr, ret[1:])
+
+    def test_random(self):
+        np.random.seed(1)
+        P1 = random_aa_many(5)
+        np.random.seed(1)
+        self.assertSame(P1, [random_aa() for i in xrange(5)])
+        
+        P = small_random_aa_many(100, 0.5)
+        self.assertLessEqual(np.max(np.sqrt((P**2).sum(1))), 0.5)
+
 if __name__ == "__main__":
     test_vector_random_uniform_hypersphere()
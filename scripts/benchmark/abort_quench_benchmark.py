@@ -0,0 +1,44 @@
+"""
+compare the cost of basin hopping with and without an abort criterion
+
+LJ31 basin hopping is run from the same random starts with the normal
+quench and with EnergyBoundAbort as abort_quench, with the default
+parameters and with rms_max=1.  prints the mean number of gradient
+evaluations per step, the fraction of the quenches which were aborted and
+the lowest energy found.
+"""
+import numpy as np
+from pygmin.systems import LJCluster
+from pygmin.basinhopping import EnergyBoundAbort
+
+def run(natoms, nsteps, seed, abort_quench):
+    np.random.seed(seed)
+    system = LJCluster(natoms)
+    db = system.create_database()
+    coords = system.get_random_configuration()
+    bh = system.get_basinhopping(database=db, coords=coords, outstream=None, 
+                                 abort_quench=abort_quench)
+    nfev = 0
+    for i in xrange(nsteps):
+        bh.run(1)
+        nfev += bh.funcalls
+    return float(nfev) / nsteps, float(bh.naborted) / nsteps, db.lowest_energy_minimum().energy
+
+def main(natoms=31, nsteps=150, nruns=5):
+    settings = [("plain", lambda: None),
+                ("default", lambda: EnergyBoundAbort()),
+                ("rms_max=1", lambda: EnergyBoundAbort(rms_max=1.))]
+    print "%-6s %-10s %10s %10s %12s" % ("seed", "abort", "nfev/step", "aborted", "Emin")
+    totals = dict([(label, []) for label, get_abort in settings])
+    for seed in xrange(nruns):
+        for label, get_abort in settings:
+            nfev, aborted, emin = run(natoms, nsteps, seed, get_abort())
+            totals[label].append(nfev)
+            print "%-6d %-10s %10.1f %10.2f %12.6f" % (seed, label, nfev, aborted, emin)
+    plain = np.mean(totals["plain"])
+    for label, get_abort in settings:
+        nfev = np.mean(totals[label])
+        print "%-10s mean nfev/step %6.1f, %3.0f%% fewer" % (label, nfev, 100. * (1. - nfev / plain))
+
+if __name__ == "__main__":
+    main()
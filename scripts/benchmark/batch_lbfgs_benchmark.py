@@ -0,0 +1,31 @@
+"""
+time minimizing many small LJ clusters one at a time with mylbfgs and all at
+once with batch_lbfgs
+
+prints the cost per minimization for each cluster size
+"""
+import time
+import numpy as np
+from pygmin.systems import LJCluster
+from pygmin.optimize import mylbfgs, batch_lbfgs
+
+def main(nconf=100, sizes=[13, 38, 75], tol=1e-6):
+    print "milliseconds per minimization of %d random LJ clusters" % nconf
+    print "%-8s %10s %10s %8s" % ("natoms", "mylbfgs", "batch", "speedup")
+    for natoms in sizes:
+        system = LJCluster(natoms)
+        pot = system.get_potential()
+        xs = np.array([system.get_random_configuration() for i in xrange(nconf)])
+
+        t0 = time.time()
+        for x in xs:
+            mylbfgs(x.copy(), pot, tol=tol)
+        t1 = (time.time() - t0) / nconf * 1e3
+
+        t0 = time.time()
+        batch_lbfgs(xs, pot, tol=tol)
+        t2 = (time.time() - t0) / nconf * 1e3
+        print "%-8d %10.3f %10.3f %8.1f" % (natoms, t1, t2, t1 / t2)
+
+if __name__ == "__main__":
+    main()
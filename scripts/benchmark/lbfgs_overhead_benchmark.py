@@ -0,0 +1,43 @@
+"""
+time the per iteration overhead of the LBFGS minimizers
+
+The potential is a cheap anisotropic harmonic well, so the time per
+iteration is almost entirely the minimizer.  prints microseconds per
+iteration for lbfgs_py and mylbfgs for each number of degrees of freedom.
+"""
+import time
+import numpy as np
+from pygmin.potentials import BasePotential
+from pygmin.optimize import lbfgs_py, mylbfgs
+
+class _Harmonic(BasePotential):
+    def __init__(self, ndof):
+        self.k = np.linspace(1., 10., ndof)
+    def getEnergy(self, coords):
+        return 0.5 * np.dot(self.k * coords, coords)
+    def getEnergyGradient(self, coords):
+        g = self.k * coords
+        return 0.5 * np.dot(g, coords), g
+
+def per_iteration(quench, pot, x0, repeat=5):
+    """return the best time per iteration in microseconds"""
+    best = None
+    for i in xrange(repeat):
+        t0 = time.time()
+        res = quench(x0.copy(), pot, tol=1e-8, nsteps=2000)
+        t = (time.time() - t0) / res.nsteps * 1e6
+        if best is None or t < best:
+            best = t
+    return best
+
+def main(sizes=[30, 100, 300]):
+    print "microseconds per iteration"
+    print "%-8s %10s %10s" % ("ndof", "lbfgs_py", "mylbfgs")
+    for ndof in sizes:
+        pot = _Harmonic(ndof)
+        x0 = np.random.uniform(-1, 1, ndof)
+        print "%-8d %10.2f %10.2f" % (ndof, per_iteration(lbfgs_py, pot, x0),
+                                      per_iteration(mylbfgs, pot, x0))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+compare the number of LBFGS iterations with and without a preconditioner
+
+Two systems are used.  A bead spring molecule with stiff bonds, soft 1-3
+springs and a weak attraction between all beads uses BondedPreconditioner.
+Rigid LJ trimers in angle axis coordinates use MetricTensorPreconditioner,
+both from random starts and from basin hopping steps away from a minimum.
+prints the mean number of iterations, the median of the per start ratio and
+the number of starts for which the preconditioner needed more iterations.
+"""
+import numpy as np
+from copy import deepcopy
+from pygmin.potentials import BasePotential, LJ
+from pygmin.optimize import lbfgs_py, BondedPreconditioner, MetricTensorPreconditioner
+from pygmin.angleaxis import RBSystem, RBTopology, RigidFragment, RBPotentialWrapper
+
+class BeadSpring(BasePotential):
+    def __init__(self, natoms):
+        self.natoms = natoms
+        self.springs = ([(i, i+1, 1000.) for i in xrange(natoms-1)]
+                        + [(i, i+2, 20.) for i in xrange(natoms-2)])
+        self.I = np.array([s[0] for s in self.springs])
+        self.J = np.array([s[1] for s in self.springs])
+        self.k = np.array([s[2] for s in self.springs])
+        self.r0 = (self.J - self.I)[:,np.newaxis] * np.array([1., 0., 0.])
+    def getEnergy(self, coords):
+        return self.getEnergyGradient(coords)[0]
+    def getEnergyGradient(self, coords):
+        x = coords.reshape(-1,3)
+        dr = x[self.J] - x[self.I] - self.r0
+        e = 0.5 * (self.k * (dr**2).sum(1)).sum()
+        g = np.zeros(x.shape)
+        for i, j, f in zip(self.I, self.J, self.k[:,np.newaxis] * dr):
+            g[j] += f
+            g[i] -= f
+        for i in xrange(self.natoms):
+            d = x[i] - x[i+1:]
+            w = 0.1 * np.exp(-(d**2).sum(1))
+            e -= w.sum()
+            f = 2. * w[:,np.newaxis] * d
+            g[i] += f.sum(0)
+            g[i+1:] -= f
+        return e, g.ravel()
+
+class TrimerSystem(RBSystem):
+    def __init__(self, nrigid):
+        self.nrigid = nrigid
+        RBSystem.__init__(self)
+    def setup_aatopology(self):
+        trimer = RigidFragment()
+        a = 7. * np.pi / 24.
+        trimer.add_atom("A", np.array([0., -2./3 * np.sin(a), 0.]), 1.)
+        trimer.add_atom("A", np.array([np.cos(a), 1./3 * np.sin(a), 0.]), 1.)
+        trimer.add_atom("A", np.array([-np.cos(a), 1./3 * np.sin(a), 0.]), 1.)
+        trimer.finalize_setup()
+        topology = RBTopology()
+        topology.add_sites([deepcopy(trimer) for i in xrange(self.nrigid)])
+        return topology
+    def get_potential(self):
+        return RBPotentialWrapper(self.aasystem, LJ())
+
+def compare(label, pot, configs, get_preconditioner, tol=1e-6):
+    n = []
+    for x in configs:
+        res0 = lbfgs_py(x.copy(), pot, tol=tol)
+        res = lbfgs_py(x.copy(), pot, tol=tol, preconditioner=get_preconditioner())
+        n.append((res0.nsteps, res.nsteps))
+    n = np.array(n, dtype=float)
+    ratio = n[:,0] / n[:,1]
+    print "%-22s %8d %8d %8.1f %5d/%d" % (label, n[:,0].mean(), n[:,1].mean(), np.median(ratio),
+                                          (ratio < 1).sum(), len(ratio))
+
+def main(nstarts=20):
+    np.random.seed(0)
+    print "%-22s %8s %8s %8s %7s" % ("system", "plain", "precond", "ratio", "slower")
+    for natoms in [20, 50, 100]:
+        pot = BeadSpring(natoms)
+        x = np.zeros([natoms, 3])
+        x[:,0] = np.arange(natoms)
+        configs = [x.ravel() + np.random.uniform(-0.3, 0.3, 3 * natoms) for i in xrange(nstarts)]
+        compare("bead spring %d" % natoms, pot, configs,
+                lambda: BondedPreconditioner(natoms, pot.springs))
+
+    system = TrimerSystem(8)
+    pot = system.get_potential()
+    get_preconditioner = lambda: MetricTensorPreconditioner(system.get_metric_tensor)
+    configs = [system.get_random_configuration() for i in xrange(nstarts)]
+    compare("8 trimers, random", pot, configs, get_preconditioner)
+    xmin = lbfgs_py(system.get_random_configuration(), pot).coords
+    step = system.get_takestep()
+    configs = []
+    for i in xrange(nstarts):
+        x = xmin.copy()
+        step.takeStep(x)
+        configs.append(x)
+    compare("8 trimers, bh steps", pot, configs, get_preconditioner)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+time the single and the vectorized rotation functions in pygmin.utils.rotations
+
+prints the cost per rotation for each function
+"""
+import time
+import numpy as np
+import pygmin.utils.rotations as rotations
+
+def per_rotation(func, n, repeat=3):
+    """return the best time per rotation in microseconds"""
+    best = None
+    for i in xrange(repeat):
+        t0 = time.time()
+        func()
+        t = (time.time() - t0) / n * 1e6
+        if best is None or t < best:
+            best = t
+    return best
+
+def main(n=10000):
+    P = rotations.random_aa_many(n)
+    Q = rotations.aa2q_many(P)
+    P2 = rotations.random_aa_many(n)
+    
+    benchmarks = [
+        ("aa2q", lambda: [rotations.aa2q(p) for p in P], lambda: rotations.aa2q_many(P)),
+        ("q2aa", lambda: [rotations.q2aa(q) for q in Q], lambda: rotations.q2aa_many(Q)),
+        ("q2mx", lambda: [rotations.q2mx(q) for q in Q], lambda: rotations.q2mx_many(Q)),
+        ("aa2mx", lambda: [rotations.aa2mx(p) for p in P], lambda: rotations.aa2mx_many(P)),
+        ("q_multiply", lambda: [rotations.q_multiply(q, q) for q in Q], 
+                       lambda: rotations.q_multiply_many(Q, Q)),
+        ("rotate_aa", lambda: [rotations.rotate_aa(p, p2) for p, p2 in zip(P, P2)],
+                      lambda: rotations.rotate_aa_many(P, P2)),
+        ("random_aa", lambda: [rotations.random_aa() for i in xrange(n)],
+                      lambda: rotations.random_aa_many(n)),
+        ("small_random_aa", lambda: [rotations.small_random_aa(0.5) for i in xrange(n)],
+                            lambda: rotations.small_random_aa_many(n, 0.5)),
+        ]
+    try:
+        from pygmin.potentials.fortran.rmdrvt import rmdrvt
+        benchmarks.append(("rotMatDeriv", lambda: [rmdrvt(p, True) for p in P],
+                           lambda: rotations.rot_mat_deriv_many(P, True)))
+    except ImportError:
+        pass
+    
+    print "microseconds per rotation for %d rotations" % n
+    print "%-16s %10s %10s %8s" % ("function", "single", "many", "speedup")
+    for name, single, many in benchmarks:
+        t1 = per_rotation(single, n)
+        t2 = per_rotation(many, n)
+        print "%-16s %10.3f %10.3f %8.1f" % (name, t1, t2, t1 / t2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+compare the cost of basin hopping with a plain and a staged quench
+
+LJ31 basin hopping is run from the same random starts with the normal
+quench and with a StagedQuench (params.staged_quench).  prints the mean
+number of gradient evaluations per step, the fraction of the quenches which
+were tightened and the lowest energy found.
+"""
+import numpy as np
+from pygmin.systems import LJCluster
+
+def run(natoms, nsteps, seed, staged):
+    np.random.seed(seed)
+    system = LJCluster(natoms)
+    system.params.staged_quench.enabled = staged
+    db = system.create_database()
+    coords = system.get_random_configuration()
+    bh = system.get_basinhopping(database=db, coords=coords, outstream=None)
+    nfev = 0
+    for i in xrange(nsteps):
+        bh.run(1)
+        nfev += bh.funcalls
+    if staged:
+        tightened = float(bh.quench.ntightened) / bh.quench.nquenches
+    else:
+        tightened = 1.
+    return float(nfev) / nsteps, tightened, db.lowest_energy_minimum().energy
+
+def main(natoms=31, nsteps=150, nruns=5):
+    print "%-6s %-8s %10s %10s %12s" % ("seed", "quench", "nfev/step", "tightened", "Emin")
+    totals = {False : [], True : []}
+    for seed in xrange(nruns):
+        for staged in [False, True]:
+            nfev, tightened, emin = run(natoms, nsteps, seed, staged)
+            totals[staged].append(nfev)
+            print "%-6d %-8s %10.1f %10.2f %12.6f" % (seed, ["plain", "staged"][staged], 
+                                                      nfev, tightened, emin)
+    plain = np.mean(totals[False])
+    staged = np.mean(totals[True])
+    print "mean nfev/step plain %.1f staged %.1f, %.0f%% fewer" % (plain, staged, 
+                                                                  100. * (1. - staged / plain))
+
+if __name__ == "__main__":
+    main()
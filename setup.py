@@ -67,6 +67,7 @@ setup(name='pygmin',
                 "pygmin.wham",
                 "pygmin.storage",
                 "pygmin.potentials.fortran",
+                "pygmin.potentials.numpy_kernels",
                 "pygmin.accept_tests",
                 "pygmin.systems",
                 "pygmin.angleaxis",